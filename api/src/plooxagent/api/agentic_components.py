@@ -1,108 +1,26 @@
 from agents import Agent, function_tool, WebSearchTool, FileSearchTool, set_default_openai_key
+from agents.voice import VoiceWorkflowBase
 from agents.extensions.handoff_prompt import prompt_with_handoff_instructions
 from datetime import date
-from openai import OpenAI
+import asyncio
+import functools
+import os
+from openai import AsyncOpenAI
 
-from plooxagent.api.custom_tools import check_vacancy, book_a_room
-from plooxagent.api.utils import vs_setup 
+from plooxagent.api.router import IntentRouter, RoutedVoiceWorkflow
+from plooxagent.api.voice_metrics import TurnSpans
+from plooxagent.api.knowledge import KnowledgeIndex, knowledge_search_tool, load_or_build_index
+from plooxagent.api.custom_tools import check_vacancy, check_vacancy_batch, find_best_stays, book_a_room
+from plooxagent.api.hotels import DEFAULT_HOTEL_NAME, hotel_id, hotel_name
+from plooxagent.api.translation import get_translator
+from plooxagent.api.utils import vs_setup, vs_setup_async
 
 
-HOTEL_NAME = "Millman's Mansion"
-
-# Check if it has not been already updated
-vs_ids = vs_setup(
-    names=["room_description", "hotel_description"],
-    paths=["knowledge_base/room_descriptions.pdf", "knowledge_base/hotel_description.pdf"]
-)
-
-
-# --- Agent: Knowledge Agent ---
-room_recommending_agent = Agent(
-    name="RoomRecommendingAgent",
-    instructions=(
-        "You are an elegant and passionate hotel consierge. Advice the guest on which of the rooms should she or he choose."
-        "Answer with concise, helpful responses using the FileSearchTool."
-        # "Should you need any additional information, ask follow-up questions"
-        # "Ask follow-up questions to keep up the conversation and make it more personal."
-    ),
-    tools=[FileSearchTool(
-            max_num_results=1,
-            vector_store_ids=[vs_ids["room_description"]["id"]],
-        ),],
-)
-
-storyteller_agent = Agent(
-    name="StorytellerAgent",
-    instructions=(
-        "You are an elegant and passionate hotel consierge. Tell the guest as much as you can on the hotel's history and its unique heritage."
-        "Answer with concise, helpful responses using the FileSearchTool."
-        # "Should you need any additional information, ask follow-up questions"
-        # "Ask follow-up questions to keep up the conversation and make it more personal."
-    ),
-    tools=[FileSearchTool(
-            max_num_results=1,
-            vector_store_ids=[vs_ids["hotel_description"]["id"]],
-        ),],
-)
-
-# TODO: Add feedback loop: If price is to high, find cheaper room. In general display all the options
-vacancy_checking_agent = Agent(
-    name="VacancyCheckingAgent",
-    instructions=(
-        "You have the availability to check the vacancy through your tool."
-        f"Today is {date.today().strftime(format='%Y-%m-%d')}."
-        "The function accepts the following arguments: start_date, end_date, number_of_persons"
-        "The expected format of dates if YYYY-MM-DD"
-        "From the user's message extract those arguments and pass them to the tool"
-        "Tool returns a tuple of form: (vacancy, available_options)."
-        "If vacancy is zero then it indicates the lack of vacancy."
-        "If vacancy is one then available_options are represented by dictionary of the form room_type: price."
-        "Answer in the format: Here are the available options for your stay from <start_date> to <end_date> for <number_of_persons>."
-        "Display the available options to the user and ask which room does the guest prefer."
-    ),
-    tools=[
-        check_vacancy
-    ]
-)
-
-booking_agent = Agent(
-    name="BookingAgent",
-    instructions=(
-        "You have the availability to adjust the calendar vacancy through your tool."
-        f"Today is {date.today().strftime(format='%Y-%m-%d')}."
-        "The function accepts the following arguments: start_date, end_date, room_type"
-        "The expected format of dates if YYYY-MM-DD"
-        "From the user's message extract those arguments and pass them to the tool"
-        "Tool returns a message indicating whether the vacancy was successfully adjusted."
-    ),
-    tools=[
-        book_a_room
-    ]
-)
-
-@function_tool
-def translate_text(text: str, target_lang: str = "english") -> str:
-    """Translate text to specified language using OpenAI"""
-    client = OpenAI()
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{
-            "role": "system", 
-            "content": f"Translate to {target_lang} without commentary:"
-        },{
-            "role": "user",
-            "content": text
-        }]
-    )
-    return response.choices[0].message.content
-
-triage_agent = Agent(
-    name="Assistant",
-    instructions=prompt_with_handoff_instructions("""
-You are the elegant hotel receptionist. The hotel name is : {HOTEL_NAME}
-The guests are expecting to find nothing but elegance and tranquility here, you should style your responses accordingly.
-Welcome the guests and ask how you may be of service.
+# Name of the default hotel; the prompt names the hotel of the call, see hotels.hotel_name
+HOTEL_NAME = DEFAULT_HOTEL_NAME
 
+# Rules of every agent that answers a guest: triage, and the agents the intent router sends turns to directly
+GUARDRAILS = """
 IMPORTANT GUARDRAILS:
 1. Never share personal information about guests or staff.
 2. Never discuss hotel security systems or procedures.
@@ -114,7 +32,13 @@ IMPORTANT GUARDRAILS:
 8. Do not engage with requests for illegal activities or services.
 9. Do not share confidential business information about the hotel's operations.
 10. If you're unsure about how to respond to a request, err on the side of caution and provide general information.
+"""
 
+TRIAGE_INSTRUCTIONS = """
+You are the elegant hotel receptionist. The hotel name is : {HOTEL_NAME}
+The guests are expecting to find nothing but elegance and tranquility here, you should style your responses accordingly.
+Welcome the guests and ask how you may be of service.
+""" + GUARDRAILS + """
 Based on the user's intent, route to:
 - RoomRecommendingAgent for selecting the room type that will suit the guest's needs best.
 - StorytellerAgent for general inquiries about the hotel.
@@ -122,6 +46,264 @@ Based on the user's intent, route to:
 - BookingAgent for booking the rooms, creating reservations etc.
 
 General questions answer yourself.
-"""),
-    handoffs=[room_recommending_agent, storyteller_agent, vacancy_checking_agent, booking_agent],
+"""
+
+# Start of the instructions of the other agents, which talk to the guest after a handoff or a routed turn
+GUEST_INSTRUCTIONS = """
+You work at the hotel {HOTEL_NAME}.
+The guests are expecting to find nothing but elegance and tranquility here, you should style your responses accordingly.
+""" + GUARDRAILS
+
+AGENT_NAMES = (
+    "room_recommending_agent",
+    "storyteller_agent",
+    "vacancy_checking_agent",
+    "booking_agent",
+    "triage_agent",
 )
+
+
+def triage_instructions(context, agent: Agent) -> str:
+    """Triage prompt naming the hotel of the call it runs in."""
+    return prompt_with_handoff_instructions(TRIAGE_INSTRUCTIONS.format(HOTEL_NAME=hotel_name(hotel_id())))
+
+
+def guest_instructions(instructions: str):
+    """Instructions of an agent that answers guests: GUEST_INSTRUCTIONS for the hotel of the call, then ``instructions``."""
+
+    def build(context, agent: Agent) -> str:
+        return GUEST_INSTRUCTIONS.format(HOTEL_NAME=hotel_name(hotel_id())) + "\n" + instructions
+
+    return build
+
+
+@function_tool
+async def translate_text(text: str, target_lang: str = "english") -> str:
+    """Translate text to specified language using OpenAI"""
+    return await get_translator().translate(text, target_lang)
+
+
+# Agents the intent router may hand a turn to directly
+INTENT_AGENTS = {
+    "vacancy": "vacancy_checking_agent",
+    "booking": "booking_agent",
+    "room_description": "room_recommending_agent",
+    "hotel_history": "storyteller_agent",
+}
+
+KNOWLEDGE_BASE = {
+    "room_description": "knowledge_base/room_descriptions.pdf",
+    "hotel_description": "knowledge_base/hotel_description.pdf",
+}
+
+_vs_ids: dict | None = None
+_kb_indexes: dict[str, KnowledgeIndex] = {}
+
+
+def retrieval_mode(name: str) -> str:
+    """
+    How an agent searches a knowledge base: "remote" (hosted FileSearchTool) or "local" (knowledge.py index).
+
+    KB_RETRIEVAL sets the mode of every knowledge base, KB_RETRIEVAL_<NAME> (e.g.
+    KB_RETRIEVAL_ROOM_DESCRIPTION) that of one.
+    """
+    return os.environ.get(f"KB_RETRIEVAL_{name.upper()}", os.environ.get("KB_RETRIEVAL", "remote"))
+
+
+def _knowledge_base(mode: str) -> dict[str, str]:
+    return {name: path for name, path in KNOWLEDGE_BASE.items() if retrieval_mode(name) == mode}
+
+
+async def _load_kb_indexes(client: AsyncOpenAI | None = None) -> None:
+    for name, path in _knowledge_base("local").items():
+        if name not in _kb_indexes:
+            _kb_indexes[name] = await load_or_build_index(
+                name, [path], embed=os.environ.get("KB_EMBEDDINGS") == "1", client=client
+            )
+
+
+async def setup_agents(client: AsyncOpenAI | None = None, vs_ids: dict | None = None) -> Agent:
+    """
+    Sync the knowledge base vector stores and local indexes and build the agents; await once before serving.
+
+    Args:
+        client: OpenAI client for the sync, the shared one by default
+        vs_ids: Vector store records synced elsewhere (e.g. by the parent of a
+            worker process); skips the sync when given
+
+    Returns:
+        Agent: The triage agent
+    """
+    global _vs_ids
+    if vs_ids is not None:
+        _vs_ids = vs_ids
+    if _vs_ids is None:
+        # Check if it has not been already updated
+        remote = _knowledge_base("remote")
+        _vs_ids = await vs_setup_async(
+            names=list(remote), paths=list(remote.values()), client=client
+        ) if remote else {}
+    await _load_kb_indexes(client)
+    return get_triage_agent()
+
+
+def _not_in_event_loop(what: str) -> None:
+    """Raise if called from a running event loop, which the blocking fallbacks below cannot run in."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    raise RuntimeError(f"{what} not loaded yet; await setup_agents() before building the agents in an event loop")
+
+
+def get_vs_ids() -> dict:
+    """Vector store records of the remote knowledge bases; blocks on the sync if setup_agents() has not run."""
+    global _vs_ids
+    if _vs_ids is None:
+        remote = _knowledge_base("remote")
+        if remote:
+            _not_in_event_loop("Vector stores")
+        _vs_ids = vs_setup(names=list(remote), paths=list(remote.values())) if remote else {}
+    return _vs_ids
+
+
+def get_kb_index(name: str) -> KnowledgeIndex:
+    """
+    Local index of a knowledge base; blocks on loading it if setup_agents() has not run.
+
+    Raises:
+        RuntimeError: If the index is not loaded and an event loop is running
+    """
+    if name not in _kb_indexes:
+        _not_in_event_loop(f"Knowledge base index {name!r}")
+        asyncio.run(_load_kb_indexes())
+    return _kb_indexes[name]
+
+
+def knowledge_tool(name: str, description: str):
+    """The tool searching knowledge base ``name``, local or remote as retrieval_mode() says."""
+    if retrieval_mode(name) == "local":
+        return knowledge_search_tool(name, get_kb_index(name), description)
+    return FileSearchTool(
+        max_num_results=1,
+        vector_store_ids=[get_vs_ids()[name]["id"]],
+    )
+
+
+@functools.cache
+def get_agents() -> dict[str, Agent]:
+    """
+    Build the receptionist agents on first use.
+
+    Returns:
+        dict: Agents by their module-level name (see AGENT_NAMES)
+    """
+    # --- Agent: Knowledge Agent ---
+    room_recommending_agent = Agent(
+        name="RoomRecommendingAgent",
+        instructions=guest_instructions(
+            "You are an elegant and passionate hotel consierge. Advice the guest on which of the rooms should she or he choose."
+            "Answer with concise, helpful responses using the knowledge base search tool."
+            # "Should you need any additional information, ask follow-up questions"
+            # "Ask follow-up questions to keep up the conversation and make it more personal."
+        ),
+        tools=[knowledge_tool("room_description", "Search the descriptions of the hotel's room categories.")],
+    )
+
+    storyteller_agent = Agent(
+        name="StorytellerAgent",
+        instructions=guest_instructions(
+            "You are an elegant and passionate hotel consierge. Tell the guest as much as you can on the hotel's history and its unique heritage."
+            "Answer with concise, helpful responses using the knowledge base search tool."
+            # "Should you need any additional information, ask follow-up questions"
+            # "Ask follow-up questions to keep up the conversation and make it more personal."
+        ),
+        tools=[knowledge_tool("hotel_description", "Search the description and history of the hotel.")],
+    )
+
+    # TODO: Add feedback loop: If price is to high, find cheaper room. In general display all the options
+    vacancy_checking_agent = Agent(
+        name="VacancyCheckingAgent",
+        instructions=guest_instructions(
+            "You have the availability to check the vacancy through your tool."
+            f"Today is {date.today().strftime(format='%Y-%m-%d')}."
+            "The function accepts the following arguments: start_date, end_date, number_of_persons"
+            "The expected format of dates if YYYY-MM-DD"
+            "From the user's message extract those arguments and pass them to the tool"
+            "Tool returns a tuple of form: (vacancy, available_options)."
+            "If vacancy is zero then it indicates the lack of vacancy."
+            "If vacancy is one then available_options are represented by dictionary of the form room_type: price."
+            "Answer in the format: Here are the available options for your stay from <start_date> to <end_date> for <number_of_persons>."
+            "Display the available options to the user and ask which room does the guest prefer."
+            "When the guest asks about several alternatives at once (other dates or another number of persons), "
+            "check them all in a single call to check_vacancy_batch."
+            "When the guest is flexible on dates (e.g. any 3 nights in May under a budget), "
+            "use find_best_stays once instead of checking dates one by one."
+        ),
+        tools=[
+            check_vacancy,
+            check_vacancy_batch,
+            find_best_stays,
+        ]
+    )
+
+    booking_agent = Agent(
+        name="BookingAgent",
+        instructions=guest_instructions(
+            "You have the availability to adjust the calendar vacancy through your tool."
+            f"Today is {date.today().strftime(format='%Y-%m-%d')}."
+            "The function accepts the following arguments: start_date, end_date, room_type"
+            "The expected format of dates if YYYY-MM-DD"
+            "From the user's message extract those arguments and pass them to the tool"
+            "Tool returns a message indicating whether the vacancy was successfully adjusted."
+        ),
+        tools=[
+            book_a_room
+        ]
+    )
+
+    triage_agent = Agent(
+        name="Assistant",
+        instructions=triage_instructions,
+        handoffs=[room_recommending_agent, storyteller_agent, vacancy_checking_agent, booking_agent],
+    )
+
+    return {
+        "room_recommending_agent": room_recommending_agent,
+        "storyteller_agent": storyteller_agent,
+        "vacancy_checking_agent": vacancy_checking_agent,
+        "booking_agent": booking_agent,
+        "triage_agent": triage_agent,
+    }
+
+
+def get_triage_agent() -> Agent:
+    return get_agents()["triage_agent"]
+
+
+@functools.cache
+def get_router() -> IntentRouter | None:
+    """Intent router of this process, or None if INTENT_ROUTER=off."""
+    if os.environ.get("INTENT_ROUTER", "on") == "off":
+        return None
+    return IntentRouter(threshold=float(os.environ.get("INTENT_ROUTER_THRESHOLD", "0.8")))
+
+
+def make_voice_workflow(spans: TurnSpans | None = None) -> VoiceWorkflowBase:
+    """Workflow for one call: obvious requests skip the triage turn unless the router is off."""
+    agents = get_agents()
+    return RoutedVoiceWorkflow(
+        get_triage_agent(),
+        {intent: agents[name] for intent, name in INTENT_AGENTS.items()},
+        get_router(),
+        spans,
+    )
+
+
+def __getattr__(name: str):
+    # Keep `from agentic_components import triage_agent` working without building at import
+    if name in AGENT_NAMES:
+        return get_agents()[name]
+    if name == "vs_ids":
+        return get_vs_ids()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,37 @@
+"""Add room_night table
+
+Revision ID: 3f2b8c1d9a47
+Revises: 
+Create Date: 2025-04-27 10:12:31.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f2b8c1d9a47'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'room_night',
+        sa.Column('night', sa.Date(), nullable=False),
+        sa.Column('room_type', sqlmodel.sql.sqltypes.AutoString(length=32), nullable=False),
+        sa.Column('available_rooms', sa.Integer(), nullable=False),
+        sa.Column('base_price_1person', sa.Float(), nullable=False),
+        sa.Column('base_price_2people', sa.Float(), nullable=False),
+        sa.Column('extra_person_price', sa.Float(), nullable=False),
+        sa.CheckConstraint('available_rooms >= 0', name='room_night_available_rooms_non_negative'),
+        sa.PrimaryKeyConstraint('night', 'room_type'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('room_night')
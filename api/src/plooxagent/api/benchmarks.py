@@ -0,0 +1,441 @@
+"""
+Offline benchmarks of the hot paths, with results stored as JSON and compared against a baseline.
+
+Run from api/:
+
+    python -m plooxagent.api.benchmarks                    # run all, compare with the baseline
+    python -m plooxagent.api.benchmarks tools calendar_io  # run some
+    python -m plooxagent.api.benchmarks --update-baseline  # accept the results as the new baseline
+
+The baseline in the repo was recorded on one developer machine (see its
+"machine" field); on other hardware, record your own with --update-baseline
+before comparing. Nothing here talks to OpenAI or Daily. Every metric is a duration or a count
+where lower is better; timings are the best of ``--repeat`` runs.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import typing as t
+
+import numpy as np
+
+RESULTS_PATH = "data/benchmarks/results.json"
+BASELINE_PATH = "data/benchmarks/baseline.json"
+
+Benchmark = t.Callable[[int, bool], t.Awaitable[dict[str, float]]]
+BENCHMARKS: dict[str, Benchmark] = {}
+
+
+def benchmark(fn: Benchmark) -> Benchmark:
+    """Register ``fn(repeat, quick)`` under its name; it returns metrics, lower is better."""
+    BENCHMARKS[fn.__name__] = fn
+    return fn
+
+
+async def best_of(repeat: int, fn: t.Callable[[], t.Any]) -> float:
+    """Shortest of ``repeat`` runs of ``fn``, in milliseconds; awaits it if it returns an awaitable."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        if asyncio.iscoroutine(result):
+            await result
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1e3
+
+
+def mock_calendar(path: str, years: int, rooms: int | None = None) -> None:
+    from plooxagent.api.database.calendar import CalendarArrays
+
+    arrays = CalendarArrays.mock(datetime.date(2025, 4, 20), days=365 * years, seed=years)
+    if rooms is not None:
+        arrays.available_rooms[:] = rooms
+    arrays.write_csv(path)
+
+
+async def invoke(tool, **kwargs):
+    """Call a function tool the way the agent runner does, with JSON arguments."""
+    from agents import RunContextWrapper
+
+    return await tool.on_invoke_tool(RunContextWrapper(None), json.dumps(kwargs))
+
+
+@benchmark
+async def tools(repeat: int, quick: bool) -> dict[str, float]:
+    """check_vacancy and book_a_room against CSV calendars of growing size, as the agent calls them."""
+    from plooxagent.api import custom_tools
+
+    rng = random.Random(0)
+    calls = 20 if quick else 200
+    metrics = {}
+    calendar_path = custom_tools.CALENDAR_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            for years in (1,) if quick else (1, 5, 20):
+                # Enough rooms that every booking succeeds and hits the journal
+                custom_tools.CALENDAR_PATH = os.path.join(tmp, f"calendar_{years}y.csv")
+                mock_calendar(custom_tools.CALENDAR_PATH, years, rooms=1_000_000)
+                stays = []
+                for _ in range(calls):
+                    start = datetime.date(2025, 4, 20) + datetime.timedelta(days=rng.randrange(365 * years - 14))
+                    end = start + datetime.timedelta(days=rng.randrange(14))
+                    stays.append((start.isoformat(), end.isoformat()))
+                await invoke(custom_tools.check_vacancy, start_date=stays[0][0], end_date=stays[0][1], number_of_persons=2)
+
+                async def check_all():
+                    for start, end in stays:
+                        await invoke(custom_tools.check_vacancy, start_date=start, end_date=end, number_of_persons=3)
+
+                async def book_all():
+                    for start, end in stays:
+                        assert "Successfully" in await invoke(
+                            custom_tools.book_a_room, start_date=start, end_date=end, room_type="superior"
+                        )
+
+                metrics[f"check_vacancy_{years}y_ms"] = await best_of(repeat, check_all) / calls
+                metrics[f"book_a_room_{years}y_ms"] = await best_of(repeat, book_all) / calls
+        finally:
+            custom_tools.CALENDAR_PATH = calendar_path
+    return metrics
+
+
+@benchmark
+async def calendar_io(repeat: int, quick: bool) -> dict[str, float]:
+    """HotelCalendar.load_from_csv and write_csv, and a cold load of the CSV and memory-mapped stores."""
+    from plooxagent.api.database.calendar import HotelCalendar, HotelCalendarStore
+    from plooxagent.api.database.mapped import MappedCalendarStore, import_csv
+
+    metrics = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for years in (1,) if quick else (1, 10):
+            path = os.path.join(tmp, f"calendar_{years}y.csv")
+            mock_calendar(path, years)
+            calendar_data = HotelCalendar.load_from_csv(path)
+            metrics[f"load_from_csv_{years}y_ms"] = await best_of(repeat, lambda: HotelCalendar.load_from_csv(path))
+            metrics[f"load_validated_{years}y_ms"] = await best_of(
+                repeat, lambda: HotelCalendar.load_from_csv(path, validate=True)
+            )
+            metrics[f"materialize_{years}y_ms"] = await best_of(repeat, lambda: dict(calendar_data))
+            metrics[f"write_csv_{years}y_ms"] = await best_of(
+                repeat, lambda: HotelCalendar.write_csv(calendar_data, os.path.join(tmp, "out.csv"))
+            )
+            metrics[f"store_load_{years}y_ms"] = await best_of(repeat, lambda: HotelCalendarStore(path).refresh())
+            mapped_path = os.path.join(tmp, f"calendar_{years}y.cal")
+            import_csv(path, mapped_path)
+            metrics[f"mapped_load_{years}y_ms"] = await best_of(repeat, lambda: MappedCalendarStore(mapped_path).refresh())
+    return metrics
+
+
+@benchmark
+async def quotes(repeat: int, quick: bool) -> dict[str, float]:
+    """Building the quote table of a calendar, and a batch of quotes from it against one store.quote per stay."""
+    from plooxagent.api.database.calendar import HotelCalendarStore
+    from plooxagent.api.database.quotes import QuoteTable, quote_stays
+
+    rng = random.Random(0)
+    metrics = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for years in (1,) if quick else (1, 10):
+            path = os.path.join(tmp, f"calendar_{years}y.csv")
+            mock_calendar(path, years)
+            store = HotelCalendarStore(path).refresh()
+            stays = []
+            for _ in range(100 if quick else 1000):
+                start = datetime.date(2025, 4, 20) + datetime.timedelta(days=rng.randrange(365 * years - 14))
+                stays.append((start, start + datetime.timedelta(days=rng.randrange(14)), rng.randint(1, 4)))
+
+            # Both ways must agree before their timings mean anything
+            for batched, single in zip(quote_stays(store, stays), [store.quote(*stay) for stay in stays]):
+                assert batched.keys() == single.keys()
+                assert all(abs(batched[room_type] - single[room_type]) < 0.01 for room_type in batched)
+
+            metrics[f"quote_table_{years}y_ms"] = await best_of(repeat, lambda: QuoteTable(store))
+            metrics[f"quote_batch_{years}y_ms"] = await best_of(repeat, lambda: quote_stays(store, stays)) / len(stays)
+            metrics[f"quote_single_{years}y_ms"] = await best_of(
+                repeat, lambda: [store.quote(*stay) for stay in stays]
+            ) / len(stays)
+    return metrics
+
+
+@benchmark
+async def hotels(repeat: int, quick: bool) -> dict[str, float]:
+    """check_vacancy over many synthetic hotels, with a tenth of their calendars resident, and the memory they hold."""
+    import tracemalloc
+
+    from plooxagent.api import custom_tools, hotels
+    from plooxagent.api.database.shards import CalendarShards
+
+    count = 40 if quick else 400
+    calls = 200 if quick else 2000
+    rng = np.random.default_rng(0)
+    # A few hotels get most of the calls
+    weights = 1 / np.arange(1, count + 1)
+    workload = [
+        (f"hotel-{hotel}", datetime.date(2025, 4, 20) + datetime.timedelta(days=int(day)))
+        for hotel, day in zip(rng.choice(count, calls, p=weights / weights.sum()), rng.integers(0, 350, calls))
+    ]
+
+    async def run(shards: CalendarShards) -> None:
+        custom_tools.get_calendar_shards = lambda: shards
+        for hotel, start in workload:
+            with hotels.serving(hotel):
+                answer = await invoke(
+                    custom_tools.check_vacancy,
+                    start_date=start.isoformat(),
+                    end_date=(start + datetime.timedelta(days=3)).isoformat(),
+                    number_of_persons=2,
+                )
+            assert answer != custom_tools.NO_CALENDAR
+
+    metrics = {}
+    hotels_dir, get_calendar_shards = hotels.HOTELS_DIR, custom_tools.get_calendar_shards
+    with tempfile.TemporaryDirectory() as tmp:
+        hotels.HOTELS_DIR = tmp
+        try:
+            for hotel in range(count):
+                os.makedirs(os.path.join(tmp, f"hotel-{hotel}"))
+                mock_calendar(os.path.join(tmp, f"hotel-{hotel}", "hotel_calendar_data.csv"), 1)
+            cap = count // 10
+            capped = CalendarShards(custom_tools.open_calendar_store, max_resident=cap)
+            metrics["check_vacancy_ms"] = await best_of(repeat, lambda: run(capped)) / calls
+            # Share of calls that had to load a calendar from disk
+            metrics["miss_rate"] = capped.stats.loads / (capped.stats.loads + capped.stats.hits + capped.stats.revived)
+            metrics["cold_check_vacancy_ms"] = await best_of(
+                repeat, lambda: run(CalendarShards(custom_tools.open_calendar_store, max_resident=1))
+            ) / calls
+
+            for name, max_resident in (("capped", cap), ("uncapped", count)):
+                tracemalloc.start()
+                await run(CalendarShards(custom_tools.open_calendar_store, max_resident=max_resident))
+                metrics[f"memory_{name}_mb"] = tracemalloc.get_traced_memory()[0] / 2**20
+                tracemalloc.stop()
+        finally:
+            hotels.HOTELS_DIR = hotels_dir
+            custom_tools.get_calendar_shards = get_calendar_shards
+    return metrics
+
+
+@benchmark
+async def vs_setup(repeat: int, quick: bool) -> dict[str, float]:
+    """The knowledge base sync when nothing needs uploading: rehashing touched files, and the stat-only pass."""
+    from plooxagent.api.utils import calculate_file_hash, vs_setup_async
+
+    documents = 8 if quick else 32
+    size = 1 << 20
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(documents):
+            paths.append(os.path.join(tmp, f"doc_{i:03d}.bin"))
+            with open(paths[-1], "wb") as doc:
+                doc.write(rng.bytes(size))
+        records_path = os.path.join(tmp, "vs_record.json")
+        files = {path: {"hash": calculate_file_hash(path), "file_id": f"file-{i}"} for i, path in enumerate(paths)}
+        with open(records_path, "w") as records:
+            json.dump({"benchmark": {"id": "vs_benchmark", "files": files}}, records)
+
+        # Uploads would go through this client; reaching it is a bug in the benchmark
+        client = object()
+
+        def touch():
+            for path in paths:
+                os.utime(path, ns=(time.time_ns(), time.time_ns()))
+
+        async def sync():
+            with contextlib.redirect_stdout(io.StringIO()):
+                await vs_setup_async(["benchmark"] * documents, paths, client=client, json_file_path=records_path)
+
+        async def rehash():
+            touch()
+            await sync()
+
+        rehash_ms = await best_of(repeat, rehash)
+        return {
+            "rehash_ms_per_mb": rehash_ms / (documents * size / 1e6),
+            "unchanged_ms": await best_of(repeat, sync),
+        }
+
+
+@benchmark
+async def audio_loop(repeat: int, quick: bool) -> dict[str, float]:
+    """
+    DailyAgent's receive and send loops for several calls, on fake Daily devices and an echoing pipeline.
+
+    The fake callers are rendered as daily-python 0.17 does, in 10 ms chunks
+    at 16 kHz, so the CPU time reported per inbound 20 ms frame includes the
+    resampling into the ring. Also reports the event loop lag and the frames the
+    inbound queues had to drop.
+    """
+    from plooxagent.api.daily import DailyAgent
+    from plooxagent.api.daily import agent as daily_agent
+    from plooxagent.api.test_concurrent_calls import EchoPipeline, FakeCallClient, FakeDaily
+
+    calls, seconds = (4, 0.5) if quick else (20, 2.0)
+    patches = {"Daily": FakeDaily, "CallClient": FakeCallClient, "VoicePipeline": EchoPipeline, "make_voice_workflow": lambda spans: None}
+    saved = {name: getattr(daily_agent, name) for name in patches}
+    for name, value in patches.items():
+        setattr(daily_agent, name, value)
+
+    cpu, lag_p99, dropped = [], [], []
+    try:
+        for _ in range(repeat):
+            FakeDaily.microphones.clear()
+            agents = [DailyAgent(f"https://fake.daily.co/room-{i + 1}") for i in range(calls)]
+            await asyncio.gather(*(agent.run() for agent in agents))
+
+            lag = []
+
+            async def watch_loop():
+                while True:
+                    started = time.perf_counter()
+                    await asyncio.sleep(0.005)
+                    lag.append(time.perf_counter() - started - 0.005)
+
+            watcher = asyncio.create_task(watch_loop())
+            started = time.process_time()
+            await asyncio.sleep(seconds)
+            used = time.process_time() - started
+            watcher.cancel()
+            await asyncio.gather(*(agent.stop() for agent in agents))
+            await asyncio.gather(*(agent._task for agent in agents))
+
+            frames = sum(agent.inbound_stats.frames for agent in agents)
+            cpu.append(used / max(frames, 1) * 1e6)
+            lag_p99.append(float(np.percentile(lag, 99)) * 1e3)
+            dropped.append(sum(agent.inbound_stats.dropped_frames for agent in agents))
+    finally:
+        for name, value in saved.items():
+            setattr(daily_agent, name, value)
+    return {
+        "cpu_us_per_frame": min(cpu),
+        "loop_lag_p99_ms": min(lag_p99),
+        "dropped_frames": min(dropped),
+    }
+
+
+async def run(names: t.Iterable[str] | None = None, repeat: int = 5, quick: bool = False) -> dict:
+    """Run the named benchmarks, all by default, and return their results with the environment they ran in."""
+    results = {}
+    for name in names or BENCHMARKS:
+        started = time.perf_counter()
+        results[name] = await BENCHMARKS[name](repeat, quick)
+        print(f"{name}: done in {time.perf_counter() - started:.1f} s", file=sys.stderr)
+    return {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+        "repeat": repeat,
+        "quick": quick,
+        "results": results,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.25, min_delta: float = 0.05) -> list[dict]:
+    """
+    Every metric found in both results and the baseline, with those that got worse flagged.
+
+    Args:
+        results: Output of run
+        baseline: Earlier output of run
+        tolerance: Relative slowdown allowed before a metric counts as a regression
+        min_delta: Absolute change below which a metric never counts, to ignore noise on tiny values
+
+    Returns:
+        list: One {"benchmark", "metric", "baseline", "value", "change", "regression"} per metric
+    """
+    rows = []
+    for name, metrics in results["results"].items():
+        for metric, value in metrics.items():
+            before = baseline.get("results", {}).get(name, {}).get(metric)
+            if before is None:
+                continue
+            change = (value - before) / before if before else float(value > 0)
+            rows.append({
+                "benchmark": name,
+                "metric": metric,
+                "baseline": before,
+                "value": value,
+                "change": change,
+                "regression": change > tolerance and value - before > min_delta,
+            })
+    return rows
+
+
+def read_results(path: str) -> dict | None:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def write_results(results: dict, path: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run, all by default: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="small sizes, for a smoke test")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results = asyncio.run(run(args.names, repeat=args.repeat, quick=args.quick))
+    write_results(results, args.output)
+    if args.update_baseline:
+        write_results(results, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    baseline = read_results(args.baseline)
+    if baseline is None:
+        for name, metrics in results["results"].items():
+            for metric, value in metrics.items():
+                print(f"{name:12} {metric:26} {value:10.3f}")
+        print(f"No baseline at {args.baseline}; save one with --update-baseline")
+        return 0
+
+    rows = compare(results, baseline, tolerance=args.tolerance)
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(
+            f"{row['benchmark']:12} {row['metric']:26} {row['baseline']:10.3f} -> {row['value']:10.3f}"
+            f" {row['change']:+7.1%} {flag}"
+        )
+    regressions = sum(row["regression"] for row in rows)
+    print(f"{regressions} regressions against the baseline from {baseline.get('commit')} ({baseline.get('created_at')})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import asyncio
+import collections
+import dataclasses
+import time
+import typing as t
+
+K = t.TypeVar("K")
+V = t.TypeVar("V")
+
+
+@dataclasses.dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    # Lookups that joined a fetch already in flight for the same key
+    coalesced: int = 0
+    expired: int = 0
+    evicted: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses + self.coalesced
+        return (self.hits + self.coalesced) / lookups if lookups else 0.0
+
+
+class TTLCache(t.Generic[K, V]):
+    """
+    LRU cache whose entries expire after a TTL, with one fetch in flight per key.
+
+    Concurrent lookups of a key that is missing share the fetch started by the
+    first of them. Failed fetches are not cached.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries: collections.OrderedDict[K, tuple[float, V]] = collections.OrderedDict()
+        self._in_flight: dict[K, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: K, fetch: t.Callable[[], t.Awaitable[V]], ttl: float | None = None) -> V:
+        """
+        Return the cached value of ``key``, or fetch and cache it.
+
+        Args:
+            key: Cache key
+            fetch: Called without arguments to get the value on a miss
+            ttl: Lifetime of the value if fetched now, instead of the cache's own
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if time.monotonic() < expires_at:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return value
+            del self._entries[key]
+            self.stats.expired += 1
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.stats.coalesced += 1
+        else:
+            self.stats.misses += 1
+            task = asyncio.create_task(self._fetch(key, fetch, self.ttl if ttl is None else ttl))
+            self._in_flight[key] = task
+        # One caller giving up must not cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    def put(self, key: K, value: V, ttl: float | None = None) -> None:
+        self._store(key, value, time.monotonic() + (self.ttl if ttl is None else ttl))
+
+    def items(self) -> list[tuple[K, V, float]]:
+        """Live entries, least recently used first, with the seconds each has left."""
+        now = time.monotonic()
+        return [(key, value, expires_at - now) for key, (expires_at, value) in self._entries.items() if expires_at > now]
+
+    def invalidate(self, key: K) -> None:
+        self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate: t.Callable[[K], bool]) -> None:
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+
+    async def _fetch(self, key: K, fetch: t.Callable[[], t.Awaitable[V]], ttl: float) -> V:
+        # Counted from the request, as a token's expiry is set when it is minted
+        started = time.monotonic()
+        try:
+            value = await fetch()
+        finally:
+            del self._in_flight[key]
+        if ttl > 0:
+            self._store(key, value, started + ttl)
+        return value
+
+    def _store(self, key: K, value: V, expires_at: float) -> None:
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats.evicted += 1
@@ -1,11 +1,26 @@
 from agents import function_tool
+import asyncio
+import functools
 from datetime import date, datetime
 from typing import Optional, Literal
 from pathlib import Path
 import os
-from plooxagent.api.database.calendar import HotelCalendar
+from pydantic import BaseModel
+from plooxagent.api.database.calendar import ROOM_TYPES, CalendarArrays, CalendarView, HotelCalendar, HotelCalendarStore
+from plooxagent.api.database.journal import JournalError
+from plooxagent.api.database.mapped import MappedCalendarStore, binary_twin
+from plooxagent.api.database.shards import CalendarShards
+from plooxagent.api.hotels import DEFAULT_HOTEL, hotel_dir, hotel_id
+from plooxagent.api.database.postgres import active_calendar
+from plooxagent.api.database.quotes import find_stays, quote_stays
+from plooxagent.api.offload import ToolTimeout, run_blocking
 
 CALENDAR_PATH = "data/hotel_calendar_data.csv"
+CALENDAR_BUSY = "Sorry, the calendar is not responding right now. Please try again in a moment."
+NO_CALENDAR = "Sorry, we don't have availability information for this hotel."
+INVALID_DATE = "Invalid date format. Please use YYYY-MM-DD format."
+# The tools turn a reversed stay away before it reaches any calendar backend
+REVERSED_DATES = "The end date must not be before the start date."
 
 
 def get_calendar(csv_path: Optional[str] = CALENDAR_PATH):
@@ -16,17 +31,14 @@ def get_calendar(csv_path: Optional[str] = CALENDAR_PATH):
         csv_path (str, optional): Path to the CSV file. Default is "data/hotel_calendar_data.csv".
         
     Returns:
-        dict: Dictionary mapping dates to HotelCalendar objects
+        CalendarView: Read-only mapping of dates to HotelCalendar objects
     """
-    calendar_data = {}
-    
     # Try to load from CSV if it exists
     if csv_path is not None and Path(csv_path).exists():
         calendar_data = HotelCalendar.load_from_csv(csv_path)
     else:    
-        # Generate the data and store in dictionary
-        for entry in HotelCalendar.generate_mock_data(start_date=date(2025, 4, 20), days=365):
-            calendar_data[entry.date] = entry
+        # Generate the data as arrays, without building a model per day
+        calendar_data = CalendarView(CalendarArrays.mock(start_date=date(2025, 4, 20), days=365))
         
         # Save to CSV using the HotelCalendar.write_csv method
         HotelCalendar.write_csv(calendar_data, csv_path)
@@ -34,74 +46,143 @@ def get_calendar(csv_path: Optional[str] = CALENDAR_PATH):
     return calendar_data
 
 
-@function_tool
-def check_vacancy(start_date: str, end_date: str, number_of_persons: int) -> str:
+def open_calendar_store(csv_path: str) -> HotelCalendarStore:
+    """
+    Open a new array-backed store for the calendar at csv_path, without loading it yet.
+
+    With CALENDAR_BACKEND=mmap the store is the memory-mapped ".cal" twin of the
+    CSV, imported from it the first time and again whenever the CSV is newer.
+    With CALENDAR_BACKEND=postgres, which holds only the default hotel, the
+    other hotels use their ".cal" twins as well.
+    """
+    if os.environ.get("CALENDAR_BACKEND", "csv") in ("mmap", "postgres"):
+        return MappedCalendarStore(binary_twin(csv_path))
+    return HotelCalendarStore(csv_path)
+
+
+@functools.cache
+def get_calendar_shards() -> CalendarShards:
+    """Calendar stores of this process, at most HOTEL_CALENDARS_RESIDENT of them kept in memory."""
+    return CalendarShards(open_calendar_store, max_resident=int(os.environ.get("HOTEL_CALENDARS_RESIDENT", "64")))
+
+
+def get_calendar_store(csv_path: str = CALENDAR_PATH) -> HotelCalendarStore:
+    """
+    Get the process-wide array-backed store for a hotel calendar, generating mock data if the CSV is missing.
+    
+    Args:
+        csv_path (str, optional): Path to the CSV file. Default is "data/hotel_calendar_data.csv".
+        
+    Returns:
+        HotelCalendarStore: Shared store for csv_path, reloaded if the file changed
+    """
+    if not Path(csv_path).exists():
+        get_calendar(csv_path)
+    return get_calendar_shards().get(csv_path)
+
+
+def hotel_calendar_path(hotel: str) -> str:
+    """CSV calendar of ``hotel``: CALENDAR_PATH for the default hotel, else the one in its hotel directory."""
+    if hotel == DEFAULT_HOTEL:
+        return CALENDAR_PATH
+    return os.path.join(hotel_dir(hotel), "hotel_calendar_data.csv")
+
+
+def hotel_calendar_store(hotel: str) -> HotelCalendarStore:
+    """
+    Store of the calendar of ``hotel``, loaded on first use.
+    
+    Raises:
+        FileNotFoundError: If the hotel has no calendar; only the default hotel gets mock data
+    """
+    if hotel == DEFAULT_HOTEL:
+        return get_calendar_store(CALENDAR_PATH)
+    csv_path = hotel_calendar_path(hotel)
+    if not Path(csv_path).exists():
+        # Checked first, so an unknown hotel does not push a loaded one out
+        raise FileNotFoundError(f"No calendar for hotel {hotel!r} at {csv_path}")
+    return get_calendar_shards().get(csv_path)
+
+
+def hotel_calendar(hotel: str):
+    """The Postgres calendar if it serves ``hotel``; it only holds the default hotel, the others keep their files."""
+    return active_calendar() if hotel == DEFAULT_HOTEL else None
+
+
+def _quote_from_csv(hotel: str, start: date, end: date, number_of_persons: int) -> dict | str:
+    """
+    Blocking part of check_vacancy on the CSV calendar, run on the tool pool.
+    
+    Returns:
+        dict | str: Total prices of the room types available on all requested days, or a message for the guest
+    """
     # Get calendar data
-    calendar_data = get_calendar(CALENDAR_PATH)
+    try:
+        store = hotel_calendar_store(hotel)
+    except FileNotFoundError:
+        return NO_CALENDAR
     
-    # Convert string dates to date objects
+    # Check if dates are in our calendar
+    if store.index_of(start) is None or store.index_of(end) is None:
+        return "Sorry, we don't have availability information for these dates."
+    
+    missing_dates = store.missing_dates(start, end)
+    if missing_dates:
+        return f"No availability information for {missing_dates[0]}."
+    
+    return store.quote(start, end, number_of_persons)
+
+
+def _book_in_csv(hotel: str, start: date, end: date, room_type: str) -> list[date] | str:
+    """
+    Blocking part of book_a_room on the CSV calendar, run on the tool pool.
+    
+    Returns:
+        list | str: Dates without a free room, none of which were booked, or a message for the guest
+    """
+    # Get calendar data
     try:
-        start = datetime.strptime(start_date, "%Y-%m-%d").date()
-        end = datetime.strptime(end_date, "%Y-%m-%d").date()
-    except ValueError:
-        return "Invalid date format. Please use YYYY-MM-DD format."
+        store = hotel_calendar_store(hotel)
+    except FileNotFoundError:
+        return NO_CALENDAR
     
     # Check if dates are in our calendar
-    if start not in calendar_data or end not in calendar_data:
+    if store.index_of(start) is None or store.index_of(end) is None:
         return "Sorry, we don't have availability information for these dates."
     
-    # Track available room types and their total prices
-    available_room_types = {
-        "budget": 0,
-        "superior": 0,
-        "executive": 0
-    }
-    
-    # Track if each room type is available for all dates
-    room_type_available_all_dates = {
-        "budget": True,
-        "superior": True,
-        "executive": True
-    }
-    
-    # Check vacancy for all requested days
-    current_date = start
-    
-    while current_date <= end:
-        if current_date not in calendar_data:
-            return f"No availability information for {current_date}."
-        
-        day_data = calendar_data[current_date]
-        
-        # Check each room type
-        for room_type in ["budget", "superior", "executive"]:
-            room_data = getattr(day_data, room_type)
-            
-            # If no rooms available for this date, mark this room type as unavailable
-            if room_data.available_rooms <= 0:
-                room_type_available_all_dates[room_type] = False
-                continue
-            
-            # Calculate price based on number of persons
-            if number_of_persons == 1:
-                price = room_data.base_price_1person
-            elif number_of_persons == 2:
-                price = room_data.base_price_2people
-            else:
-                # More than 2 people
-                price = room_data.base_price_2people + (number_of_persons - 2) * room_data.extra_person_price
-            
-            # Add price to total for this room type
-            available_room_types[room_type] += price
-        
-        current_date = date.fromordinal(current_date.toordinal() + 1)  # Move to next day
+    # Decrease available rooms by 1 on every day, or on none of them
+    try:
+        return store.book(start, end, room_type)
+    except JournalError:
+        return "Sorry, the booking could not be saved. No rooms were booked, please try again."
+
+
+@function_tool
+async def check_vacancy(start_date: str, end_date: str, number_of_persons: int) -> str:
+    # Convert string dates to date objects
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError:
+        return INVALID_DATE
+    if start > end:
+        return REVERSED_DATES
     
-    # Filter room types that are available for all dates
-    available_options = [
-        (room_type, price) for room_type, price in available_room_types.items() 
-        if room_type_available_all_dates[room_type]
-    ]
-    available_options = dict(available_options)
+    hotel = hotel_id()
+    calendar = hotel_calendar(hotel)
+    if calendar is not None:
+        # One aggregate query over the stay
+        available_options = await calendar.quote(start, end, number_of_persons)
+        if available_options is None:
+            return "Sorry, we don't have availability information for these dates."
+    else:
+        # File I/O stays off the event loop that carries the audio of every call
+        try:
+            available_options = await run_blocking("check_vacancy", _quote_from_csv, hotel, start, end, number_of_persons)
+        except ToolTimeout:
+            return CALENDAR_BUSY
+        if isinstance(available_options, str):
+            return available_options
     
     # Return results
     if not available_options:
@@ -111,8 +192,136 @@ def check_vacancy(start_date: str, end_date: str, number_of_persons: int) -> str
         return (1, available_options) # [0][1])  # Vacancy with total price
 
 
+class StayQuery(BaseModel):
+    start_date: str
+    end_date: str
+    number_of_persons: int
+
+
+@function_tool
+async def check_vacancy_batch(stays: list[StayQuery]) -> list:
+    """
+    Check vacancy for several stays at once, e.g. alternative dates or party sizes for the same guest.
+    
+    Args:
+        stays (list): Stays to check, each with start_date and end_date in YYYY-MM-DD format and number_of_persons
+        
+    Returns:
+        list: For every stay in order, the same (vacancy, available_options) tuple as check_vacancy, or an error message
+    """
+    # Convert string dates to date objects
+    parsed = []
+    for stay in stays:
+        try:
+            start = datetime.strptime(stay.start_date, "%Y-%m-%d").date()
+            end = datetime.strptime(stay.end_date, "%Y-%m-%d").date()
+        except ValueError:
+            parsed.append(INVALID_DATE)
+            continue
+        parsed.append(REVERSED_DATES if start > end else (start, end, stay.number_of_persons))
+    
+    valid = [stay for stay in parsed if not isinstance(stay, str)]
+    hotel = hotel_id()
+    calendar = hotel_calendar(hotel)
+    if calendar is not None:
+        quotes = await asyncio.gather(*(calendar.quote(*stay) for stay in valid))
+    else:
+        # All stays are answered from the precomputed price and availability tables, off the event loop
+        try:
+            quotes = await run_blocking("check_vacancy_batch", lambda: quote_stays(hotel_calendar_store(hotel), valid))
+        except ToolTimeout:
+            return [CALENDAR_BUSY] * len(stays)
+        except FileNotFoundError:
+            return [NO_CALENDAR] * len(stays)
+    
+    results = []
+    quotes = iter(quotes)
+    for stay in parsed:
+        if isinstance(stay, str):
+            results.append(stay)
+            continue
+        available_options = next(quotes)
+        if available_options is None:
+            results.append("Sorry, we don't have availability information for these dates.")
+        elif not available_options:
+            results.append((0, None))  # No vacancy
+        else:
+            results.append((1, available_options))
+    return results
+
+
+@function_tool
+async def find_best_stays(
+    nights: int,
+    from_date: str,
+    to_date: str,
+    number_of_persons: int,
+    room_type: Optional[Literal["budget", "superior", "executive"]] = None,
+    max_total_price: Optional[float] = None,
+    order_by: Literal["cheapest", "earliest"] = "cheapest",
+    limit: int = 5,
+) -> list | str:
+    """
+    Find the best available stays of a given length within a period, e.g. "any 3 nights in May under 400".
+    
+    Args:
+        nights (int): Number of nights of the stay
+        from_date (str): First possible night in YYYY-MM-DD format
+        to_date (str): Last possible night in YYYY-MM-DD format
+        number_of_persons (int): Number of guests sharing the room
+        room_type (str, optional): Only consider this room type (budget, superior, or executive)
+        max_total_price (float, optional): Maximum total price of the whole stay
+        order_by (str, optional): Rank by "cheapest" total price or "earliest" start. Default is "cheapest".
+        limit (int, optional): Maximum number of stays to return. Default is 5.
+        
+    Returns:
+        list: Ranked stays with start_date, end_date (last night, as taken by book_a_room), room_type and total_price
+    """
+    # Convert string dates to date objects
+    try:
+        earliest = datetime.strptime(from_date, "%Y-%m-%d").date()
+        latest = datetime.strptime(to_date, "%Y-%m-%d").date()
+    except ValueError:
+        return INVALID_DATE
+    
+    search = dict(
+        nights=nights,
+        earliest=earliest,
+        latest=latest,
+        number_of_persons=number_of_persons,
+        room_types=ROOM_TYPES if room_type is None else (room_type,),
+        max_total_price=max_total_price,
+        order_by=order_by,
+        limit=limit,
+    )
+    hotel = hotel_id()
+    calendar = hotel_calendar(hotel)
+    if calendar is not None:
+        stays = await calendar.find_stays(**search)
+    else:
+        # Every start day is scored at once from the precomputed price and availability tables, off the event loop
+        try:
+            stays = await run_blocking("find_best_stays", lambda: find_stays(hotel_calendar_store(hotel), **search))
+        except ToolTimeout:
+            return CALENDAR_BUSY
+        except FileNotFoundError:
+            return NO_CALENDAR
+    
+    if not stays:
+        return "No stays match these criteria."
+    return [
+        {
+            "start_date": stay["start"].strftime("%Y-%m-%d"),
+            "end_date": stay["end"].strftime("%Y-%m-%d"),
+            "room_type": stay["room_type"],
+            "total_price": stay["total_price"],
+        }
+        for stay in stays
+    ]
+
+
 @function_tool
-def book_a_room(
+async def book_a_room(
     start_date: str, end_date: str, room_type: Literal["budget", "superior", "executive"]
 ) -> str:
     """
@@ -126,51 +335,37 @@ def book_a_room(
     Returns:
         str: Booking confirmation or error message
     """
-    # Get calendar data
-    calendar_data = get_calendar(CALENDAR_PATH)
-    
     # Convert string dates to date objects
     try:
         start = datetime.strptime(start_date, "%Y-%m-%d").date()
         end = datetime.strptime(end_date, "%Y-%m-%d").date()
     except ValueError:
-        return "Invalid date format. Please use YYYY-MM-DD format."
+        return INVALID_DATE
+    if start > end:
+        return REVERSED_DATES
     
-    # Check if dates are in our calendar
-    if start not in calendar_data or end not in calendar_data:
-        return "Sorry, we don't have availability information for these dates."
-    
-    # Track dates where booking failed
-    failed_dates = []
-    
-    # Process booking for all requested days
-    current_date = start
-    while current_date <= end:
-        if current_date not in calendar_data:
-            failed_dates.append(current_date)
-            current_date = date.fromordinal(current_date.toordinal() + 1)
-            continue
-        
-        day_data = calendar_data[current_date]
-        room_data = getattr(day_data, room_type)
-        
-        # Check if rooms are available
-        if room_data.available_rooms <= 0:
-            failed_dates.append(current_date)
-        else:
-            # Decrease available rooms by 1
-            room_data.available_rooms -= 1
-        
-        current_date = date.fromordinal(current_date.toordinal() + 1)  # Move to next day
+    hotel = hotel_id()
+    calendar = hotel_calendar(hotel)
+    if calendar is not None:
+        # A single conditional UPDATE over the stay, rolled back unless every night had a room
+        failed_dates = await calendar.book(start, end, room_type)
+    else:
+        try:
+            failed_dates = await run_blocking("book_a_room", _book_in_csv, hotel, start, end, room_type)
+        except ToolTimeout:
+            # The booking may still go through in its thread, so the guest must not simply retry
+            return (
+                "Sorry, the calendar did not confirm the booking in time. "
+                "Please check with the front desk before booking again."
+            )
+        if isinstance(failed_dates, str):
+            return failed_dates
     
     # If any dates failed, return error message
     if failed_dates:
         failed_dates_str = ", ".join([d.strftime("%Y-%m-%d") for d in failed_dates])
         return f"Booking failed for the following dates: {failed_dates_str}. No rooms were booked."
     
-    # Save updated calendar data
-    HotelCalendar.write_csv(calendar_data, csv_path=CALENDAR_PATH)
-    
     # Return success message
     return f"Successfully booked a {room_type} room from {start_date} to {end_date}."
 
@@ -1,2 +1,2 @@
-from .agent import DailyAgent
+from .agent import DailyAgent, init_daily
 from .service import DailyService
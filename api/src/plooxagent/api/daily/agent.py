@@ -1,24 +1,74 @@
 import asyncio
 import logging
 import dataclasses
+import threading
+import time
+import typing as t
+import uuid
 
-import numpy as np
+from agents.voice import StreamedAudioInput, VoicePipeline, VoicePipelineConfig
 
-from agents.voice import StreamedAudioInput, VoicePipeline, SingleAgentVoiceWorkflow
+from daily import AudioData, Daily, EventHandler, VirtualMicrophoneDevice, CallClient
+from plooxagent.api.agentic_components import make_voice_workflow
+from plooxagent.api.voice_metrics import TurnSpans
 
-from daily import Daily, VirtualSpeakerDevice, VirtualMicrophoneDevice, CallClient
-from plooxagent.api.agentic_components import triage_agent
+from .audio import AudioStats, InboundAudio, OutboundAudio, OutboundStats
 
 logger = logging.getLogger(__name__)
 
 SAMPLE_RATE = 24000
 
-Daily.init()
+_daily_initialized = False
+_daily_init_lock = threading.Lock()
+
+
+def init_daily() -> None:
+    """Initialize the Daily SDK once per process, on startup or before the first call."""
+    global _daily_initialized
+    with _daily_init_lock:
+        if not _daily_initialized:
+            Daily.init()
+            _daily_initialized = True
+
+
+class _SessionEvents(EventHandler):
+    """Routes the room events of one CallClient to the DailyAgent that owns it."""
+
+    def __new__(cls, *args, **kwargs):
+        # EventHandler.__new__ accepts no arguments
+        return super().__new__(cls)
+
+    def __init__(self, agent: "DailyAgent"):
+        super().__init__()
+        self.agent = agent
+
+    def on_participant_joined(self, participant):
+        self.agent._listen_to(participant)
+
+    def on_participant_left(self, participant, reason):
+        self.agent._forget(participant)
 
 
 @dataclasses.dataclass
 class DailyAgent:
     room_uri: str
+    # Size of the audio frames exchanged with the voice pipeline and the devices: 10, 20 or 40 ms
+    frame_ms: int = 20
+    # Sample rate of the audio the voice pipeline speaks; resampled to SAMPLE_RATE if different
+    output_sample_rate: int = SAMPLE_RATE
+
+    # Names this call's devices, so that any number of calls can share a process
+    session_id: str = dataclasses.field(
+        init=False,
+        default_factory=lambda: uuid.uuid4().hex[:12],
+    )
+
+    # Set once the caller has left the room
+    caller_left: bool = dataclasses.field(
+        init=False,
+        default=False,
+        repr=False,
+    )
 
     _ready_event: asyncio.Event = dataclasses.field(
         init=False,
@@ -35,44 +85,150 @@ class DailyAgent:
         default=None,
         repr=False,
     )
+    inbound_stats: AudioStats = dataclasses.field(
+        init=False,
+        default_factory=AudioStats,
+        repr=False,
+    )
+    outbound_stats: OutboundStats = dataclasses.field(
+        init=False,
+        default_factory=OutboundStats,
+        repr=False,
+    )
+    _outbound: OutboundAudio | None = dataclasses.field(
+        init=False,
+        default=None,
+        repr=False,
+    )
+    _inbound: InboundAudio | None = dataclasses.field(
+        init=False,
+        default=None,
+        repr=False,
+    )
+    _client: CallClient | None = dataclasses.field(
+        init=False,
+        default=None,
+        repr=False,
+    )
+    _caller_id: str | None = dataclasses.field(
+        init=False,
+        default=None,
+        repr=False,
+    )
+    _caller_lock: threading.Lock = dataclasses.field(
+        init=False,
+        default_factory=threading.Lock,
+        repr=False,
+    )
+    _activity_at: float = dataclasses.field(
+        init=False,
+        default_factory=time.monotonic,
+        repr=False,
+    )
+    # Latency marks of the current turn
+    spans: TurnSpans = dataclasses.field(
+        init=False,
+        default_factory=TurnSpans,
+        repr=False,
+    )
 
     async def run(self) -> None:
         self._task = asyncio.create_task(self._run())
-        await self._ready_event.wait()
+        ready = asyncio.create_task(self._ready_event.wait())
+        await asyncio.wait([ready, self._task], return_when=asyncio.FIRST_COMPLETED)
+        if not self._ready_event.is_set():
+            # The call failed before the pipeline came up
+            ready.cancel()
+            self._task.result()
+            raise RuntimeError(f"{self}: call ended before it was ready")
 
     async def stop(self) -> None:
         self._done_event.set()
 
+    async def wait(self) -> None:
+        """Wait until the call has ended and its devices are released."""
+        if self._task is not None:
+            await self._task
+
+    @property
+    def last_activity(self) -> float:
+        """``time.monotonic()`` of the last time the caller spoke, joined or got an answer."""
+        voice_at = self._inbound.last_voice_at if self._inbound is not None else 0.0
+        return max(self._activity_at, voice_at)
+
+    def memory_bytes(self) -> int:
+        """Bytes held by this call's audio buffers."""
+        return sum(
+            buffer.nbytes for buffer in (self._inbound, self._outbound) if buffer is not None
+        )
+
+    def interrupt(self) -> None:
+        """Stop speaking at once, dropping the audio still queued for the room."""
+        if self._outbound is not None:
+            self._outbound.interrupt()
+
     async def _run(self) -> None:
-        client = CallClient()
+        init_daily()
+        inbound = InboundAudio(sample_rate=SAMPLE_RATE, frame_ms=self.frame_ms)
+        inbound.start()
+        self._inbound = inbound
+        self.inbound_stats = inbound.stats
+        self.spans.last_voice = lambda: inbound.last_voice_at
+        client = CallClient(event_handler=_SessionEvents(self))
+        self._client = client
 
         try:
-            microphone, speaker = self._create_devices()
-            Daily.select_speaker_device(speaker.name)
+            microphone = self._create_microphone()
             await self._join_room(microphone, client)
             logger.info("%s: joined the room", self)
-            await self._run_pipeline(microphone, speaker)
+            # Participants who were in the room before us get no joined event
+            for participant in client.participants().values():
+                self._listen_to(participant)
+            await self._run_pipeline(microphone, inbound)
         finally:
             self._done_event.set()
+            await inbound.stop()
             client.leave()
             client.release()
+            self._client = None
 
-    def _create_devices(self) -> tuple[VirtualMicrophoneDevice, VirtualSpeakerDevice]:
-        microphone = Daily.create_microphone_device(
-            "my-mic",
+    def _create_microphone(self) -> VirtualMicrophoneDevice:
+        # Daily keeps devices by name for the life of the process, so every call gets its own
+        return Daily.create_microphone_device(
+            f"mic-{self.session_id}",
             sample_rate=SAMPLE_RATE,
             channels=1,
         )
-        speaker = Daily.create_speaker_device(
-            "my-speaker",
-            sample_rate=SAMPLE_RATE,
-            channels=1,
-        )
-        return microphone, speaker
+
+    def _listen_to(self, participant: t.Mapping[str, t.Any]) -> None:
+        # Called on a Daily thread. The first remote participant is the caller, and
+        # their audio is rendered for this client only, unlike the process-wide speaker.
+        if participant.get("info", {}).get("isLocal", participant.get("id") == "local"):
+            return
+        with self._caller_lock:
+            if self._caller_id is not None or self._client is None:
+                return
+            self._caller_id = participant["id"]
+            self.caller_left = False
+            self._activity_at = time.monotonic()
+            self._client.set_audio_renderer(participant["id"], self._on_caller_audio)
+        logger.info("%s: listening to %s", self, participant["id"])
+
+    def _forget(self, participant: t.Mapping[str, t.Any]) -> None:
+        with self._caller_lock:
+            if participant.get("id") == self._caller_id:
+                self._caller_id = None
+                self.caller_left = True
+
+    def _on_caller_audio(self, participant_id: str, audio: AudioData) -> None:
+        # The renderer hands out audio at the SDK's own rate and chunk size, not the ring's
+        if participant_id == self._caller_id:
+            self._inbound.write_rendered(audio.audio_frames, audio.sample_rate, audio.num_channels)
 
     async def _join_room(
         self, microphone: VirtualMicrophoneDevice, client: CallClient
     ) -> None:
+        loop = asyncio.get_running_loop()
         joined_event = asyncio.Event()
         client.join(
             self.room_uri,
@@ -85,49 +241,74 @@ class DailyAgent:
                     },
                 }
             },
-            completion=lambda *_: joined_event.set(),
+            # The completion runs on a Daily thread
+            completion=lambda *_: loop.call_soon_threadsafe(joined_event.set),
         )
         await joined_event.wait()
 
     async def _run_pipeline(
         self,
         microphone: VirtualMicrophoneDevice,
-        speaker: VirtualSpeakerDevice,
+        inbound: InboundAudio,
     ) -> None:
         logger.info("%s: running voice pipeline", self)
-        pipeline = VoicePipeline(workflow=SingleAgentVoiceWorkflow(triage_agent))
+        # Inbound frames are views into a ring that is reused, so the STT must not keep them for tracing
+        pipeline = VoicePipeline(
+            workflow=make_voice_workflow(self.spans),
+            config=VoicePipelineConfig(trace_include_sensitive_audio_data=False),
+        )
         audio_input = StreamedAudioInput()
         result = await pipeline.run(audio_input)
 
         self._ready_event.set()
 
+        outbound = OutboundAudio(
+            microphone,
+            sample_rate=SAMPLE_RATE,
+            input_sample_rate=self.output_sample_rate,
+            frame_ms=self.frame_ms,
+            on_first_frame=self.spans.first_frame,
+        )
+        self.outbound_stats = outbound.stats
+        self._outbound = outbound
+        outbound.start()
         try:
             tasks = [
-                asyncio.create_task(self._send_mic_audio(speaker, audio_input)),
-                asyncio.create_task(self._handle_events(microphone, result)),
+                asyncio.create_task(self._send_mic_audio(inbound, audio_input)),
+                asyncio.create_task(self._handle_events(outbound, result)),
             ]
             await self._done_event.wait()
         finally:
             logger.info("%s: stopping voice pipeline", self)
             for task in tasks:
                 task.cancel()
-            await asyncio.gather(*tasks)
+            await asyncio.gather(*tasks, return_exceptions=True)
+            outbound.interrupt()
+            await asyncio.gather(inbound.stop(), outbound.stop())
+            self._outbound = None
+            logger.info("%s: inbound audio %s", self, self.inbound_stats)
+            logger.info("%s: outbound audio %s", self, self.outbound_stats)
+            logger.info("%s: %d turns answered, last %s", self, self.spans.turns, self.spans.last)
 
     @staticmethod
     async def _send_mic_audio(
-        speaker: VirtualSpeakerDevice,
+        inbound: InboundAudio,
         audio_input: StreamedAudioInput,
     ) -> None:
-        read_size = int(SAMPLE_RATE * 0.02)
-
-        while True:
-            data = speaker.read_frames(read_size)
-            if len(data) > 0:
-                await audio_input.add_audio(np.frombuffer(data, dtype=np.int16))
-            await asyncio.sleep(0.01)
+        async for frame in inbound.frames(in_flight=audio_input.queue.qsize):
+            await audio_input.add_audio(frame)
 
-    @staticmethod
-    async def _handle_events(microphone: VirtualMicrophoneDevice, result) -> None:
+    async def _handle_events(self, outbound: OutboundAudio, result) -> None:
         async for event in result.stream():
             if event.type == "voice_stream_event_audio":
-                microphone.write_frames(event.data.tobytes())
+                if event.data is not None:
+                    self.spans.audio()
+                    await outbound.push(event.data)
+            elif event.type == "voice_stream_event_lifecycle":
+                self._activity_at = time.monotonic()
+                if event.event == "turn_started":
+                    # A new answer supersedes whatever is left of the previous one
+                    outbound.interrupt()
+                    self.spans.answer_started()
+                elif event.event == "turn_ended":
+                    outbound.end_turn()
@@ -0,0 +1,400 @@
+import asyncio
+import dataclasses
+import logging
+import threading
+import time
+import typing as t
+
+import numpy as np
+
+from daily import VirtualMicrophoneDevice
+
+logger = logging.getLogger(__name__)
+
+FRAME_MS = (10, 20, 40)
+
+
+@dataclasses.dataclass
+class AudioStats:
+    frames: int = 0
+    # Frames received while the ring was full, and thrown away
+    dropped_frames: int = 0
+    # Frames handed to the pipeline more than one frame duration after they arrived
+    late_frames: int = 0
+    # Deliveries of less than a frame, i.e. an underrun
+    short_reads: int = 0
+
+
+@dataclasses.dataclass
+class OutboundStats:
+    frames: int = 0
+    # Samples queued for the device right now, and the most ever queued
+    depth_samples: int = 0
+    max_depth_samples: int = 0
+    # Samples thrown away because the guest interrupted the agent
+    drained_samples: int = 0
+    # Times the voice pipeline had to wait for room in the jitter buffer
+    full_waits: int = 0
+    # Times the device was left without audio in the middle of a turn
+    underruns: int = 0
+
+
+class LinearResampler:
+    """Streaming linear-interpolation resampler for mono audio, continuous across chunks."""
+
+    def __init__(self, from_rate: int, to_rate: int):
+        self.step = from_rate / to_rate
+        # Position of the next output sample, counted from the last sample of the previous chunk
+        self._pos = 0.0
+        self._last: np.ndarray | None = None
+
+    def __call__(self, samples: np.ndarray) -> np.ndarray:
+        x = samples.astype(np.float32)
+        if self._last is not None:
+            x = np.concatenate([self._last, x])
+        if len(x) == 0:
+            return x
+        positions = np.arange(self._pos, len(x) - 1 + 1e-9, self.step)
+        out = np.interp(positions, np.arange(len(x)), x)
+        next_pos = positions[-1] + self.step if len(positions) else self._pos
+        self._pos = next_pos - (len(x) - 1)
+        self._last = x[-1:]
+        return out
+
+
+class InboundAudio:
+    """
+    Collects a call's inbound audio into a preallocated int16 ring buffer.
+
+    Frames are pushed with ``write`` from the thread that produces them: the
+    Daily audio renderer of one CallClient calls ``write_rendered`` once per
+    chunk, which converts it to the ring's rate first, so nothing polls while
+    the room is silent and every call keeps its own audio. The event
+    loop is woken once per frame; ``frames()`` then yields read-only views of the
+    slots without copying. A slot is reused only after the consumer reports that
+    the pipeline has taken the frame, so views stay valid while they are queued;
+    a frame dropped on a full ring still wakes the loop, so slots the pipeline
+    has since drained are released and the ring takes audio again.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        frame_ms: int = 20,
+        capacity_ms: int = 2000,
+        voice_threshold: int = 500,
+    ):
+        if frame_ms not in FRAME_MS:
+            raise ValueError(f"frame_ms must be one of {FRAME_MS}, got {frame_ms}")
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.stats = AudioStats()
+        # Frames peaking at or above voice_threshold count as the caller speaking
+        self.voice_threshold = voice_threshold
+        self.last_voice_at = time.monotonic()
+
+        slots = max(capacity_ms // frame_ms, 2)
+        self._ring = np.zeros((slots, self.frame_samples), dtype=np.int16)
+        self._captured_at = np.zeros(slots, dtype=np.float64)
+        # Monotonic frame counters: written by the producing thread, handed out and
+        # released by the event loop. Each is only ever advanced by one side.
+        self._written = 0
+        self._handed = 0
+        self._released = 0
+
+        # Converting rendered audio: the resampler of its current rate, and samples short of a whole frame
+        self._resample: LinearResampler | None = None
+        self._resample_from: int | None = None
+        self._pending = np.zeros(0, dtype=np.int16)
+
+        self._stopping = threading.Event()
+        self._ready: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def nbytes(self) -> int:
+        return self._ring.nbytes + self._captured_at.nbytes
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._ready is not None:
+            self._ready.set()
+
+    def write(self, data: bytes) -> None:
+        """Store int16 audio, one frame per slot; called from the producing thread."""
+        if self._loop is None or self._stopping.is_set():
+            return
+        slots = len(self._ring)
+        samples = np.frombuffer(data, dtype=np.int16)
+        if len(samples) < self.frame_samples:
+            self.stats.short_reads += 1
+        if len(samples) and (samples.max() >= self.voice_threshold or samples.min() <= -self.voice_threshold):
+            self.last_voice_at = time.monotonic()
+        written = self._written
+        for offset in range(0, len(samples), self.frame_samples):
+            chunk = samples[offset:offset + self.frame_samples]
+            self.stats.frames += 1
+            if written - self._released >= slots:
+                self.stats.dropped_frames += 1
+                continue
+            row = self._ring[written % slots]
+            row[:len(chunk)] = chunk
+            row[len(chunk):] = 0
+            self._captured_at[written % slots] = time.monotonic()
+            written += 1
+        if written == self._written and written - self._released < slots:
+            return
+        # Frames were stored, or dropped on a full ring: either way wake the consumer,
+        # which releases the slots the pipeline has taken since it last looked
+        self._written = written
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # Event loop closed under us; the session is over
+            self._stopping.set()
+
+    def write_rendered(self, data: bytes, sample_rate: int, channels: int = 1) -> None:
+        """
+        Store int16 audio at any rate, channel count and chunk size, as a Daily audio renderer delivers it;
+        called from the producing thread.
+
+        Channels are averaged to mono and the audio is resampled to the ring's
+        rate; samples short of a whole frame wait for the next chunk. Whole
+        frames already at the ring's rate are stored without a copy.
+        """
+        if (
+            channels == 1
+            and sample_rate == self.sample_rate
+            and not len(self._pending)
+            and len(data) % (2 * self.frame_samples) == 0
+        ):
+            self.write(data)
+            return
+        samples = np.frombuffer(data, dtype=np.int16)
+        if channels > 1:
+            samples = samples.reshape(-1, channels).mean(axis=1)
+        if sample_rate != self.sample_rate:
+            if self._resample_from != sample_rate:
+                self._resample = LinearResampler(sample_rate, self.sample_rate)
+                self._resample_from = sample_rate
+            samples = self._resample(samples)
+        if samples.dtype != np.int16:
+            samples = np.clip(np.rint(samples), -32768, 32767).astype(np.int16)
+        samples = np.concatenate([self._pending, samples])
+        whole = len(samples) - len(samples) % self.frame_samples
+        self._pending = samples[whole:]
+        if whole:
+            self.write(samples[:whole])
+
+    async def frames(self, in_flight: t.Callable[[], int] = lambda: 0) -> t.AsyncIterator[np.ndarray]:
+        """
+        Yield every frame as a read-only view into the ring buffer.
+
+        Args:
+            in_flight: Number of yielded frames the consumer still holds (e.g. the
+                size of the pipeline's input queue); their slots are not reused.
+        """
+        slots = len(self._ring)
+        frame_seconds = self.frame_ms / 1000
+        while not self._stopping.is_set():
+            await self._ready.wait()
+            self._ready.clear()
+            self._released = max(self._released, self._handed - in_flight())
+            while self._handed < self._written:
+                slot = self._handed % slots
+                if time.monotonic() - self._captured_at[slot] > frame_seconds:
+                    self.stats.late_frames += 1
+                view = self._ring[slot]
+                view.flags.writeable = False
+                self._handed += 1
+                yield view
+                self._released = max(self._released, self._handed - in_flight())
+
+
+class OutboundAudio:
+    """
+    Writes the voice pipeline's audio to a Daily virtual microphone from a dedicated thread.
+
+    ``push`` converts each chunk to int16 at the device rate (resampling if the
+    pipeline speaks at another rate) straight into a bounded, preallocated jitter
+    buffer, and waits for room when the buffer is full. The writer thread hands
+    the device fixed-size frames; the blocking ``write_frames`` paces it, so a
+    slow device never stalls the event loop. A frame stays reserved in the
+    buffer until the device is done with it, so it is passed as a view and only
+    copied for the Daily device, whose ``write_frames`` takes nothing but bytes. ``interrupt`` drops whatever is
+    still queued so the agent stops talking at once. ``on_first_frame`` is
+    called on the event loop with the ``time.monotonic()`` at which the first
+    frame of every answer was written.
+    """
+
+    def __init__(
+        self,
+        microphone: VirtualMicrophoneDevice,
+        sample_rate: int,
+        input_sample_rate: int | None = None,
+        frame_ms: int = 20,
+        capacity_ms: int = 1000,
+        on_first_frame: t.Callable[[float], None] | None = None,
+    ):
+        if frame_ms not in FRAME_MS:
+            raise ValueError(f"frame_ms must be one of {FRAME_MS}, got {frame_ms}")
+        self.microphone = microphone
+        self._frames_as_bytes = isinstance(microphone, VirtualMicrophoneDevice)
+        self.on_first_frame = on_first_frame
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.stats = OutboundStats()
+
+        frames = max(capacity_ms // frame_ms, 2)
+        self._buffer = np.zeros(frames * self.frame_samples, dtype=np.int16)
+        self._resample = (
+            LinearResampler(input_sample_rate, sample_rate)
+            if input_sample_rate is not None and input_sample_rate != sample_rate
+            else None
+        )
+        # Monotonic sample counters into the circular buffer, guarded by _cond
+        self._written = 0
+        self._read = 0
+        self._in_turn = False
+        self._playing = False
+        # Set while the writer hands the device the frame at _read, which push must not overwrite
+        self._writing = False
+        # Set by the first push of an answer, cleared once its first frame is written
+        self._answer_pending = False
+        # Bumped by interrupt, so that a push waiting for room abandons the rest of its chunk
+        self._generation = 0
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._space: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def nbytes(self) -> int:
+        return self._buffer.nbytes
+
+    @property
+    def depth_ms(self) -> float:
+        return self.stats.depth_samples * 1000 / self.sample_rate
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._space = asyncio.Event()
+        self._thread = threading.Thread(
+            target=self._write_loop, name=f"outbound-{self.microphone.name}", daemon=True
+        )
+        self._thread.start()
+
+    async def stop(self) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join, self.frame_ms / 1000 * 5)
+
+    async def push(self, data: np.ndarray) -> None:
+        """Queue one chunk of pipeline audio (int16, or float32 in [-1, 1]) for the device."""
+        if data.dtype != np.int16:
+            data = (np.clip(data, -1.0, 1.0) * 32767).astype(np.int16)
+        if self._resample is not None:
+            data = np.clip(self._resample(data), -32768, 32767).astype(np.int16)
+
+        size = len(self._buffer)
+        generation = self._generation
+        offset = 0
+        while offset < len(data):
+            with self._cond:
+                if self._generation != generation:
+                    return
+                room = size - (self._written - self._read)
+                if room == 0:
+                    self.stats.full_waits += 1
+                    self._space.clear()
+                else:
+                    count = min(room, len(data) - offset)
+                    start = self._written % size
+                    first = min(count, size - start)
+                    self._buffer[start:start + first] = data[offset:offset + first]
+                    self._buffer[:count - first] = data[offset + first:offset + count]
+                    self._written += count
+                    if not self._in_turn:
+                        self._answer_pending = True
+                    self._in_turn = True
+                    offset += count
+                    self._track_depth()
+                    self._cond.notify()
+                    continue
+            await self._space.wait()
+
+    def end_turn(self) -> None:
+        """Pad the last partial frame of a turn with silence so the writer sends it."""
+        with self._cond:
+            partial = (self._written - self._read) % self.frame_samples
+            if partial:
+                pad = self.frame_samples - partial
+                if self._written - self._read + pad <= len(self._buffer):
+                    start = self._written % len(self._buffer)
+                    end = min(start + pad, len(self._buffer))
+                    self._buffer[start:end] = 0
+                    self._buffer[:pad - (end - start)] = 0
+                    self._written += pad
+            self._in_turn = self._playing = False
+            self._track_depth()
+            self._cond.notify()
+
+    def interrupt(self) -> None:
+        """Drop all queued audio; at most the frame being written still reaches the device."""
+        with self._cond:
+            # The frame being written keeps its place; _read only ever moves by whole frames
+            in_flight = self.frame_samples if self._writing else 0
+            self.stats.drained_samples += self._written - self._read - in_flight
+            self._written = self._read + in_flight
+            self._generation += 1
+            self._in_turn = self._playing = self._answer_pending = False
+            self._track_depth()
+        self._space.set()
+
+    def _track_depth(self) -> None:
+        self.stats.depth_samples = self._written - self._read
+        self.stats.max_depth_samples = max(self.stats.max_depth_samples, self.stats.depth_samples)
+
+    def _write_loop(self) -> None:
+        size = len(self._buffer)
+        try:
+            while True:
+                with self._cond:
+                    while not self._stopping and self._written - self._read < self.frame_samples:
+                        if self._in_turn and self._playing:
+                            self.stats.underruns += 1
+                            self._playing = False
+                        self._cond.wait()
+                    if self._stopping:
+                        return
+                    # Frames never straddle the end of the buffer: its size is a multiple of the frame
+                    start = self._read % size
+                    frame = self._buffer[start:start + self.frame_samples]
+                    self._writing = True
+                    self._playing = self._in_turn
+                    first, self._answer_pending = self._answer_pending, False
+                try:
+                    self.microphone.write_frames(frame.tobytes() if self._frames_as_bytes else frame.data.cast("B"))
+                finally:
+                    with self._cond:
+                        self._writing = False
+                        self._read += self.frame_samples
+                        self._track_depth()
+                self._loop.call_soon_threadsafe(self._space.set)
+                self.stats.frames += 1
+                if first and self.on_first_frame is not None:
+                    self._loop.call_soon_threadsafe(self.on_first_frame, time.monotonic())
+        except RuntimeError:
+            # Event loop closed under us; the session is over
+            pass
+        except Exception:
+            logger.exception("%s: outbound audio writer failed", self.microphone.name)
@@ -0,0 +1,62 @@
+import dataclasses
+import typing as t
+
+from ..caching import TTLCache
+from .vendor.rest_helper import DailyMeetingTokenParams, DailyRESTHelper, DailyRoomObject
+
+
+class CachedDailyRESTHelper(DailyRESTHelper):
+    """
+    DailyRESTHelper that reuses meeting tokens and room lookups.
+
+    A token is handed out again until ``token_margin`` seconds before it
+    expires, so a reused token is always valid for at least that long. Tokens
+    with custom ``params`` are minted every time. Room objects are kept for
+    ``room_ttl`` seconds. Both are forgotten when their room is deleted.
+    """
+
+    def __init__(
+        self,
+        *,
+        token_margin: float = 60.0,
+        room_ttl: float = 30.0,
+        maxsize: int = 1024,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.token_margin = token_margin
+        self.tokens: TTLCache[tuple, str] = TTLCache(maxsize=maxsize)
+        self.rooms: TTLCache[str, DailyRoomObject] = TTLCache(maxsize=maxsize, ttl=room_ttl)
+
+    async def get_token(
+        self,
+        room_url: str,
+        expiry_time: float = 60 * 60,
+        eject_at_token_exp: bool = False,
+        owner: bool = True,
+        params: t.Optional[DailyMeetingTokenParams] = None,
+    ) -> str:
+        fetch = super().get_token
+        if params is not None or not room_url:
+            return await fetch(room_url, expiry_time, eject_at_token_exp, owner, params)
+        return await self.tokens.get(
+            (room_url, expiry_time, eject_at_token_exp, owner),
+            lambda: fetch(room_url, expiry_time, eject_at_token_exp, owner),
+            # Tokens that would not outlive the margin are not reused
+            ttl=expiry_time - self.token_margin,
+        )
+
+    async def delete_room_by_name(self, room_name: str) -> bool:
+        self.rooms.invalidate(room_name)
+        self.tokens.invalidate_where(lambda key: self.get_name_from_url(key[0]) == room_name)
+        return await super().delete_room_by_name(room_name)
+
+    async def _get_room_from_name(self, room_name: str) -> DailyRoomObject:
+        fetch = super()._get_room_from_name
+        return await self.rooms.get(room_name, lambda: fetch(room_name))
+
+    def cache_stats(self) -> dict:
+        return {
+            name: {**dataclasses.asdict(cache.stats), "hit_rate": cache.stats.hit_rate, "size": len(cache)}
+            for name, cache in (("tokens", self.tokens), ("rooms", self.rooms))
+        }
@@ -1,37 +1,163 @@
+import asyncio
+import collections
 import contextlib
 import dataclasses
+import logging
+import time
 import typing as t
 import os
 
-import aiohttp
-
+from .cache import CachedDailyRESTHelper
+from .transport import DailyTransport, EndpointStats, TransportConfig
 from .vendor.rest_helper import (
-    DailyRESTHelper,
     DailyRoomParams,
     DailyRoomProperties,
     DailyRoomSipParams,
 )
 
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class RoomPoolStats:
+    # Rooms served from the pool, and rooms created on demand because it was empty
+    hits: int = 0
+    misses: int = 0
+    created: int = 0
+    # Pooled rooms deleted because they were about to expire
+    evicted: int = 0
+    refill_failures: int = 0
+    # Time to create one room in the background, in seconds
+    refill_latency_last: float = 0.0
+    refill_latency_max: float = 0.0
+    refill_latency_total: float = 0.0
+    refills: int = 0
+
+    @property
+    def refill_latency_avg(self) -> float:
+        return self.refill_latency_total / self.refills if self.refills else 0.0
+
 
 @dataclasses.dataclass
 class DailyService:
-    _rest_helper: DailyRESTHelper
+    _rest_helper: CachedDailyRESTHelper
+    # Number of rooms kept ready; 0 creates every room on demand
+    pool_size: int = 0
+    # Lifetime of a new room (its `exp`), in seconds
+    room_ttl: float = 60 * 60
+    # Pooled rooms with less lifetime than this left are deleted instead of handed out
+    min_remaining: float = 10 * 60
+    # How often the pool is checked for expiring rooms, in seconds
+    refill_interval: float = 30.0
+
+    stats: RoomPoolStats = dataclasses.field(
+        init=False,
+        default_factory=RoomPoolStats,
+    )
+    _pool: collections.deque[tuple[str, float]] = dataclasses.field(
+        init=False,
+        default_factory=collections.deque,
+        repr=False,
+    )
+    _wakeup: asyncio.Event = dataclasses.field(
+        init=False,
+        default_factory=asyncio.Event,
+        repr=False,
+    )
+    _refill_task: asyncio.Task | None = dataclasses.field(
+        init=False,
+        default=None,
+        repr=False,
+    )
+
+    def __post_init__(self) -> None:
+        if self.pool_size > 0 and self.room_ttl <= self.min_remaining + self.refill_interval:
+            raise ValueError("room_ttl must outlast min_remaining + refill_interval, or pooled rooms expire at once")
 
     @classmethod
-    async def create(cls, cm: contextlib.AsyncExitStack) -> t.Self:
-        api_url = "https://api.daily.co/v1"
+    async def create(
+        cls,
+        cm: contextlib.AsyncExitStack,
+        api_url: str | None = None,
+        pool_size: int | None = None,
+        **kwargs,
+    ) -> t.Self:
+        api_url = api_url or os.environ.get("DAILY_API_URL", "https://api.daily.co/v1")
         api_key = os.environ["DAILY_API_KEY"]
+        if pool_size is None:
+            pool_size = int(os.environ.get("DAILY_ROOM_POOL_SIZE", "2"))
 
-        session = await cm.enter_async_context(aiohttp.ClientSession())
-        rest_helper = DailyRESTHelper(
+        config = TransportConfig(
+            limit_per_host=int(os.environ.get("DAILY_HTTP_MAX_CONNECTIONS", "20")),
+            timeout=float(os.environ.get("DAILY_HTTP_TIMEOUT", "5")),
+            retries=int(os.environ.get("DAILY_HTTP_RETRIES", "3")),
+        )
+        transport = await cm.enter_async_context(DailyTransport(config))
+        rest_helper = CachedDailyRESTHelper(
             daily_api_key=api_key,
             daily_api_url=api_url,
-            aiohttp_session=session,
+            aiohttp_session=transport,
+            token_margin=float(os.environ.get("DAILY_TOKEN_MARGIN", "60")),
+            room_ttl=float(os.environ.get("DAILY_ROOM_CACHE_TTL", "30")),
         )
-        return cls(rest_helper)
+        service = cls(rest_helper, pool_size=pool_size, **kwargs)
+        if service.pool_size > 0:
+            service._refill_task = asyncio.create_task(service._refill_loop())
+            cm.push_async_callback(service.close)
+        return service
+
+    @property
+    def pooled_rooms(self) -> int:
+        return len(self._pool)
 
     async def create_room(self) -> str:
-        """Create a room and return its endpoint URI."""
+        """Return the endpoint URI of a fresh room, from the pool when one is ready."""
+        now = time.time()
+        while self._pool:
+            room_uri, exp = self._pool.popleft()
+            if exp - now >= self.min_remaining:
+                self.stats.hits += 1
+                self._wakeup.set()
+                return room_uri
+            await self._evict(room_uri)
+
+        self.stats.misses += 1
+        self._wakeup.set()
+        room_uri, _ = await self._new_room()
+        return room_uri
+
+    async def delete_room(self, room_uri: str) -> None:
+        """Delete a room once its call has ended; failures are logged, the room expires anyway."""
+        await self._delete(room_uri)
+
+    async def get_token(self, room_uri: str) -> str:
+        return await self._rest_helper.get_token(room_uri)
+
+    def cache_stats(self) -> dict:
+        """Hit rates of the token and room lookup caches."""
+        return self._rest_helper.cache_stats()
+
+    def http_stats(self) -> dict:
+        """Circuit state, retries and latency per endpoint of the Daily API."""
+        return self._rest_helper.aiohttp_session.stats()
+
+    @property
+    def http_endpoints(self) -> dict[str, EndpointStats]:
+        """Live request counters and latency histograms per endpoint of the Daily API."""
+        return dict(self._rest_helper.aiohttp_session.endpoints)
+
+    async def close(self) -> None:
+        """Stop refilling and delete the rooms nobody took."""
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._refill_task
+            self._refill_task = None
+        rooms, self._pool = list(self._pool), collections.deque()
+        await asyncio.gather(*(self._delete(room_uri) for room_uri, _ in rooms))
+
+    async def _new_room(self) -> tuple[str, float]:
+        exp = time.time() + self.room_ttl
         sip_props = DailyRoomSipParams(
             display_name="Bot room",
             video=False,
@@ -39,12 +165,54 @@ class DailyService:
             num_endpoints=1,
         )
         daily_room_props = DailyRoomProperties(
+            exp=exp,
             sip=sip_props,
         )
         params = DailyRoomParams(properties=daily_room_props)
         room = await self._rest_helper.create_room(params=params)
-        return room.url
+        self.stats.created += 1
+        return room.url, exp
 
-    async def get_token(self, room_uri: str) -> str:
-        return await self._rest_helper.get_token(room_uri)
+    async def _add_room(self) -> None:
+        started = time.monotonic()
+        try:
+            room = await self._new_room()
+        except Exception:
+            self.stats.refill_failures += 1
+            logger.exception("Unable to pre-create a Daily room")
+            return
+        latency = time.monotonic() - started
+        self.stats.refills += 1
+        self.stats.refill_latency_last = latency
+        self.stats.refill_latency_total += latency
+        self.stats.refill_latency_max = max(self.stats.refill_latency_max, latency)
+        self._pool.append(room)
+
+    async def _evict(self, room_uri: str) -> None:
+        self.stats.evicted += 1
+        await self._delete(room_uri)
+
+    async def _delete(self, room_uri: str) -> None:
+        try:
+            await self._rest_helper.delete_room_by_url(room_uri)
+        except Exception:
+            logger.exception("Unable to delete Daily room %s", room_uri)
+
+    async def _refill_loop(self) -> None:
+        while True:
+            # Rooms expire in creation order, so the oldest ones are at the front
+            deadline = time.time() + self.min_remaining + self.refill_interval
+            while self._pool and self._pool[0][1] < deadline:
+                room_uri, _ = self._pool.popleft()
+                await self._evict(room_uri)
+
+            missing = self.pool_size - len(self._pool)
+            if missing > 0:
+                failures = self.stats.refill_failures
+                await asyncio.gather(*(self._add_room() for _ in range(missing)))
+                if self.stats.refill_failures == failures:
+                    continue
 
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), self.refill_interval)
+            self._wakeup.clear()
@@ -0,0 +1,262 @@
+import asyncio
+import collections
+import dataclasses
+import email.utils
+import logging
+import random
+import time
+import typing as t
+from urllib.parse import urlparse
+
+import aiohttp
+
+from ..metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Responses that say nothing was done and the same request may succeed later
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Creating a room twice leaves an orphan, so POSTs are retried only when the API surely did nothing
+RETRY_STATUSES_POST = frozenset({429, 503})
+
+
+class CircuitOpen(Exception):
+    """Raised without a request while the Daily API is considered down."""
+
+
+@dataclasses.dataclass
+class TransportConfig:
+    # Connections kept to the API, in total and per host
+    limit: int = 100
+    limit_per_host: int = 20
+    keepalive_timeout: float = 30.0
+    # How long resolved addresses are reused, in seconds
+    ttl_dns_cache: int = 300
+    # Total time per attempt, in seconds; per endpoint such as "POST /rooms" or "GET /rooms/{name}"
+    timeout: float = 5.0
+    timeouts: dict[str, float] = dataclasses.field(default_factory=lambda: {"POST /rooms": 10.0})
+    # Attempts after the first one, and the full-jitter backoff between them, in seconds
+    retries: int = 3
+    backoff_base: float = 0.2
+    backoff_max: float = 5.0
+    # Retry-After values above this are not waited for
+    max_retry_after: float = 30.0
+    # Consecutive failures that open the circuit, and how long it stays open, in seconds
+    failure_threshold: int = 5
+    reset_timeout: float = 30.0
+
+
+class CircuitBreaker:
+    """
+    Fails fast after ``failure_threshold`` consecutive failures.
+
+    Once ``reset_timeout`` has passed, a single request is let through. Its
+    success closes the circuit and its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened = 0
+        self._opened_at: float | None = None
+        # When the request probing a half-open circuit went out; another may go if it never reports back
+        self._probe_at: float | None = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        now = time.monotonic()
+        if now - self._opened_at < self.reset_timeout:
+            return "open"
+        if self._probe_at is not None and now - self._probe_at < self.reset_timeout:
+            return "open"
+        return "half-open"
+
+    def check(self) -> None:
+        """Raise CircuitOpen unless a request may go out now."""
+        state = self.state
+        if state == "open":
+            raise CircuitOpen(f"Daily API circuit is open after {self.failures} failures")
+        if state == "half-open":
+            self._probe_at = time.monotonic()
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._opened_at = None
+        self._probe_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probe_at is not None or (self._opened_at is None and self.failures >= self.failure_threshold):
+            self.opened += 1
+            self._opened_at = time.monotonic()
+            self._probe_at = None
+
+
+@dataclasses.dataclass
+class EndpointStats:
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    statuses: collections.Counter[int] = dataclasses.field(default_factory=collections.Counter)
+    latency: Histogram = dataclasses.field(default_factory=Histogram)
+
+
+def endpoint_of(method: str, url: str) -> str:
+    """Name a request by its method and API route, e.g. "GET /rooms/{name}"."""
+    parts = urlparse(url).path.rstrip("/").split("/")
+    # Paths look like /v1/<collection>[/<name>]
+    route = "/" + parts[2] if len(parts) > 2 else "/"
+    if len(parts) > 3:
+        route += "/{name}"
+    return f"{method} {route}"
+
+
+def retry_after(response: aiohttp.ClientResponse) -> float | None:
+    """Seconds to wait according to the Retry-After header, given in seconds or as an HTTP date."""
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class DailyTransport:
+    """
+    HTTP session for the Daily REST API that stands in for ``aiohttp.ClientSession``.
+
+    Requests go over a bounded keep-alive pool with cached DNS. Each attempt has
+    the timeout of its endpoint. Connection errors, timeouts and retryable
+    statuses are retried with full-jitter backoff, waiting at least as long as
+    Retry-After asks. A circuit breaker stops sending once the API keeps
+    failing. Latencies are recorded per endpoint.
+    """
+
+    def __init__(self, config: TransportConfig | None = None):
+        self.config = config or TransportConfig()
+        self.breaker = CircuitBreaker(self.config.failure_threshold, self.config.reset_timeout)
+        self.endpoints: collections.defaultdict[str, EndpointStats] = collections.defaultdict(EndpointStats)
+        self._session: aiohttp.ClientSession | None = None
+
+    async def __aenter__(self) -> t.Self:
+        connector = aiohttp.TCPConnector(
+            limit=self.config.limit,
+            limit_per_host=self.config.limit_per_host,
+            keepalive_timeout=self.config.keepalive_timeout,
+            ttl_dns_cache=self.config.ttl_dns_cache,
+            use_dns_cache=True,
+        )
+        self._session = aiohttp.ClientSession(connector=connector)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._session.close()
+
+    def get(self, url: str, **kwargs) -> "_Request":
+        return _Request(self, "GET", url, kwargs)
+
+    def post(self, url: str, **kwargs) -> "_Request":
+        return _Request(self, "POST", url, kwargs)
+
+    def delete(self, url: str, **kwargs) -> "_Request":
+        return _Request(self, "DELETE", url, kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "circuit": self.breaker.state,
+            "circuit_opened": self.breaker.opened,
+            "endpoints": {
+                endpoint: {
+                    "requests": stats.requests,
+                    "retries": stats.retries,
+                    "failures": stats.failures,
+                    "statuses": dict(stats.statuses),
+                    "latency": stats.latency.snapshot(),
+                }
+                for endpoint, stats in self.endpoints.items()
+            },
+        }
+
+    async def request(self, method: str, url: str, **kwargs) -> aiohttp.ClientResponse:
+        """
+        Send a request, retrying it as configured.
+
+        Returns:
+            aiohttp.ClientResponse: The last response, which the caller must release
+
+        Raises:
+            CircuitOpen: If the circuit is open
+            aiohttp.ClientError: If the last attempt could not connect, or a POST
+                broke off after it was sent
+            asyncio.TimeoutError: If the last attempt, or any POST, timed out
+        """
+        config = self.config
+        endpoint = endpoint_of(method, url)
+        stats = self.endpoints[endpoint]
+        timeout = aiohttp.ClientTimeout(total=config.timeouts.get(endpoint, config.timeout))
+        retry_statuses = RETRY_STATUSES_POST if method == "POST" else RETRY_STATUSES
+
+        for attempt in range(config.retries + 1):
+            self.breaker.check()
+            stats.requests += 1
+            stats.retries += attempt > 0
+            started = time.monotonic()
+            try:
+                response = await self._session.request(method, url, timeout=timeout, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                stats.latency.observe(time.monotonic() - started)
+                stats.failures += 1
+                self.breaker.record_failure()
+                # A POST that timed out or broke off may have been carried out,
+                # so only one that never connected is sent again
+                if attempt == config.retries or (method == "POST" and not isinstance(e, aiohttp.ClientConnectorError)):
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning("%s failed (%r), retrying in %.2f s", endpoint, e, delay)
+            else:
+                stats.latency.observe(time.monotonic() - started)
+                stats.statuses[response.status] += 1
+                if response.status < 500:
+                    # The API is up, even if it turned this request down
+                    self.breaker.record_success()
+                else:
+                    stats.failures += 1
+                    self.breaker.record_failure()
+                if response.status not in retry_statuses or attempt == config.retries:
+                    return response
+                wait = retry_after(response)
+                if wait is not None and wait > config.max_retry_after:
+                    return response
+                response.release()
+                delay = max(self._backoff(attempt), wait or 0.0)
+                logger.warning("%s returned %d, retrying in %.2f s", endpoint, response.status, delay)
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.config.backoff_max, self.config.backoff_base * 2**attempt))
+
+
+class _Request:
+    """``async with`` wrapper around ``DailyTransport.request``, like aiohttp's request context manager."""
+
+    def __init__(self, transport: DailyTransport, method: str, url: str, kwargs: dict):
+        self._transport = transport
+        self._method = method
+        self._url = url
+        self._kwargs = kwargs
+        self._response: aiohttp.ClientResponse | None = None
+
+    async def __aenter__(self) -> aiohttp.ClientResponse:
+        self._response = await self._transport.request(self._method, self._url, **self._kwargs)
+        return self._response
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._response.release()
@@ -1,8 +1,45 @@
-from datetime import date, datetime
-import csv
+from collections.abc import Iterable, ItemsView, Iterator, Mapping, ValuesView
+from datetime import date
+import dataclasses
+import io
 import os
+import threading
+from typing import Optional
+
+import numpy as np
 from pydantic import BaseModel, Field, conint
 
+from plooxagent.api.database.journal import BookingJournal, JournalError
+
+ROOM_TYPES = ("budget", "superior", "executive")
+
+CSV_HEADER = [
+    'date',
+    'budget_available', 'budget_price_1p', 'budget_price_2p', 'budget_extra_price',
+    'superior_available', 'superior_price_1p', 'superior_price_2p', 'superior_extra_price',
+    'executive_available', 'executive_price_1p', 'executive_price_2p', 'executive_extra_price'
+]
+
+# Fields of RoomTypeCalendar, in CSV column order
+FIELDS = ("available_rooms", "base_price_1person", "base_price_2people", "extra_person_price")
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# A CSV row as read_csv parses it: the date, then every field of every room type
+_CSV_ROW = np.dtype([("date", "datetime64[D]"), ("values", np.float64, (len(FIELDS) * len(ROOM_TYPES),))])
+
+# What repr ends a whole number of cents with, ".0" and ".01" to ".99", NUL-padded to 3 bytes
+_CENTS = np.array(
+    [b".0"] + [f".{k:02d}".rstrip("0").encode() for k in range(1, 100)], dtype="S3"
+).view(np.uint8).reshape(100, 3)
+
+# Mock availability choices and price ranges of every room type, in ROOM_TYPES order
+_MOCK_RANGES = (
+    ([0, 0, 0, 1, 2, 3, 4, 5], (50, 100), (80, 120), (20, 30)),
+    ([0, 0, 1, 2, 3], (100, 150), (150, 200), (30, 40)),
+    ([0, 1, 2], (200, 300), (300, 400), (50, 70)),
+)
+
 class RoomTypeCalendar(BaseModel):
     available_rooms: conint(ge=0) = Field(..., description="Number of available rooms. 0 means no vacancy")
     base_price_1person: float = Field(..., description="Price for one person occupying the room")
@@ -17,46 +54,29 @@ class HotelCalendar(BaseModel):
     executive: RoomTypeCalendar = Field(..., description="Executive room availability and pricing")
 
     @classmethod
-    def generate_mock_data(cls, start_date: date = date(2025, 4, 25), days: int = 365):
+    def generate_mock_data(cls, start_date: date = date(2025, 4, 25), days: int = 365, seed: Optional[int] = None):
         """Generate mock calendar data with realistic pricing and random availability"""
-        from datetime import timedelta
-        import random
-        
-        for day in range(days):
-            current_date = start_date + timedelta(days=day)
-            
-            yield cls(
-                date=current_date,
-                budget=RoomTypeCalendar(
-                    available_rooms=random.choice([0, 0, 0, 1, 2, 3, 4, 5]),
-                    base_price_1person=round(random.uniform(50, 100), 2),
-                    base_price_2people=round(random.uniform(80, 120), 2),
-                    extra_person_price=round(random.uniform(20, 30), 2)
-                ),
-                superior=RoomTypeCalendar(
-                    available_rooms=random.choice([0, 0, 1, 2, 3]),
-                    base_price_1person=round(random.uniform(100, 150), 2),
-                    base_price_2people=round(random.uniform(150, 200), 2),
-                    extra_person_price=round(random.uniform(30, 40), 2)
-                ),
-                executive=RoomTypeCalendar(
-                    available_rooms=random.choice([0, 1, 2]),
-                    base_price_1person=round(random.uniform(200, 300), 2),
-                    base_price_2people=round(random.uniform(300, 400), 2),
-                    extra_person_price=round(random.uniform(50, 70), 2)
-                )
-            )
+        for _, entry in CalendarArrays.mock(start_date, days, seed).entries():
+            yield entry
     
     @classmethod
-    def load_from_csv(cls, csv_path=None):
+    def load_from_csv(cls, csv_path=None, validate: bool = False):
         """
         Load hotel calendar data from a CSV file.
         
+        The file is parsed in bulk into a CalendarArrays; the HotelCalendar objects
+        are built, unvalidated, when a date is looked up.
+        
         Args:
             csv_path (str, optional): Path to the CSV file. If None, uses the default path.
+            validate (bool, optional): Check every value the way the pydantic models would,
+                for files that did not come from us. Default is False.
             
         Returns:
-            dict: Dictionary mapping dates to HotelCalendar objects
+            CalendarView: Read-only mapping of dates to HotelCalendar objects
+            
+        Raises:
+            ValueError: If validate is set and a value is out of range
         """
         if csv_path is None:
             # Use default path relative to the src directory
@@ -65,43 +85,7 @@ class HotelCalendar(BaseModel):
         if not os.path.exists(csv_path):
             raise FileNotFoundError(f"CSV file not found at {csv_path}")
         
-        calendar_data = {}
-        
-        with open(csv_path, 'r', newline='') as csvfile:
-            reader = csv.reader(csvfile)
-            # Skip header
-            next(reader)
-            
-            for row in reader:
-                # Parse date
-                entry_date = datetime.strptime(row[0], "%Y-%m-%d").date()
-                
-                # Create HotelCalendar object
-                calendar_entry = cls(
-                    date=entry_date,
-                    budget=RoomTypeCalendar(
-                        available_rooms=int(row[1]),
-                        base_price_1person=float(row[2]),
-                        base_price_2people=float(row[3]),
-                        extra_person_price=float(row[4])
-                    ),
-                    superior=RoomTypeCalendar(
-                        available_rooms=int(row[5]),
-                        base_price_1person=float(row[6]),
-                        base_price_2people=float(row[7]),
-                        extra_person_price=float(row[8])
-                    ),
-                    executive=RoomTypeCalendar(
-                        available_rooms=int(row[9]),
-                        base_price_1person=float(row[10]),
-                        base_price_2people=float(row[11]),
-                        extra_person_price=float(row[12])
-                    )
-                )
-                
-                calendar_data[entry_date] = calendar_entry
-        
-        return calendar_data
+        return CalendarView(CalendarArrays.read_csv(csv_path, validate=validate))
     
     @classmethod
     def write_csv(cls, calendar_data, csv_path=None):
@@ -109,34 +93,516 @@ class HotelCalendar(BaseModel):
         Write hotel calendar data to a CSV file.
         
         Args:
-            calendar_data (dict): Dictionary mapping dates to HotelCalendar objects
+            calendar_data (Mapping): Mapping of dates to HotelCalendar objects, e.g. a CalendarView
             csv_path (str, optional): Path to the CSV file. If None, uses the default path.
         """
         if csv_path is None:
             # Use default path relative to the src directory
             csv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "hotel_calendar_data.csv")
         
+        if isinstance(calendar_data, CalendarView):
+            arrays = calendar_data.arrays
+        else:
+            arrays = CalendarArrays.from_entries(calendar_data.values())
+        arrays.write_csv(csv_path)
+
+
+@dataclasses.dataclass
+class CalendarArrays:
+    """
+    Hotel calendar as NumPy arrays, the compact form every bulk path works on.
+
+    Row ``i`` holds the day ``origin + i`` and there is one column per room type
+    in ``ROOM_TYPES`` order, for every field of ``RoomTypeCalendar``. Days
+    missing from the source are flagged in ``known``.
+    """
+
+    origin: Optional[date]
+    known: np.ndarray
+    available_rooms: np.ndarray
+    base_price_1person: np.ndarray
+    base_price_2people: np.ndarray
+    extra_person_price: np.ndarray
+
+    @classmethod
+    def empty(cls, origin: Optional[date] = None, days: int = 0) -> "CalendarArrays":
+        n_types = len(ROOM_TYPES)
+        return cls(
+            origin,
+            np.zeros(days, dtype=bool),
+            np.zeros((days, n_types), dtype=np.int32),
+            np.zeros((days, n_types), dtype=np.float64),
+            np.zeros((days, n_types), dtype=np.float64),
+            np.zeros((days, n_types), dtype=np.float64),
+        )
+
+    @classmethod
+    def from_columns(cls, ordinals: np.ndarray, values: np.ndarray, validate: bool = False) -> "CalendarArrays":
+        """
+        Build the arrays from one row per day.
+
+        Args:
+            ordinals (np.ndarray): Date ordinal of every row
+            values (np.ndarray): (rows, room types, fields) values, fields in ``FIELDS`` order
+            validate (bool, optional): Reject values the pydantic models would reject
+
+        Raises:
+            ValueError: If validate is set and a value is out of range
+        """
+        if validate:
+            rooms = values[:, :, 0]
+            bad = (rooms < 0) | (rooms != np.floor(rooms)) | ~np.isfinite(values).all(axis=2)
+            if bad.any():
+                row, col = np.argwhere(bad)[0]
+                raise ValueError(
+                    f"Invalid {ROOM_TYPES[col]} values on {date.fromordinal(int(ordinals[row]))}: {values[row, col].tolist()}"
+                )
+        if not len(ordinals):
+            return cls.empty()
+
+        first = int(ordinals.min())
+        idx = ordinals - first
+        arrays = cls.empty(date.fromordinal(first), int(idx.max()) + 1)
+        arrays.known[idx] = True
+        for field, name in enumerate(FIELDS):
+            getattr(arrays, name)[idx] = values[:, :, field]
+        return arrays
+
+    @classmethod
+    def from_entries(cls, entries: Iterable["HotelCalendar"]) -> "CalendarArrays":
+        n_types = len(ROOM_TYPES)
+        rows = [
+            (entry.date.toordinal(), *(getattr(getattr(entry, room_type), name) for room_type in ROOM_TYPES for name in FIELDS))
+            for entry in entries
+        ]
+        table = np.array(rows, dtype=np.float64).reshape(len(rows), 1 + len(FIELDS) * n_types)
+        return cls.from_columns(table[:, 0].astype(np.int64), table[:, 1:].reshape(len(rows), n_types, len(FIELDS)))
+
+    @classmethod
+    def read_csv(cls, csv_path: str, validate: bool = False) -> "CalendarArrays":
+        """Parse a CSV in the CSV_HEADER layout, one column at a time instead of one row at a time."""
+        with open(csv_path, 'r') as csvfile:
+            _, _, body = csvfile.read().partition("\n")
+        if not body.strip():
+            return cls.empty()
+
+        n_types = len(ROOM_TYPES)
+        # One pass over the text, the date and the values of a row parsed together
+        rows = np.loadtxt(io.StringIO(body), delimiter=",", dtype=_CSV_ROW, ndmin=1)
+        ordinals = rows["date"].astype(np.int64) + _EPOCH_ORDINAL
+        return cls.from_columns(ordinals, rows["values"].reshape(len(rows), n_types, len(FIELDS)), validate=validate)
+
+    @classmethod
+    def mock(cls, start_date: date = date(2025, 4, 25), days: int = 365, seed: Optional[int] = None) -> "CalendarArrays":
+        """Mock calendar with realistic pricing and random availability."""
+        rng = np.random.default_rng(seed)
+        arrays = cls.empty(start_date, days)
+        arrays.known[:] = True
+        for col, (rooms, price_1person, price_2people, extra_person_price) in enumerate(_MOCK_RANGES):
+            arrays.available_rooms[:, col] = rng.choice(rooms, days)
+            arrays.base_price_1person[:, col] = rng.uniform(*price_1person, days).round(2)
+            arrays.base_price_2people[:, col] = rng.uniform(*price_2people, days).round(2)
+            arrays.extra_person_price[:, col] = rng.uniform(*extra_person_price, days).round(2)
+        return arrays
+
+    def copy(self) -> "CalendarArrays":
+        return CalendarArrays(self.origin, *(getattr(self, name).copy() for name in ("known", *FIELDS)))
+
+    def index_of(self, day: date) -> Optional[int]:
+        if self.origin is None or not isinstance(day, date):
+            return None
+        idx = day.toordinal() - self.origin.toordinal()
+        if idx < 0 or idx >= len(self.known) or not self.known[idx]:
+            return None
+        return idx
+
+    def date_at(self, idx: int) -> date:
+        return date.fromordinal(self.origin.toordinal() + idx)
+
+    def entry(self, idx: int) -> HotelCalendar:
+        """HotelCalendar of row ``idx``."""
+        return self._entry(self.date_at(idx), [getattr(self, name)[idx].tolist() for name in FIELDS])
+
+    def entries(self) -> Iterator[tuple[date, HotelCalendar]]:
+        """(date, HotelCalendar) of every known day, converting each column to Python once."""
+        rows = np.flatnonzero(self.known)
+        rooms = [
+            [
+                _trusted(RoomTypeCalendar, dict(zip(FIELDS, values)))
+                for values in zip(*(getattr(self, name)[rows, col].tolist() for name in FIELDS))
+            ]
+            for col in range(len(ROOM_TYPES))
+        ]
+        first = self.origin.toordinal() if self.origin is not None else 0
+        for idx, day_rooms in zip(rows.tolist(), zip(*rooms)):
+            day = date.fromordinal(first + idx)
+            yield day, _trusted(HotelCalendar, {"date": day, **dict(zip(ROOM_TYPES, day_rooms))})
+
+    @staticmethod
+    def _entry(day: date, fields: list[list]) -> HotelCalendar:
+        return _trusted(HotelCalendar, {
+            "date": day,
+            **{
+                room_type: _trusted(RoomTypeCalendar, {name: fields[i][col] for i, name in enumerate(FIELDS)})
+                for col, room_type in enumerate(ROOM_TYPES)
+            },
+        })
+
+    def to_csv_text(self) -> str:
+        """The calendar in the CSV_HEADER layout, formatted the way csv.writer formats it."""
+        rows = np.flatnonzero(self.known)
+        header = ",".join(CSV_HEADER) + "\r\n"
+        if not len(rows):
+            return header
+        table = self._csv_table(rows)
+        if table is not None:
+            # Padding is NUL, so dropping every NUL leaves the rows exactly as csv.writer writes them
+            return header + table[table != 0].tobytes().decode()
+
+        columns = [np.datetime_as_string(np.datetime64(self.origin, "D") + rows.astype("timedelta64[D]")).tolist()]
+        for col in range(len(ROOM_TYPES)):
+            columns.append(list(map(str, self.available_rooms[rows, col].tolist())))
+            columns.extend(list(map(repr, getattr(self, name)[rows, col].tolist())) for name in FIELDS[1:])
+        return header + "\r\n".join(map(",".join, zip(*columns))) + "\r\n"
+
+    def _csv_table(self, rows: np.ndarray) -> Optional[np.ndarray]:
+        """
+        ASCII of the CSV rows as one NUL-padded (rows, bytes) array, built without a Python loop over the rows.
+
+        Covers the calendars we write ourselves: prices that are non-negative whole
+        numbers of cents, for which repr is the cents with trailing zeros dropped,
+        non-negative room counts and four-digit years. Returns None for anything
+        else, which to_csv_text then formats value by value.
+        """
+        n, n_types = len(rows), len(ROOM_TYPES)
+        days = np.datetime64(self.origin, "D") + rows.astype("timedelta64[D]")
+        months = days.astype("datetime64[M]")
+        years = months.astype("datetime64[Y]").astype(np.int64) + 1970
+        rooms = self.available_rooms[rows]
+        prices = np.stack([getattr(self, name)[rows] for name in FIELDS[1:]], axis=2)
+        cents = np.rint(prices * 100)
+        if not (
+            (rooms >= 0).all()
+            and ((years >= 1000) & (years <= 9999)).all()
+            and ((cents / 100 == prices) & (prices < 1e13) & ~np.signbit(prices)).all()
+        ):
+            return None
+        cents = cents.astype(np.int64)
+        rooms_width = len(str(int(rooms.max())))
+        units_width = len(str(int(cents.max()) // 100))
+
+        table = np.zeros((n, 10 + n_types * (1 + rooms_width + (len(FIELDS) - 1) * (units_width + 4)) + 2), np.uint8)
+        table[:, 0:4] = _digits(years, 4)
+        table[:, 5:7] = _digits((months - days.astype("datetime64[Y]")).astype(np.int64) + 1, 2, pad=b"0")
+        table[:, 8:10] = _digits((days - months).astype(np.int64) + 1, 2, pad=b"0")
+        table[:, [4, 7]] = ord("-")
+        table[:, -2:] = np.frombuffer(b"\r\n", np.uint8)
+
+        types = table[:, 10:-2].reshape(n, n_types, -1)
+        types[:, :, 0] = ord(",")
+        types[:, :, 1:1 + rooms_width] = _digits(rooms, rooms_width)
+        fields = types[:, :, 1 + rooms_width:].reshape(n, n_types, len(FIELDS) - 1, units_width + 4)
+        fields[..., 0] = ord(",")
+        fields[..., 1:1 + units_width] = _digits(cents // 100, units_width)
+        fields[..., 1 + units_width:] = _CENTS[cents % 100]
+        return table
+
+    def write_csv(self, csv_path: str) -> None:
         # Ensure directory exists
-        os.makedirs(os.path.dirname(csv_path), exist_ok=True)
-        
+        os.makedirs(os.path.dirname(csv_path) or ".", exist_ok=True)
         with open(csv_path, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            # Write header
-            writer.writerow([
-                'date', 
-                'budget_available', 'budget_price_1p', 'budget_price_2p', 'budget_extra_price',
-                'superior_available', 'superior_price_1p', 'superior_price_2p', 'superior_extra_price',
-                'executive_available', 'executive_price_1p', 'executive_price_2p', 'executive_extra_price'
-            ])
-            
-            # Write data
-            for entry_date, entry in calendar_data.items():
-                writer.writerow([
-                    entry_date,
-                    entry.budget.available_rooms, entry.budget.base_price_1person, 
-                    entry.budget.base_price_2people, entry.budget.extra_person_price,
-                    entry.superior.available_rooms, entry.superior.base_price_1person, 
-                    entry.superior.base_price_2people, entry.superior.extra_person_price,
-                    entry.executive.available_rooms, entry.executive.base_price_1person, 
-                    entry.executive.base_price_2people, entry.executive.extra_person_price
-                ])
+            csvfile.write(self.to_csv_text())
+
+
+def _trusted(model: type[BaseModel], values: dict) -> BaseModel:
+    """
+    ``model`` over ``values`` as they are, for values from arrays we validated on the way in.
+
+    Does what ``model_construct`` does for a model without defaults or private
+    attributes, at a fraction of its cost.
+    """
+    instance = object.__new__(model)
+    object.__setattr__(instance, "__dict__", values)
+    object.__setattr__(instance, "__pydantic_fields_set__", set(values))
+    object.__setattr__(instance, "__pydantic_extra__", None)
+    object.__setattr__(instance, "__pydantic_private__", None)
+    return instance
+
+
+def _digits(values: np.ndarray, width: int, pad: bytes = b"\0") -> np.ndarray:
+    """ASCII digits of non-negative integers, right-aligned in ``width`` bytes and left-padded with ``pad``."""
+    values = values.astype(np.uint32 if values.max(initial=0) < 2 ** 32 else np.uint64)
+    digits = np.empty((width, *values.shape), np.uint8)
+    rest = values
+    for i in range(width - 1, -1, -1):
+        digits[i] = rest % 10 + ord("0")
+        rest = rest // 10
+    digits = np.moveaxis(digits, 0, -1)
+    leading = values[..., None] < 10 ** np.arange(width - 1, 0, -1, dtype=values.dtype)
+    digits[..., :-1][leading] = pad[0]
+    return digits
+
+
+class CalendarView(Mapping):
+    """
+    Read-only mapping of dates to HotelCalendar objects over a CalendarArrays.
+
+    Entries are built when they are looked up, so a multi-year calendar costs a
+    few arrays rather than four pydantic models per day.
+    """
+
+    def __init__(self, arrays: CalendarArrays):
+        self.arrays = arrays
+        self._rows = np.flatnonzero(arrays.known)
+
+    def __getitem__(self, day: date) -> HotelCalendar:
+        idx = self.arrays.index_of(day)
+        if idx is None:
+            raise KeyError(day)
+        return self.arrays.entry(idx)
+
+    def __iter__(self) -> Iterator[date]:
+        for idx in self._rows.tolist():
+            yield self.arrays.date_at(idx)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def items(self) -> "_CalendarItems":
+        return _CalendarItems(self)
+
+    def values(self) -> "_CalendarValues":
+        return _CalendarValues(self)
+
+
+class _CalendarItems(ItemsView):
+    # Walking every day builds the entries column by column rather than one lookup at a time
+    def __iter__(self) -> Iterator[tuple[date, HotelCalendar]]:
+        return self._mapping.arrays.entries()
+
+
+class _CalendarValues(ValuesView):
+    def __iter__(self) -> Iterator[HotelCalendar]:
+        for _, entry in self._mapping.arrays.entries():
+            yield entry
+
+
+class HotelCalendarStore:
+    """
+    Array-backed view of a hotel calendar CSV, shared by every call in the
+    process through ``CalendarShards``.
+
+    The file is parsed once into NumPy arrays with one column per room type (in
+    ``ROOM_TYPES`` order) for every field of ``RoomTypeCalendar``. Row ``i`` holds
+    the day ``origin + i``; days missing from the file are flagged in ``known``.
+    The arrays are reloaded when the file's mtime changes on disk or when
+    ``version`` is bumped through ``invalidate``. ``version`` also moves on every
+    reload and booking, so tables derived from the arrays can be keyed by it.
+
+    Bookings are not written back to the CSV one by one. They go to an
+    append-only ``BookingJournal`` next to it (``<csv_path>.journal``) that is
+    replayed on top of the CSV snapshot whenever it is loaded, and folded back
+    into the snapshot by ``compact`` every ``compact_every`` bookings.
+    """
+
+    def __init__(self, csv_path: str, compact_every: int = 1000, commit_delay: float = 0.0):
+        self.csv_path = csv_path
+        self.journal = BookingJournal(
+            csv_path + ".journal", compact_every=compact_every, commit_delay=commit_delay
+        )
+        self.version = 0
+        self.origin: Optional[date] = None
+        self._assign(CalendarArrays.empty())
+        self._lock = threading.RLock()
+        self._loaded_stamp = None
+        self._loaded_version = None
+
+    def invalidate(self) -> None:
+        """Force the next access to reload the arrays from disk."""
+        with self._lock:
+            self.version += 1
+
+    def refresh(self) -> "HotelCalendarStore":
+        """Reload the arrays if the file or the store version changed since the last load."""
+        stamp = self._file_stamp()
+        if stamp == self._loaded_stamp and self.version == self._loaded_version:
+            return self
+        with self._lock:
+            stamp = self._file_stamp()
+            if stamp != self._loaded_stamp or self.version != self._loaded_version:
+                self._load()
+                self._loaded_stamp = stamp
+                self._loaded_version = self.version
+        return self
+
+    def index_of(self, day: date) -> Optional[int]:
+        """Return the row index of ``day`` or None if the calendar has no data for it."""
+        if self.origin is None:
+            return None
+        idx = day.toordinal() - self.origin.toordinal()
+        if idx < 0 or idx >= len(self.known) or not self.known[idx]:
+            return None
+        return idx
+
+    def date_at(self, idx: int) -> date:
+        return date.fromordinal(self.origin.toordinal() + idx)
+
+    def nightly_prices(self, number_of_persons: int) -> np.ndarray:
+        """Per-night price of every room type for a party of ``number_of_persons``."""
+        if number_of_persons == 1:
+            return self.base_price_1person
+        if number_of_persons == 2:
+            return self.base_price_2people
+        return self.base_price_2people + (number_of_persons - 2) * self.extra_person_price
+
+    def quote(self, start: date, end: date, number_of_persons: int) -> dict:
+        """
+        Total price of every room type that is available on all days from start to end (inclusive).
+
+        Args:
+            start (date): First day of the stay
+            end (date): Last day of the stay
+            number_of_persons (int): Number of guests sharing the room
+
+        Returns:
+            dict: Mapping of room type to total price, rounded to cents; empty if no room type is available or the
+                stay is reversed
+        """
+        if start > end:
+            return {}
+        with self._lock:
+            self.refresh()
+            lo = start.toordinal() - self.origin.toordinal()
+            hi = end.toordinal() - self.origin.toordinal() + 1
+            available = (self.available_rooms[lo:hi] > 0).all(axis=0)
+            totals = self.nightly_prices(number_of_persons)[lo:hi].sum(axis=0)
+            return {
+                room_type: round(float(totals[col]), 2)
+                for col, room_type in enumerate(ROOM_TYPES)
+                if available[col]
+            }
+
+    def missing_dates(self, start: date, end: date) -> list[date]:
+        """Days from start to end (inclusive) the calendar holds no data for."""
+        with self._lock:
+            self.refresh()
+            lo = start.toordinal() - self.origin.toordinal()
+            hi = end.toordinal() - self.origin.toordinal() + 1
+            known = np.zeros(max(hi - lo, 0), dtype=bool)
+            src_lo, src_hi = max(lo, 0), min(hi, len(self.known))
+            if src_lo < src_hi:
+                known[src_lo - lo:src_hi - lo] = self.known[src_lo:src_hi]
+            return [date.fromordinal(start.toordinal() + int(i)) for i in np.flatnonzero(~known)]
+
+    def book(self, start: date, end: date, room_type: str) -> list[date]:
+        """
+        Take one room of ``room_type`` for all days from start to end (inclusive) and journal the booking.
+
+        Nothing is changed unless every day has a free room, and nothing at all
+        for a stay ending before it starts. Returns once the booking is fsync'd,
+        possibly together with other concurrent bookings.
+
+        Returns:
+            list: Days on which the booking failed, empty on success
+
+        Raises:
+            JournalError: If the booking could not be made durable; it is rolled back
+        """
+        col = ROOM_TYPES.index(room_type)
+        if start > end:
+            return []
+        with self._lock:
+            failed = self.missing_dates(start, end)
+            lo = start.toordinal() - self.origin.toordinal()
+            hi = end.toordinal() - self.origin.toordinal() + 1
+            rooms = self.available_rooms[max(lo, 0):max(hi, 0), col]
+            failed += [self.date_at(max(lo, 0) + int(i)) for i in np.flatnonzero(rooms <= 0)]
+            if failed:
+                return sorted(failed)
+            seq = self.journal.append(room_type, start, (rooms - 1).tolist())
+            rooms -= 1
+            self.version += 1
+            self._loaded_version = self.version
+
+        try:
+            self.journal.commit(seq)
+        except JournalError:
+            self._recover()
+            raise
+
+        if self.journal.should_compact():
+            self.compact()
+        return []
+
+    def compact(self) -> None:
+        """Fold the journal into a new CSV snapshot and truncate it."""
+        with self._lock:
+            if not self.journal.should_compact():
+                return
+            self.journal.sync()
+            self.save()
+            self.journal.truncate()
+
+    def arrays(self) -> CalendarArrays:
+        """Copy of the current arrays."""
+        with self._lock:
+            self.refresh()
+            return self._arrays().copy()
+
+    def to_calendar(self) -> CalendarView:
+        """Snapshot of the arrays as a read-only mapping of dates to HotelCalendar objects."""
+        return CalendarView(self.arrays())
+
+    def save(self) -> None:
+        """Atomically write the arrays back to the CSV file in the HotelCalendar.write_csv layout."""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.csv_path), exist_ok=True)
+            tmp_path = self.csv_path + ".tmp"
+            with open(tmp_path, 'w', newline='') as csvfile:
+                csvfile.write(self._arrays().to_csv_text())
+                csvfile.flush()
+                os.fsync(csvfile.fileno())
+            os.replace(tmp_path, self.csv_path)
+            self._loaded_stamp = self._file_stamp()
+
+    def _recover(self) -> None:
+        # Drop the bookings that never reached the disk and rebuild from snapshot + journal
+        with self._lock:
+            self.journal.reset()
+            self.invalidate()
+            self.refresh()
+
+    def _arrays(self) -> CalendarArrays:
+        return CalendarArrays(self.origin, *(getattr(self, name) for name in ("known", *FIELDS)))
+
+    def _assign(self, arrays: CalendarArrays) -> None:
+        self.origin = arrays.origin
+        self.known = arrays.known
+        for name in FIELDS:
+            setattr(self, name, getattr(arrays, name))
+
+    def _file_stamp(self):
+        st = os.stat(self.csv_path)
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self) -> None:
+        # Bookings still waiting for their flush must be on disk before they are replayed
+        try:
+            self.journal.sync()
+        except JournalError:
+            self.journal.reset()
+        self.version += 1
+
+        self._assign(CalendarArrays.read_csv(self.csv_path))
+        if self.origin is None:
+            return
+
+        first = self.origin.toordinal()
+        days = len(self.known)
+        for room_type, start, rooms in self.journal.replay():
+            col = ROOM_TYPES.index(room_type)
+            lo = start.toordinal() - first
+            hi = lo + len(rooms)
+            if lo < 0 or hi > days:
+                continue
+            self.available_rooms[lo:hi, col] = rooms
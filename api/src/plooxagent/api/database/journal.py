@@ -0,0 +1,184 @@
+from datetime import date
+import json
+import os
+import threading
+import zlib
+
+
+class JournalError(Exception):
+    """Raised when bookings could not be made durable in the journal."""
+
+
+class BookingJournal:
+    """
+    Append-only write-ahead log of calendar bookings.
+
+    Every record holds the after-image of one booking: the number of rooms of a
+    room type left on each night from ``start`` on. Replaying a record twice gives
+    the same calendar, so a crash between writing a new snapshot and truncating
+    the journal is harmless. Each line carries a CRC32 of its payload; a torn
+    tail left by a crash is cut off during replay.
+
+    Records appended while another thread is flushing are written and fsync'd
+    together by the next flush (group commit), so concurrent bookings share one
+    disk flush. ``commit_delay`` optionally keeps the flush open a little longer
+    to collect more records under load.
+    """
+
+    def __init__(self, path: str, compact_every: int = 1000, commit_delay: float = 0.0):
+        self.path = path
+        self.compact_every = compact_every
+        self.commit_delay = commit_delay
+        self.flushes = 0
+        self.records_since_compaction = 0
+        self._cond = threading.Condition()
+        self._pending: list[bytes] = []
+        self._next_seq = 0
+        self._durable_seq = -1
+        self._failed_from = 0
+        self._failed_upto = -1
+        self._durable_size = 0
+        self._flushing = False
+        self._error: JournalError | None = None
+        self._fd: int | None = None
+
+    def replay(self):
+        """
+        Read the durable records, truncating a torn or corrupt tail.
+
+        Yields:
+            tuple: (room_type, start, rooms) for every record, oldest first
+        """
+        with self._cond:
+            records = []
+            good_size = 0
+            if os.path.exists(self.path):
+                with open(self.path, 'rb') as journal_file:
+                    for line in journal_file:
+                        record = self._decode(line)
+                        if record is None:
+                            break
+                        records.append(record)
+                        good_size += len(line)
+                if good_size != os.path.getsize(self.path):
+                    with open(self.path, 'r+b') as journal_file:
+                        journal_file.truncate(good_size)
+                        os.fsync(journal_file.fileno())
+            self._durable_size = good_size
+            self.records_since_compaction = len(records)
+        for record in records:
+            yield record["room_type"], date.fromisoformat(record["start"]), record["rooms"]
+
+    def append(self, room_type: str, start: date, rooms: list[int]) -> int:
+        """Buffer a booking record and return its sequence number for ``commit``."""
+        payload = json.dumps(
+            {"room_type": room_type, "start": start.isoformat(), "rooms": rooms},
+            separators=(",", ":"),
+        ).encode()
+        with self._cond:
+            if self._error is not None:
+                raise self._error
+            seq = self._next_seq
+            self._next_seq += 1
+            self._pending.append(b"%08x %s\n" % (zlib.crc32(payload), payload))
+            return seq
+
+    def commit(self, seq: int) -> None:
+        """Block until the record ``seq`` and all records before it are fsync'd."""
+        with self._cond:
+            while True:
+                if self._failed_from <= seq <= self._failed_upto:
+                    raise self._error or JournalError(f"Booking record {seq} was discarded after a failed flush")
+                if self._durable_seq >= seq:
+                    return
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+                self._flush_pending()
+
+    def sync(self) -> None:
+        """Block until every record appended so far is fsync'd."""
+        with self._cond:
+            last_seq = self._next_seq - 1
+        self.commit(last_seq)
+
+    def should_compact(self) -> bool:
+        return self.records_since_compaction >= self.compact_every
+
+    def truncate(self) -> None:
+        """Drop all records once they are part of a durable snapshot."""
+        with self._cond:
+            while self._flushing:
+                self._cond.wait()
+            fd = self._open()
+            os.ftruncate(fd, 0)
+            os.fsync(fd)
+            self._durable_size = 0
+            self.records_since_compaction = 0
+
+    def reset(self) -> None:
+        """Discard buffered records and cut the file back to its last durable size after a failed flush."""
+        with self._cond:
+            if self._error is None:
+                return
+            self._pending = []
+            self._error = None
+            if os.path.exists(self.path):
+                with open(self.path, 'r+b') as journal_file:
+                    journal_file.truncate(self._durable_size)
+
+    def close(self) -> None:
+        with self._cond:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def _flush_pending(self) -> None:
+        # Called with the condition held by the thread that leads this flush
+        self._flushing = True
+        try:
+            if self.commit_delay:
+                self._cond.wait(self.commit_delay)
+            batch, self._pending = self._pending, []
+            last_seq = self._next_seq - 1
+            data = b"".join(batch)
+            error = None
+            self._cond.release()
+            try:
+                fd = self._open()
+                os.write(fd, data)
+                os.fsync(fd)
+            except OSError as e:
+                error = JournalError(f"Unable to write booking journal {self.path}: {e}")
+            finally:
+                self._cond.acquire()
+            if error is not None:
+                self._error = error
+                self._failed_from = self._durable_seq + 1
+                self._failed_upto = self._next_seq - 1
+                raise error
+            self._durable_seq = last_seq
+            self._durable_size += len(data)
+            self.records_since_compaction += len(batch)
+            self.flushes += 1
+        finally:
+            self._flushing = False
+            self._cond.notify_all()
+
+    def _open(self) -> int:
+        if self._fd is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    @staticmethod
+    def _decode(line: bytes):
+        if not line.endswith(b"\n"):
+            return None
+        checksum, _, payload = line[:-1].partition(b" ")
+        try:
+            if int(checksum, 16) != zlib.crc32(payload):
+                return None
+            return json.loads(payload)
+        except ValueError:
+            return None
@@ -0,0 +1,301 @@
+from datetime import date
+import contextlib
+import fcntl
+import mmap
+import os
+import tempfile
+import threading
+from typing import Optional
+
+import numpy as np
+
+from plooxagent.api.database.calendar import FIELDS, ROOM_TYPES, CalendarArrays, HotelCalendarStore
+from plooxagent.api.database.journal import JournalError
+
+MAGIC = b"PLXCAL\x00\x01"
+FORMAT_VERSION = 1
+MAX_ROOM_TYPES = 8
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("format", "<u4"),
+    ("record_size", "<u4"),
+    ("days", "<u8"),
+    # Date ordinal of the first record; 0 for an empty calendar
+    ("origin", "<i8"),
+    # Moves on every booking, so other stores on the same file know their derived tables are stale
+    ("generation", "<u8"),
+    ("n_types", "<u4"),
+    ("room_types", "S16", (MAX_ROOM_TYPES,)),
+])
+
+# Records start on a page of their own, so a booking flushes record pages only
+HEADER_SIZE = max(mmap.ALLOCATIONGRANULARITY, HEADER_DTYPE.itemsize)
+
+
+def record_dtype(n_types: int = len(ROOM_TYPES)) -> np.dtype:
+    """One day of the calendar: a flag for days with data, then every field of RoomTypeCalendar per room type."""
+    return np.dtype(
+        [("known", "?"), ("available_rooms", "<i4", (n_types,))]
+        + [(name, "<f8", (n_types,)) for name in FIELDS[1:]],
+        align=True,
+    )
+
+
+def write_calendar(arrays: CalendarArrays, path: str) -> None:
+    """Atomically write ``arrays`` as a binary calendar file."""
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    records = np.zeros(len(arrays.known), dtype=record_dtype())
+    header["magic"] = MAGIC
+    header["format"] = FORMAT_VERSION
+    header["record_size"] = records.dtype.itemsize
+    header["days"] = len(records)
+    header["origin"] = arrays.origin.toordinal() if arrays.origin is not None else 0
+    header["n_types"] = len(ROOM_TYPES)
+    header["room_types"][0, :len(ROOM_TYPES)] = ROOM_TYPES
+    records["known"] = arrays.known
+    for name in FIELDS:
+        records[name] = getattr(arrays, name)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as calendar_file:
+            calendar_file.write(header.tobytes().ljust(HEADER_SIZE, b"\0"))
+            calendar_file.write(records.tobytes())
+            calendar_file.flush()
+            os.fsync(calendar_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+
+
+def import_csv(csv_path: str, path: str, validate: bool = False) -> None:
+    """Convert a calendar CSV in the HotelCalendar.write_csv layout to a binary calendar file."""
+    write_calendar(CalendarArrays.read_csv(csv_path, validate=validate), path)
+
+
+def export_csv(path: str, csv_path: str) -> None:
+    """Write a binary calendar file back out in the HotelCalendar.write_csv layout."""
+    MappedCalendar(path, writable=False).arrays().write_csv(csv_path)
+
+
+def read_generation(path: str) -> Optional[int]:
+    """The ``generation`` in the header of a binary calendar file, read without mapping it."""
+    with open(path, "rb") as calendar_file:
+        data = os.pread(calendar_file.fileno(), 8, HEADER_DTYPE.fields["generation"][1])
+    return int.from_bytes(data, "little") if len(data) == 8 else None
+
+
+def binary_twin(csv_path: str) -> str:
+    """
+    Path of the binary calendar next to ``csv_path`` (same name, ".cal").
+
+    It is imported from the CSV the first time, and again whenever the CSV was
+    modified after it, replacing the bookings made in the binary file since.
+    Imports hold an exclusive lock on "<name>.cal.lock", so of the threads and
+    processes finding the twin stale at once only the first imports it.
+    """
+    path = os.path.splitext(csv_path)[0] + ".cal"
+    if not _twin_stale(csv_path, path):
+        return path
+    with open(path + ".lock", "ab") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            # Another process may have imported it while we waited for the lock
+            if _twin_stale(csv_path, path):
+                import_csv(csv_path, path)
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    return path
+
+
+def _twin_stale(csv_path: str, path: str) -> bool:
+    try:
+        return os.stat(csv_path).st_mtime_ns > os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return True
+
+
+class MappedCalendar:
+    """
+    A binary calendar file mapped into memory.
+
+    The file is a header page (``HEADER_DTYPE``) describing the room types and
+    the date origin, followed by one ``record_dtype`` record per day. Every
+    array handed out is a view of the mapping, so nothing is parsed or copied
+    and writes to ``available_rooms`` go straight to the page cache.
+
+    Raises:
+        ValueError: If the file is not a binary calendar of this version or of these room types
+    """
+
+    def __init__(self, path: str, writable: bool = True):
+        self.path = path
+        with open(path, "r+b" if writable else "rb") as calendar_file:
+            self.inode = os.fstat(calendar_file.fileno()).st_ino
+            self._mmap = mmap.mmap(
+                calendar_file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            )
+        if len(self._mmap) < HEADER_SIZE:
+            raise ValueError(f"{path} is too short to be a binary calendar")
+        self.header = np.frombuffer(self._mmap, dtype=HEADER_DTYPE, count=1)
+        if self.header["magic"][0] != MAGIC or self.header["format"][0] != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a binary calendar of format {FORMAT_VERSION}")
+        room_types = tuple(name.decode() for name in self.header["room_types"][0, :self.header["n_types"][0]])
+        if room_types != ROOM_TYPES:
+            raise ValueError(f"{path} holds room types {room_types}, expected {ROOM_TYPES}")
+        dtype = record_dtype()
+        if self.header["record_size"][0] != dtype.itemsize:
+            raise ValueError(f"{path} has records of {self.header['record_size'][0]} bytes, expected {dtype.itemsize}")
+        self.records = np.frombuffer(self._mmap, dtype=dtype, count=int(self.header["days"][0]), offset=HEADER_SIZE)
+
+    @property
+    def origin(self) -> Optional[date]:
+        return date.fromordinal(int(self.header["origin"][0])) if len(self.records) else None
+
+    @property
+    def generation(self) -> int:
+        return int(self.header["generation"][0])
+
+    def arrays(self) -> CalendarArrays:
+        """The calendar as views of the mapping, without a copy."""
+        return CalendarArrays(self.origin, self.records["known"], *(self.records[name] for name in FIELDS))
+
+    def flush(self, lo: int, hi: int) -> None:
+        """Write the records ``lo`` to ``hi`` (exclusive) and the header to disk, and only their pages."""
+        if lo < hi:
+            start = HEADER_SIZE + lo * self.records.dtype.itemsize
+            stop = HEADER_SIZE + hi * self.records.dtype.itemsize
+            start -= start % mmap.ALLOCATIONGRANULARITY
+            self._mmap.flush(start, stop - start)
+        self._mmap.flush(0, HEADER_SIZE)
+
+
+class MappedCalendarStore(HotelCalendarStore):
+    """
+    HotelCalendarStore over a memory-mapped binary calendar file instead of a CSV.
+
+    Loading maps the file rather than parsing it, and the arrays are views of
+    the mapping. A booking decrements ``available_rooms`` in place and flushes
+    the pages of the nights it touched, under an exclusive lock on the file, so
+    there is no journal to replay or compact. Other processes mapping the same
+    file see the booking at once; the ``generation`` in the header tells their
+    stores to rebuild the tables they derived from the arrays.
+
+    A crash in the middle of the flush of a booking spanning several pages can
+    leave only some of its nights taken.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.version = 0
+        self.origin: Optional[date] = None
+        self._assign(CalendarArrays.empty())
+        self._calendar: MappedCalendar | None = None
+        self._lock = threading.RLock()
+        self._loaded_stamp = None
+        self._loaded_version = None
+
+    def book(self, start: date, end: date, room_type: str) -> list[date]:
+        """
+        Take one room of ``room_type`` for all days from start to end (inclusive), in place.
+
+        Nothing is changed unless every day has a free room, and nothing at all
+        for a stay ending before it starts. Returns once the touched pages are
+        on disk.
+
+        Returns:
+            list: Days on which the booking failed, empty on success
+
+        Raises:
+            JournalError: If the booking could not be written to disk; it is rolled back
+        """
+        col = ROOM_TYPES.index(room_type)
+        if start > end:
+            return []
+        with self._lock, self._file_lock():
+            failed = self.missing_dates(start, end)
+            lo = start.toordinal() - self.origin.toordinal()
+            hi = end.toordinal() - self.origin.toordinal() + 1
+            rooms = self.available_rooms[max(lo, 0):max(hi, 0), col]
+            failed += [self.date_at(max(lo, 0) + int(i)) for i in np.flatnonzero(rooms <= 0)]
+            if failed:
+                return sorted(failed)
+            # Other processes see the mapping at once, so a failure must leave it as it was
+            header = self._calendar.header
+            decremented = bumped = False
+            try:
+                rooms -= 1
+                decremented = True
+                header["generation"] += 1
+                bumped = True
+                self._calendar.flush(lo, hi)
+            except BaseException as e:
+                if decremented:
+                    rooms += 1
+                if bumped:
+                    header["generation"] -= 1
+                if isinstance(e, OSError):
+                    raise JournalError(f"Could not write the booking to {self.path}: {e}") from e
+                raise
+            self.version += 1
+            self._loaded_stamp = self._file_stamp()
+            self._loaded_version = self.version
+        return []
+
+    def compact(self) -> None:
+        """Nothing to fold: bookings are already in the file."""
+
+    def save(self) -> None:
+        """Write every dirty page of the mapping to disk."""
+        with self._lock:
+            if self._calendar is not None:
+                self._calendar.flush(0, len(self.known))
+
+    def export_csv(self, csv_path: str) -> None:
+        """Write the calendar in the HotelCalendar.write_csv layout."""
+        with self._lock:
+            self.refresh()
+            self._arrays().write_csv(csv_path)
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        with open(self.path, "rb") as calendar_file:
+            fcntl.flock(calendar_file.fileno(), fcntl.LOCK_EX)
+            try:
+                # Another process may have booked while we waited for the lock
+                self.refresh()
+                yield
+            finally:
+                fcntl.flock(calendar_file.fileno(), fcntl.LOCK_UN)
+
+    def _file_stamp(self):
+        st = os.stat(self.path)
+        calendar = self._calendar
+        # The same generation either way, so that a load does not make the next refresh map the file again
+        if calendar is not None and calendar.inode == st.st_ino:
+            return st.st_ino, st.st_size, calendar.generation
+        return st.st_ino, st.st_size, read_generation(self.path)
+
+    def _load(self) -> None:
+        self.version += 1
+        # The previous mapping is unmapped once nothing refers to its arrays any more
+        self._calendar = MappedCalendar(self.path)
+        self._assign(self._calendar.arrays())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert hotel calendars between CSV and the binary format")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("source")
+    parser.add_argument("target")
+    args = parser.parse_args()
+    if args.command == "import":
+        import_csv(args.source, args.target, validate=True)
+    else:
+        export_csv(args.source, args.target)
@@ -0,0 +1,222 @@
+import contextlib
+from datetime import date, timedelta
+import typing as t
+
+import numpy as np
+from psycopg import Rollback, errors
+from psycopg_pool import AsyncConnectionPool
+
+from plooxagent.api.database.calendar import ROOM_TYPES, HotelCalendarStore
+
+VACANCY_QUERY = """
+SELECT room_type,
+       count(*) AS nights,
+       bool_and(available_rooms > 0) AS available,
+       sum(CASE
+               WHEN %(persons)s = 1 THEN base_price_1person
+               WHEN %(persons)s = 2 THEN base_price_2people
+               ELSE base_price_2people + (%(persons)s - 2) * extra_person_price
+           END) AS total_price
+FROM room_night
+WHERE night BETWEEN %(start)s AND %(end)s
+GROUP BY room_type
+"""
+
+BOOK_QUERY = """
+UPDATE room_night
+SET available_rooms = available_rooms - 1
+WHERE room_type = %(room_type)s
+  AND night BETWEEN %(start)s AND %(end)s
+  AND available_rooms > 0
+RETURNING night
+"""
+
+SEARCH_QUERY = """
+SELECT night, room_type, total_price
+FROM (
+    SELECT night,
+           room_type,
+           sum(CASE
+                   WHEN %(persons)s = 1 THEN base_price_1person
+                   WHEN %(persons)s = 2 THEN base_price_2people
+                   ELSE base_price_2people + (%(persons)s - 2) * extra_person_price
+               END) OVER stay AS total_price,
+           min(available_rooms) OVER stay AS min_rooms,
+           count(*) OVER stay AS nights,
+           last_value(night) OVER stay AS last_night
+    FROM room_night
+    WHERE night BETWEEN %(earliest)s AND %(latest)s
+      AND room_type = ANY(%(room_types)s)
+    WINDOW stay AS (PARTITION BY room_type ORDER BY night ROWS BETWEEN CURRENT ROW AND %(following)s FOLLOWING)
+) AS windows
+WHERE nights = %(nights)s
+  AND last_night = night + %(following)s
+  AND min_rooms > 0
+  AND (%(max_total_price)s::float8 IS NULL OR round(total_price::numeric, 2) <= %(max_total_price)s)
+ORDER BY {order}
+LIMIT %(limit)s
+"""
+
+SEARCH_ORDER = {
+    "cheapest": "round(total_price::numeric, 2), night",
+    "earliest": "night, round(total_price::numeric, 2)",
+}
+
+IMPORT_QUERY = """
+INSERT INTO room_night (
+    night, room_type, available_rooms, base_price_1person, base_price_2people, extra_person_price
+)
+VALUES (%s, %s, %s, %s, %s, %s)
+ON CONFLICT (night, room_type) DO NOTHING
+"""
+
+_active_calendar: "PostgresCalendar | None" = None
+
+
+def use_calendar(calendar: "PostgresCalendar | None") -> None:
+    """Make the function tools read and book through ``calendar`` (None falls back to the CSV store)."""
+    global _active_calendar
+    _active_calendar = calendar
+
+
+def active_calendar() -> "PostgresCalendar | None":
+    return _active_calendar
+
+
+class PostgresCalendar:
+    """
+    Hotel calendar kept in the ``room_night`` table and shared through an async connection pool.
+
+    Every API replica can check and book concurrently: a vacancy check is one
+    aggregate query, and a booking is one conditional UPDATE over the whole stay
+    that is rolled back unless every night still had a free room.
+    """
+
+    def __init__(self, pool: AsyncConnectionPool, deadlock_retries: int = 3):
+        self.pool = pool
+        self.deadlock_retries = deadlock_retries
+
+    @classmethod
+    async def create(
+        cls,
+        cm: contextlib.AsyncExitStack,
+        database_url: str,
+        min_size: int = 1,
+        max_size: int = 10,
+    ) -> t.Self:
+        # libpq does not understand the SQLAlchemy driver suffix
+        conninfo = database_url.replace("postgresql+psycopg://", "postgresql://", 1)
+        pool = AsyncConnectionPool(conninfo, min_size=min_size, max_size=max_size, open=False)
+        await pool.open(wait=True)
+        cm.push_async_callback(pool.close)
+        return cls(pool)
+
+    async def quote(self, start: date, end: date, number_of_persons: int) -> dict | None:
+        """
+        Total price of every room type that is available on all days from start to end (inclusive).
+
+        Returns:
+            dict | None: Mapping of room type to total price, or None if some day is missing from the calendar
+        """
+        nights = (end - start).days + 1
+        if nights <= 0:
+            return {}
+        async with self.pool.connection() as conn:
+            cursor = await conn.execute(
+                VACANCY_QUERY, {"start": start, "end": end, "persons": number_of_persons}
+            )
+            rows = await cursor.fetchall()
+
+        if (len(rows) < len(ROOM_TYPES) or any(row[1] != nights for row in rows)):
+            return None
+        return {
+            room_type: round(float(total_price), 2)
+            for room_type, _, available, total_price in rows
+            if available
+        }
+
+    async def book(self, start: date, end: date, room_type: str) -> list[date]:
+        """
+        Take one room of ``room_type`` for all days from start to end (inclusive).
+
+        Returns:
+            list: Days on which the booking failed, empty on success
+        """
+        nights = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        attempt = 0
+        while True:
+            try:
+                return await self._book(nights, start, end, room_type)
+            except errors.DeadlockDetected:
+                # Stays overlapping in opposite lock order; the loser simply tries again
+                attempt += 1
+                if attempt > self.deadlock_retries:
+                    raise
+
+    async def find_stays(
+        self,
+        nights: int,
+        earliest: date,
+        latest: date,
+        number_of_persons: int,
+        room_types=ROOM_TYPES,
+        max_total_price: float | None = None,
+        order_by: str = "cheapest",
+        limit: int = 5,
+    ) -> list[dict]:
+        """Database counterpart of ``quotes.find_stays``, one sliding-window query over the range."""
+        if nights <= 0 or limit <= 0:
+            return []
+        query = SEARCH_QUERY.format(order=SEARCH_ORDER.get(order_by, SEARCH_ORDER["cheapest"]))
+        async with self.pool.connection() as conn:
+            cursor = await conn.execute(query, {
+                "persons": number_of_persons,
+                "earliest": earliest,
+                "latest": latest,
+                "room_types": list(room_types),
+                "following": nights - 1,
+                "nights": nights,
+                "max_total_price": max_total_price,
+                "limit": limit,
+            })
+            rows = await cursor.fetchall()
+        return [
+            {
+                "start": night,
+                "end": night + timedelta(days=nights - 1),
+                "room_type": room_type,
+                "total_price": round(float(total_price), 2),
+            }
+            for night, room_type, total_price in rows
+        ]
+
+    async def import_store(self, store: HotelCalendarStore) -> None:
+        """Insert the nights of ``store`` that are not in the table yet."""
+        store.refresh()
+        fields = np.stack([
+            store.available_rooms,
+            store.base_price_1person,
+            store.base_price_2people,
+            store.extra_person_price,
+        ], axis=2)
+        rows = [
+            (store.date_at(int(idx)), room_type, int(fields[idx, col, 0]), *fields[idx, col, 1:].tolist())
+            for idx in np.flatnonzero(store.known)
+            for col, room_type in enumerate(ROOM_TYPES)
+        ]
+        async with self.pool.connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.executemany(IMPORT_QUERY, rows)
+
+    async def _book(self, nights: list[date], start: date, end: date, room_type: str) -> list[date]:
+        failed = []
+        async with self.pool.connection() as conn:
+            async with conn.transaction():
+                cursor = await conn.execute(
+                    BOOK_QUERY, {"room_type": room_type, "start": start, "end": end}
+                )
+                booked = {row[0] for row in await cursor.fetchall()}
+                if len(booked) != len(nights):
+                    failed = [night for night in nights if night not in booked]
+                    raise Rollback()
+        return failed
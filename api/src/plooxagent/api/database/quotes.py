@@ -0,0 +1,215 @@
+from datetime import date
+import threading
+import weakref
+
+import numpy as np
+
+from plooxagent.api.database.calendar import ROOM_TYPES, HotelCalendarStore
+
+
+class QuoteTable:
+    """
+    Prefix sums and range-minimum tables over one version of a HotelCalendarStore.
+
+    ``*_cum[i]`` holds the total of a nightly price field over rows ``[0, i)``, so
+    the price of any stay is one subtraction. ``min_rooms[k, i]`` holds the fewest
+    rooms left over rows ``[i, i + 2**k)``, and two overlapping lookups give the
+    minimum over any range (a sparse table). Building costs O(n log n) for a
+    calendar of n days, after which every quote is O(1).
+    """
+
+    def __init__(self, store: HotelCalendarStore):
+        self.version = store.version
+        self.origin_ordinal = store.origin.toordinal() if store.origin is not None else 0
+        self.days = days = len(store.known)
+
+        zero = np.zeros((1, len(ROOM_TYPES)))
+        self.price_1person_cum = np.concatenate([zero, np.cumsum(store.base_price_1person, axis=0)])
+        self.price_2people_cum = np.concatenate([zero, np.cumsum(store.base_price_2people, axis=0)])
+        self.extra_person_cum = np.concatenate([zero, np.cumsum(store.extra_person_price, axis=0)])
+        self.known_cum = np.concatenate([[0], np.cumsum(store.known, dtype=np.int64)])
+
+        levels = max(days, 1).bit_length()
+        self.min_rooms = np.full(
+            (levels, max(days, 1), len(ROOM_TYPES)), np.iinfo(np.int32).max, dtype=np.int32
+        )
+        self.min_rooms[0, :days] = store.available_rooms
+        for k in range(1, levels):
+            half = 1 << (k - 1)
+            width = days - (1 << k) + 1
+            self.min_rooms[k, :width] = np.minimum(
+                self.min_rooms[k - 1, :width], self.min_rooms[k - 1, half:half + width]
+            )
+
+        self.log2 = np.zeros(days + 1, dtype=np.int64)
+        if days > 1:
+            self.log2[2:] = np.floor(np.log2(np.arange(2, days + 1))).astype(np.int64)
+
+    def quote_many(self, start_ordinals: np.ndarray, end_ordinals: np.ndarray, persons: np.ndarray):
+        """
+        Quote many stays at once; every stay runs from its start to its end day (inclusive).
+
+        Args:
+            start_ordinals (np.ndarray): ``date.toordinal()`` of each first day
+            end_ordinals (np.ndarray): ``date.toordinal()`` of each last day
+            persons (np.ndarray): Party size of each stay
+
+        Returns:
+            tuple: ``covered`` (Q,) whether the calendar has every day of the stay,
+                ``min_rooms`` (Q, room types) fewest rooms left over the stay and
+                ``totals`` (Q, room types) total price of the stay
+        """
+        lo = start_ordinals - self.origin_ordinal
+        hi = end_ordinals - self.origin_ordinal + 1
+        length = hi - lo
+        empty = length <= 0
+        in_range = (lo >= 0) & (hi <= self.days)
+
+        # Clip so that invalid stays still index safely; they are masked out below
+        lo_c = np.clip(lo, 0, self.days)
+        hi_c = np.clip(np.maximum(hi, lo + 1), 0, self.days)
+        covered = empty | (in_range & (self.known_cum[hi_c] - self.known_cum[lo_c] == length))
+
+        span = np.maximum(hi_c - lo_c, 1)
+        k = self.log2[np.minimum(span, self.days)]
+        rmq_lo = np.minimum(lo_c, max(self.days - 1, 0))
+        rmq_hi = np.maximum(hi_c - (1 << k), 0)
+        min_rooms = np.minimum(self.min_rooms[k, rmq_lo], self.min_rooms[k, rmq_hi])
+        # A reversed stay has no room available, as HotelCalendarStore.quote answers it
+        min_rooms[empty] = 0
+
+        persons = persons[:, None]
+        price_1person = self.price_1person_cum[hi_c] - self.price_1person_cum[lo_c]
+        price_2people = self.price_2people_cum[hi_c] - self.price_2people_cum[lo_c]
+        extra_person = self.extra_person_cum[hi_c] - self.extra_person_cum[lo_c]
+        totals = np.where(
+            persons == 1,
+            price_1person,
+            np.where(persons == 2, price_2people, price_2people + (persons - 2) * extra_person),
+        )
+        totals[empty] = 0.0
+        return covered, min_rooms, totals
+
+
+_tables: "weakref.WeakKeyDictionary[HotelCalendarStore, QuoteTable]" = weakref.WeakKeyDictionary()
+_tables_lock = threading.Lock()
+
+
+def quote_table(store: HotelCalendarStore) -> QuoteTable:
+    """Return the QuoteTable for the current version of ``store``, rebuilding it after reloads and bookings."""
+    store.refresh()
+    table = _tables.get(store)
+    if table is not None and table.version == store.version:
+        return table
+    with store._lock, _tables_lock:
+        store.refresh()
+        table = _tables.get(store)
+        if table is None or table.version != store.version:
+            table = _tables[store] = QuoteTable(store)
+        return table
+
+
+def quote_stays(store: HotelCalendarStore, stays) -> list[dict | None]:
+    """
+    Answer many vacancy questions at once.
+
+    Args:
+        store (HotelCalendarStore): Calendar to quote from
+        stays (iterable): (start, end, number_of_persons) tuples, start and end being dates (inclusive)
+
+    Returns:
+        list: For every stay in order, a mapping of the room types available on all
+            its days to their total price (empty for a reversed stay), or None if the
+            calendar lacks some day
+    """
+    stays = list(stays)
+    if not stays:
+        return []
+    table = quote_table(store)
+    starts = np.fromiter((stay[0].toordinal() for stay in stays), dtype=np.int64, count=len(stays))
+    ends = np.fromiter((stay[1].toordinal() for stay in stays), dtype=np.int64, count=len(stays))
+    persons = np.fromiter((stay[2] for stay in stays), dtype=np.int64, count=len(stays))
+
+    covered, min_rooms, totals = table.quote_many(starts, ends, persons)
+    available = min_rooms > 0
+    totals = totals.round(2).tolist()
+
+    results = []
+    for i in range(len(stays)):
+        if not covered[i]:
+            results.append(None)
+            continue
+        results.append({
+            room_type: totals[i][col]
+            for col, room_type in enumerate(ROOM_TYPES)
+            if available[i, col]
+        })
+    return results
+
+
+def find_stays(
+    store: HotelCalendarStore,
+    nights: int,
+    earliest: date,
+    latest: date,
+    number_of_persons: int,
+    room_types=ROOM_TYPES,
+    max_total_price: float | None = None,
+    order_by: str = "cheapest",
+    limit: int = 5,
+) -> list[dict]:
+    """
+    Search every window of ``nights`` consecutive days between earliest and latest for bookable stays.
+
+    All start days and room types are scored at once from the QuoteTable, so the
+    whole search is a handful of array operations.
+
+    Args:
+        store (HotelCalendarStore): Calendar to search
+        nights (int): Length of the stay in nights
+        earliest (date): First night the stay may start on
+        latest (date): Last night the stay may cover
+        number_of_persons (int): Number of guests sharing the room
+        room_types (iterable, optional): Room types to consider. Default is all of them.
+        max_total_price (float, optional): Upper bound on the total price of the stay
+        order_by (str, optional): "cheapest" or "earliest". Default is "cheapest".
+        limit (int, optional): Maximum number of stays returned. Default is 5.
+
+    Returns:
+        list: Stays ranked by order_by, each a dict with start and end (the first and
+            last night, as taken by book_a_room), room_type and total_price
+    """
+    if nights <= 0 or limit <= 0:
+        return []
+    starts = np.arange(earliest.toordinal(), latest.toordinal() - nights + 2, dtype=np.int64)
+    if len(starts) == 0:
+        return []
+
+    table = quote_table(store)
+    covered, min_rooms, totals = table.quote_many(
+        starts, starts + nights - 1, np.full(len(starts), number_of_persons, dtype=np.int64)
+    )
+    totals = totals.round(2)
+    wanted = np.array([room_type in room_types for room_type in ROOM_TYPES])
+    feasible = covered[:, None] & (min_rooms > 0) & wanted[None, :]
+    if max_total_price is not None:
+        feasible &= totals <= max_total_price
+
+    rows, cols = np.nonzero(feasible)
+    prices = totals[rows, cols]
+    if order_by == "earliest":
+        order = np.lexsort((prices, rows))
+    else:
+        order = np.lexsort((rows, prices))
+
+    stays = []
+    for i in order[:limit]:
+        start = date.fromordinal(int(starts[rows[i]]))
+        stays.append({
+            "start": start,
+            "end": date.fromordinal(start.toordinal() + nights - 1),
+            "room_type": ROOM_TYPES[cols[i]],
+            "total_price": float(prices[i]),
+        })
+    return stays
+
@@ -0,0 +1,76 @@
+import collections
+import dataclasses
+import threading
+import typing as t
+import weakref
+
+from plooxagent.api.database.calendar import HotelCalendarStore
+
+
+@dataclasses.dataclass
+class ShardStats:
+    hits: int = 0
+    # Stores opened from disk, the first time or after an eviction
+    loads: int = 0
+    evicted: int = 0
+    # Evicted stores found still in use by a call, and taken back instead of opened twice
+    revived: int = 0
+
+
+class CalendarShards:
+    """
+    Calendar stores of many hotels, opened on first use and kept for at most ``max_resident`` hotels.
+
+    Stores are keyed by calendar path. The least recently used one is dropped
+    when another has to be opened, and is freed with its arrays and quote tables
+    once the calls still using it are done. Until then a lookup gets that same
+    store back, so no calendar file is ever written through two stores.
+    """
+
+    def __init__(self, open_store: t.Callable[[str], HotelCalendarStore], max_resident: int = 64):
+        self.open_store = open_store
+        self.max_resident = max_resident
+        self.stats = ShardStats()
+        self._resident: collections.OrderedDict[str, HotelCalendarStore] = collections.OrderedDict()
+        self._alive: weakref.WeakValueDictionary[str, HotelCalendarStore] = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._resident)
+
+    def get(self, path: str) -> HotelCalendarStore:
+        """The store of the calendar at ``path``, refreshed; opened if it is not resident."""
+        with self._lock:
+            store = self._resident.get(path)
+            if store is not None:
+                self._resident.move_to_end(path)
+                self.stats.hits += 1
+            else:
+                store = self._alive.get(path)
+                if store is not None:
+                    self.stats.revived += 1
+                else:
+                    store = self.open_store(path)
+                    self._alive[path] = store
+                    if getattr(store, "journal", None) is not None:
+                        # Its file is closed with the store, once the last call using it lets go
+                        weakref.finalize(store, store.journal.close)
+                    self.stats.loads += 1
+                self._resident[path] = store
+                while len(self._resident) > self.max_resident:
+                    self._resident.popitem(last=False)
+                    self.stats.evicted += 1
+        try:
+            return store.refresh()
+        except FileNotFoundError:
+            with self._lock:
+                if self._resident.get(path) is store:
+                    del self._resident[path]
+            raise
+
+    def report(self) -> dict:
+        return {
+            **dataclasses.asdict(self.stats),
+            "resident": len(self._resident),
+            "max_resident": self.max_resident,
+        }
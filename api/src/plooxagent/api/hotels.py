@@ -0,0 +1,65 @@
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import re
+import typing as t
+
+# The hotel of a deployment that serves a single property, with the calendar at custom_tools.CALENDAR_PATH
+DEFAULT_HOTEL = "default"
+DEFAULT_HOTEL_NAME = "Millman's Mansion"
+
+# Every other hotel has a directory of its own here, holding hotel_calendar_data.csv and hotel.json
+HOTELS_DIR = os.environ.get("HOTELS_DIR", "data/hotels")
+
+_HOTEL_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+# Hotel of the call running in the current task; tasks started by the call inherit it
+current_hotel: contextvars.ContextVar[str | None] = contextvars.ContextVar("current_hotel", default=None)
+
+
+def check_hotel_id(hotel_id: str) -> str:
+    """
+    Return ``hotel_id`` if it can name a hotel directory.
+
+    Raises:
+        ValueError: If it holds anything but letters, digits, "_" and "-"
+    """
+    if not _HOTEL_ID.fullmatch(hotel_id):
+        raise ValueError(f"Invalid hotel ID {hotel_id!r}")
+    return hotel_id
+
+
+def hotel_id() -> str:
+    """Hotel of the current call, else HOTEL_ID, else the default hotel."""
+    return current_hotel.get() or os.environ.get("HOTEL_ID", DEFAULT_HOTEL)
+
+
+@contextlib.contextmanager
+def serving(hotel: str | None) -> t.Iterator[None]:
+    """Run the block, and every task it starts, for ``hotel`` (None keeps the current one)."""
+    if hotel is None:
+        yield
+        return
+    token = current_hotel.set(check_hotel_id(hotel))
+    try:
+        yield
+    finally:
+        current_hotel.reset(token)
+
+
+def hotel_dir(hotel: str) -> str:
+    return os.path.join(HOTELS_DIR, check_hotel_id(hotel))
+
+
+@functools.lru_cache(maxsize=1024)
+def hotel_name(hotel: str) -> str:
+    """Name of ``hotel`` from its hotel.json, or its ID if it has none."""
+    if hotel == DEFAULT_HOTEL:
+        return os.environ.get("HOTEL_NAME", DEFAULT_HOTEL_NAME)
+    try:
+        with open(os.path.join(hotel_dir(hotel), "hotel.json")) as hotel_file:
+            return json.load(hotel_file)["name"]
+    except (OSError, ValueError, KeyError):
+        return hotel
@@ -0,0 +1,235 @@
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import re
+import typing as t
+import unicodedata
+
+import numpy as np
+from agents import FunctionTool, function_tool
+
+from plooxagent.api.utils import calculate_file_hash, read_vs_records
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = "data/kb_index"
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Bump when extraction, chunking or scoring changes, so cached indexes are rebuilt
+INDEX_VERSION = 1
+
+_TOKEN = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def extract_text(path: str) -> str:
+    """Plain text of a PDF, with ligatures and the extractor's line breaks between words undone."""
+    from pypdf import PdfReader
+
+    text = " ".join(page.extract_text() or "" for page in PdfReader(path).pages)
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def chunk_text(text: str, max_words: int = 120) -> list[str]:
+    """Split text into chunks of whole sentences up to ``max_words``, each starting with the last sentence of the one before."""
+    sentences = [sentence for sentence in _SENTENCE_END.split(text) if sentence]
+    chunks, current, words = [], [], 0
+    for sentence in sentences:
+        length = len(sentence.split())
+        if current and words + length > max_words:
+            chunks.append(" ".join(current))
+            current = current[-1:]
+            words = len(current[0].split())
+        current.append(sentence)
+        words += length
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+class KnowledgeIndex:
+    """
+    BM25 index over the chunks of a few documents, with optional embeddings.
+
+    The BM25 weight of every (chunk, term) pair is computed when the index is
+    built, so a lookup sums a few columns of a small dense matrix. The corpus is
+    a couple of PDFs; a large one would want sparse postings instead.
+    """
+
+    def __init__(
+        self,
+        chunks: list[str],
+        vocabulary: dict[str, int],
+        weights: np.ndarray,
+        embeddings: np.ndarray | None = None,
+    ):
+        self.chunks = chunks
+        self.vocabulary = vocabulary
+        # (chunks, terms) BM25 weights
+        self.weights = weights
+        # (chunks, dimensions) unit vectors, if built with embeddings
+        self.embeddings = embeddings
+
+    @classmethod
+    def build(cls, chunks: list[str], k1: float = 1.5, b: float = 0.75) -> t.Self:
+        documents = [collections.Counter(tokenize(chunk)) for chunk in chunks]
+        vocabulary = {term: i for i, term in enumerate(sorted(set().union(*documents)))}
+        tf = np.zeros((len(chunks), len(vocabulary)), dtype=np.float32)
+        for row, counts in enumerate(documents):
+            for term, count in counts.items():
+                tf[row, vocabulary[term]] = count
+        lengths = tf.sum(axis=1, keepdims=True)
+        df = (tf > 0).sum(axis=0)
+        idf = np.log(1 + (len(chunks) - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = k1 * (1 - b + b * lengths / max(lengths.mean() if len(chunks) else 0.0, 1.0))
+        weights = idf * tf * (k1 + 1) / (tf + norm)
+        return cls(chunks, vocabulary, weights.astype(np.float32))
+
+    def search(self, query: str, k: int = 2, query_embedding: np.ndarray | None = None, alpha: float = 0.5) -> list[tuple[float, str]]:
+        """
+        Best chunks for ``query``, best first.
+
+        Args:
+            query: Question in natural language
+            k: Number of chunks to return
+            query_embedding: Embedding of the query; mixes cosine similarity into the score if the index has embeddings
+            alpha: Weight of the cosine similarity against the normalized BM25 score
+
+        Returns:
+            list: (score, chunk) pairs
+        """
+        columns = [self.vocabulary[term] for term in tokenize(query) if term in self.vocabulary]
+        scores = self.weights[:, columns].sum(axis=1) if columns else np.zeros(len(self.chunks), dtype=np.float32)
+        if query_embedding is not None and self.embeddings is not None:
+            top = scores.max()
+            similarity = self.embeddings @ (query_embedding / np.linalg.norm(query_embedding))
+            scores = (1 - alpha) * (scores / top if top > 0 else scores) + alpha * similarity
+        k = min(k, len(self.chunks))
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(float(scores[i]), self.chunks[i]) for i in best if scores[i] > 0]
+
+    def save(self, path: pathlib.Path, key: str) -> None:
+        arrays = {"weights": self.weights}
+        if self.embeddings is not None:
+            arrays["embeddings"] = self.embeddings
+        np.savez(path.with_suffix(".npz"), **arrays)
+        with open(path.with_suffix(".json"), "w") as file:
+            json.dump({"key": key, "chunks": self.chunks, "vocabulary": list(self.vocabulary)}, file)
+
+    @classmethod
+    def load(cls, path: pathlib.Path, key: str) -> t.Self | None:
+        """The index saved at ``path`` if it was built under ``key``, else None."""
+        try:
+            with open(path.with_suffix(".json")) as file:
+                meta = json.load(file)
+            if meta["key"] != key:
+                return None
+            with np.load(path.with_suffix(".npz")) as arrays:
+                weights = arrays["weights"]
+                embeddings = arrays["embeddings"] if "embeddings" in arrays else None
+        except (FileNotFoundError, KeyError, json.JSONDecodeError, ValueError):
+            return None
+        vocabulary = {term: i for i, term in enumerate(meta["vocabulary"])}
+        return cls(meta["chunks"], vocabulary, weights, embeddings)
+
+
+def file_hash(path: str, vs_records: dict) -> str:
+    """Hash of ``path``, reusing the one vs_setup recorded if the file has not changed since."""
+    stat = os.stat(path)
+    for record in vs_records.values():
+        file_record = record.get("files", {}).get(path)
+        if (
+            isinstance(file_record, dict)
+            and file_record.get("mtime_ns") == stat.st_mtime_ns
+            and file_record.get("size") == stat.st_size
+        ):
+            return file_record["hash"]
+    return calculate_file_hash(path)
+
+
+async def load_or_build_index(
+    name: str,
+    paths: list[str],
+    index_dir: str = INDEX_DIR,
+    embed: bool = False,
+    client=None,
+    max_words: int = 120,
+) -> KnowledgeIndex:
+    """
+    Load the index of ``paths`` from ``index_dir``, or build and save it if the files changed.
+
+    Args:
+        name: Name of the knowledge base, used for the file names
+        paths: Documents to index
+        index_dir: Directory holding the built indexes
+        embed: Also embed the chunks, for hybrid lookups
+        client: OpenAI client for the embeddings, the shared one by default
+        max_words: Chunk size
+    """
+    vs_records = read_vs_records()
+    hashes = await asyncio.gather(*(asyncio.to_thread(file_hash, path, vs_records) for path in paths))
+    key = hashlib.sha256(
+        json.dumps([INDEX_VERSION, max_words, EMBEDDING_MODEL if embed else None, *hashes]).encode()
+    ).hexdigest()
+    path = pathlib.Path(index_dir) / name
+    index = await asyncio.to_thread(KnowledgeIndex.load, path, key)
+    if index is not None:
+        return index
+
+    logger.info("Building the local index of %s", name)
+    texts = await asyncio.gather(*(asyncio.to_thread(extract_text, path) for path in paths))
+    chunks = [chunk for text in texts for chunk in chunk_text(text, max_words)]
+    index = KnowledgeIndex.build(chunks)
+    if embed:
+        index.embeddings = await embed_texts(chunks, client)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    await asyncio.to_thread(index.save, path, key)
+    return index
+
+
+async def embed_texts(texts: list[str], client=None) -> np.ndarray:
+    """Unit-length embeddings of ``texts``."""
+    if client is None:
+        from plooxagent.api.utils import get_async_client
+
+        client = get_async_client()
+    response = await client.embeddings.create(model=EMBEDDING_MODEL, input=texts)
+    vectors = np.array([item.embedding for item in response.data], dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def knowledge_search_tool(name: str, index: KnowledgeIndex, description: str, k: int = 2) -> FunctionTool:
+    """
+    Function tool looking ``index`` up locally, in place of a FileSearchTool.
+
+    If the index has embeddings, every lookup also embeds the question, which
+    costs a round trip to the API.
+    """
+
+    async def search(query: str) -> str:
+        query_embedding = None
+        if index.embeddings is not None:
+            query_embedding = (await embed_texts([query]))[0]
+        results = index.search(query, k=k, query_embedding=query_embedding)
+        if not results:
+            return "Nothing in the knowledge base matches the question."
+        return "\n\n".join(chunk for _, chunk in results)
+
+    search.__name__ = f"search_{name}"
+    search.__doc__ = f"""
+    {description}
+
+    Args:
+        query (str): The guest's question, or the key words of it
+    """
+    return function_tool(search)
@@ -0,0 +1,410 @@
+"""
+Offline call-load simulator: how many simultaneous calls one node carries before audio breaks up.
+
+Runs real DailyAgent sessions against fake Daily call clients and devices.
+Every caller speaks a scripted PCM loop at real-time pace, and a stub voice
+pipeline answers each utterance after configurable STT, LLM and TTS delays.
+Nothing leaves the machine. Run from api/:
+
+    python -m plooxagent.api.loadtest --calls 50 --seconds 20
+    python -m plooxagent.api.loadtest --ramp 25,50,100,200 --processes 4 --output data/loadtest.json
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import dataclasses
+import json
+import multiprocessing
+import sys
+import threading
+import time
+import typing as t
+
+import numpy as np
+from agents.voice.events import VoiceStreamEventAudio, VoiceStreamEventLifecycle
+
+from plooxagent.api.metrics import Histogram
+from plooxagent.api.sessions import process_rss_bytes
+from plooxagent.api.voice_metrics import RESPONSE
+from plooxagent.api.workers import LoopLagMonitor
+
+SAMPLE_RATE = 24000
+FRAME_MS = 20
+# What Daily's audio renderer hands out: the SDK's own rate and chunk size, not the agent's
+RENDER_SAMPLE_RATE = 16000
+RENDER_MS = 10
+
+
+@dataclasses.dataclass
+class Profile:
+    """What every simulated caller says and how long the stub pipeline takes to answer."""
+
+    # The caller speaks for speech_s, then stays quiet for pause_s, over and over
+    speech_s: float = 2.0
+    pause_s: float = 4.0
+    # Silence after speech that ends an utterance
+    end_of_speech_s: float = 0.5
+    stt_s: float = 0.3
+    llm_s: float = 0.6
+    # Time to the first synthesized chunk; later chunks come tts_speed times faster than real time
+    tts_s: float = 0.2
+    tts_speed: float = 4.0
+    reply_s: float = 2.0
+
+
+class Script:
+    """One loop of the caller's audio, cut into the chunks the renderer hands out; shared by every call."""
+
+    def __init__(self, profile: Profile, amplitude: int = 3000):
+        chunk_samples = RENDER_SAMPLE_RATE * RENDER_MS // 1000
+        speech = round(profile.speech_s * 1000 / RENDER_MS)
+        pause = round(profile.pause_s * 1000 / RENDER_MS)
+        tone = np.sin(2 * np.pi * 220 * np.arange(speech * chunk_samples) / RENDER_SAMPLE_RATE)
+        pcm = np.concatenate([(amplitude * tone).astype(np.int16), np.zeros(pause * chunk_samples, dtype=np.int16)])
+        self.frames = [pcm[i:i + chunk_samples].tobytes() for i in range(0, len(pcm), chunk_samples)]
+
+
+@dataclasses.dataclass
+class SimAudioData:
+    audio_frames: bytes
+    sample_rate: int = RENDER_SAMPLE_RATE
+    num_channels: int = 1
+
+
+class SimMicrophone:
+    """Virtual microphone that consumes frames at real-time pace, like the Daily device, without keeping them."""
+
+    def __init__(self, name: str, sample_rate: int):
+        self.name = name
+        self.sample_rate = sample_rate
+        self.frames = 0
+        self._next = 0.0
+
+    def write_frames(self, frames: bytes) -> int:
+        samples = len(frames) // 2
+        now = time.monotonic()
+        self._next = max(self._next, now) + samples / self.sample_rate
+        time.sleep(max(self._next - now - samples / self.sample_rate, 0.0))
+        self.frames += 1
+        return samples
+
+
+class SimDaily:
+    microphones: dict[str, SimMicrophone] = {}
+
+    @staticmethod
+    def init() -> None:
+        pass
+
+    @classmethod
+    def create_microphone_device(cls, name: str, sample_rate: int, channels: int) -> SimMicrophone:
+        cls.microphones[name] = SimMicrophone(name, sample_rate)
+        return cls.microphones[name]
+
+
+class SimCallClient:
+    """
+    Call client whose room holds one caller playing ``script`` from a random point.
+
+    The caller's audio is rendered from a thread in 10 ms chunks at 16 kHz on
+    absolute deadlines, as Daily's renderer would; chunks it could only send
+    more than a chunk late are counted in ``late_frames``, a sign the machine is
+    out of CPU.
+    """
+
+    script: Script
+    clients: list["SimCallClient"] = []
+
+    def __init__(self, event_handler):
+        self.event_handler = event_handler
+        self.rendered = 0
+        self.late_frames = 0
+        self._stop = threading.Event()
+        SimCallClient.clients.append(self)
+
+    def join(self, room_uri, client_settings, completion):
+        def joined():
+            completion(None, None)
+            self.event_handler.on_participant_joined({"id": f"caller-{room_uri}", "info": {"isLocal": False}})
+
+        threading.Thread(target=joined, daemon=True).start()
+
+    def participants(self):
+        return {"local": {"id": "local", "info": {"isLocal": True}}}
+
+    def set_audio_renderer(self, participant_id, callback, audio_source="microphone"):
+        frames = self.script.frames
+        interval = RENDER_MS / 1000
+
+        def render():
+            position = np.random.randint(len(frames))
+            deadline = time.monotonic()
+            while not self._stop.is_set():
+                deadline += interval
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self._stop.wait(delay)
+                elif -delay > interval:
+                    self.late_frames += 1
+                callback(participant_id, SimAudioData(frames[position]))
+                position = (position + 1) % len(frames)
+                self.rendered += 1
+
+        threading.Thread(target=render, daemon=True).start()
+
+    def leave(self):
+        self._stop.set()
+
+    def release(self):
+        pass
+
+
+class StubWorkflow:
+    """Stands in for the agents: answers every transcription after ``llm_s``, marking the turn like the real workflow."""
+
+    def __init__(self, spans, profile: Profile):
+        self.spans = spans
+        self.profile = profile
+
+    async def run(self, transcription: str) -> t.AsyncIterator[str]:
+        self.spans.transcription()
+        await asyncio.sleep(self.profile.llm_s)
+        self.spans.text()
+        yield "Certainly, we have a room for you."
+
+
+class StubResult:
+    """
+    Pipeline result that detects utterances by energy and answers them with synthesized-looking audio.
+
+    Listening runs in its own task, as the transcription session does, so the
+    inbound audio keeps flowing while an answer is spoken.
+    """
+
+    def __init__(self, workflow: StubWorkflow, audio_input, profile: Profile, threshold: int = 500):
+        self.workflow = workflow
+        self.audio_input = audio_input
+        self.profile = profile
+        self.threshold = threshold
+        self._utterances: asyncio.Queue[None] = asyncio.Queue()
+        chunk = round(SAMPLE_RATE * 0.1)
+        self._chunk = (np.sin(2 * np.pi * 330 * np.arange(chunk) / SAMPLE_RATE) * 2000).astype(np.int16)
+
+    async def _listen(self) -> None:
+        quiet_frames = round(self.profile.end_of_speech_s * 1000 / FRAME_MS)
+        speaking, quiet = False, 0
+        while True:
+            frame = await self.audio_input.queue.get()
+            if frame.max() >= self.threshold:
+                speaking, quiet = True, 0
+            elif speaking:
+                quiet += 1
+                if quiet >= quiet_frames:
+                    speaking = False
+                    self._utterances.put_nowait(None)
+
+    async def stream(self) -> t.AsyncIterator:
+        listener = asyncio.create_task(self._listen())
+        chunk_s = len(self._chunk) / SAMPLE_RATE
+        try:
+            while True:
+                await self._utterances.get()
+                await asyncio.sleep(self.profile.stt_s)
+                async for _ in self.workflow.run("I would like a room for tonight."):
+                    pass
+                await asyncio.sleep(self.profile.tts_s)
+                yield VoiceStreamEventLifecycle(event="turn_started")
+                for i in range(round(self.profile.reply_s / chunk_s)):
+                    if i:
+                        await asyncio.sleep(chunk_s / self.profile.tts_speed)
+                    yield VoiceStreamEventAudio(data=self._chunk)
+                yield VoiceStreamEventLifecycle(event="turn_ended")
+        finally:
+            listener.cancel()
+
+
+class StubPipeline:
+    def __init__(self, workflow, profile: Profile):
+        self.workflow = workflow
+        self.profile = profile
+
+    async def run(self, audio_input):
+        return StubResult(self.workflow, audio_input, self.profile)
+
+
+@contextlib.contextmanager
+def simulated_calls(profile: Profile) -> t.Iterator[None]:
+    """Point DailyAgent at the fake Daily SDK and the stub pipeline for as long as the context is open."""
+    from plooxagent.api.daily import agent as daily_agent
+
+    SimCallClient.script = Script(profile)
+    patches = {
+        "Daily": SimDaily,
+        "CallClient": SimCallClient,
+        "VoicePipeline": lambda workflow, config=None: StubPipeline(workflow, profile),
+        "make_voice_workflow": lambda spans: StubWorkflow(spans, profile),
+    }
+    saved = {name: getattr(daily_agent, name) for name in patches}
+    for name, value in patches.items():
+        setattr(daily_agent, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(daily_agent, name, value)
+        SimDaily.microphones.clear()
+        SimCallClient.clients.clear()
+
+
+async def run_calls(calls: int, seconds: float, profile: Profile) -> dict:
+    """
+    Run ``calls`` simultaneous calls in this process for ``seconds`` and measure how they held up.
+
+    Returns:
+        dict: Raw counters of this process, summed by ``summarize`` across processes
+    """
+    from plooxagent.api.daily import DailyAgent
+
+    with simulated_calls(profile):
+        rss_before = process_rss_bytes()
+        response_counts, response_sum = list(RESPONSE.child().counts), RESPONSE.child().sum
+
+        agents = [DailyAgent(f"https://sim.daily.co/room-{i}") for i in range(calls)]
+        started = await asyncio.gather(*(agent.run() for agent in agents), return_exceptions=True)
+        failed = sum(isinstance(result, Exception) for result in started)
+
+        monitor = LoopLagMonitor(interval=0.01, window=int(seconds / 0.01) + 1)
+        monitor.start()
+        cpu_started, wall_started = time.process_time(), time.monotonic()
+        await asyncio.sleep(seconds)
+        cpu = time.process_time() - cpu_started
+        wall = time.monotonic() - wall_started
+        rss = process_rss_bytes()
+        await monitor.stop()
+        alive = sum(agent._task is not None and not agent._task.done() for agent in agents)
+
+        await asyncio.gather(*(agent.stop() for agent in agents))
+        await asyncio.gather(*(agent.wait() for agent in agents), return_exceptions=True)
+
+        response = [after - before for after, before in zip(RESPONSE.child().counts, response_counts)]
+        return {
+            "calls": calls,
+            "failed": failed,
+            "alive": alive,
+            "seconds": wall,
+            "cpu_s": cpu,
+            "rss_bytes": rss - rss_before,
+            "loop_lag": list(monitor.samples),
+            "inbound_frames": sum(agent.inbound_stats.frames for agent in agents),
+            "inbound_late": sum(agent.inbound_stats.late_frames for agent in agents),
+            "inbound_dropped": sum(agent.inbound_stats.dropped_frames for agent in agents),
+            "outbound_frames": sum(agent.outbound_stats.frames for agent in agents),
+            "outbound_underruns": sum(agent.outbound_stats.underruns for agent in agents),
+            "source_late": sum(client.late_frames for client in SimCallClient.clients),
+            "turns": sum(agent.spans.turns for agent in agents),
+            "response_counts": response,
+            "response_sum": RESPONSE.child().sum - response_sum,
+        }
+
+
+def _run_process(calls: int, seconds: float, profile: Profile) -> dict:
+    return asyncio.run(run_calls(calls, seconds, profile))
+
+
+def simulate(calls: int, seconds: float = 20.0, processes: int = 1, profile: Profile | None = None) -> dict:
+    """Run ``calls`` calls spread over ``processes`` processes (1 runs them in this one) and summarize."""
+    profile = profile or Profile()
+    if processes <= 1:
+        return summarize([asyncio.run(run_calls(calls, seconds, profile))])
+
+    shares = [calls // processes + (i < calls % processes) for i in range(processes)]
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(processes, mp_context=context) as pool:
+        results = list(pool.map(_run_process, shares, [seconds] * processes, [profile] * processes))
+    return summarize(results)
+
+
+def summarize(results: list[dict]) -> dict:
+    """Combine the counters of every process into the figures that decide whether the node held up."""
+    total = {key: sum(result[key] for result in results) for key in results[0] if key not in ("loop_lag", "response_counts", "seconds")}
+    calls = max(total["calls"], 1)
+    seconds = max(result["seconds"] for result in results)
+    lag = np.array([sample for result in results for sample in result["loop_lag"]] or [0.0])
+    response = Histogram(RESPONSE.buckets)
+    for result in results:
+        response.merge(result["response_counts"], result["response_sum"])
+    expected_frames = calls * seconds * 1000 / FRAME_MS
+    return {
+        "calls": total["calls"],
+        "processes": len(results),
+        "seconds": round(seconds, 2),
+        # Calls still up at the end of the run
+        "sustained": total["alive"],
+        "failed": total["failed"],
+        "turns": total["turns"],
+        # Frames (and rendered chunks) that missed their deadline anywhere on the way, per thousand expected
+        "deadline_misses_per_1k": round(
+            (total["inbound_late"] + total["inbound_dropped"] + total["outbound_underruns"] + total["source_late"])
+            / expected_frames * 1000, 3
+        ),
+        "inbound_late": total["inbound_late"],
+        "inbound_dropped": total["inbound_dropped"],
+        "outbound_underruns": total["outbound_underruns"],
+        "source_late": total["source_late"],
+        "loop_lag_p50_ms": round(float(np.percentile(lag, 50)) * 1e3, 2),
+        "loop_lag_p99_ms": round(float(np.percentile(lag, 99)) * 1e3, 2),
+        "loop_lag_max_ms": round(float(lag.max()) * 1e3, 2),
+        # Share of one core each call uses, and the memory it adds
+        "cpu_percent_per_call": round(total["cpu_s"] / seconds / calls * 100, 3),
+        "rss_kb_per_call": round(total["rss_bytes"] / calls / 1024, 1),
+        # Bucket upper bounds, as on /metrics, plus the exact mean
+        "response_mean_s": round(response.sum / response.count, 3) if response.count else 0.0,
+        "response_p50_s": response.quantile(0.5),
+        "response_p99_s": response.quantile(0.99),
+    }
+
+
+def held_up(summary: dict, max_misses_per_1k: float = 5.0, max_lag_ms: float = 50.0) -> bool:
+    return (
+        summary["sustained"] == summary["calls"]
+        and summary["deadline_misses_per_1k"] <= max_misses_per_1k
+        and summary["loop_lag_p99_ms"] <= max_lag_ms
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--ramp", help="comma-separated call counts to try in turn, e.g. 25,50,100")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--max-misses-per-1k", type=float, default=5.0)
+    parser.add_argument("--max-lag-ms", type=float, default=50.0)
+    parser.add_argument("--output", help="write the summaries to this JSON file")
+    for field in dataclasses.fields(Profile):
+        parser.add_argument(f"--{field.name.replace('_', '-')}", type=float, default=field.default)
+    args = parser.parse_args(argv)
+
+    profile = Profile(**{field.name: getattr(args, field.name) for field in dataclasses.fields(Profile)})
+    levels = [int(calls) for calls in args.ramp.split(",")] if args.ramp else [args.calls]
+    summaries = []
+    for calls in levels:
+        summary = simulate(calls, args.seconds, args.processes, profile)
+        summary["held_up"] = held_up(summary, args.max_misses_per_1k, args.max_lag_ms)
+        summaries.append(summary)
+        print(json.dumps(summary))
+        if not summary["held_up"] and args.ramp:
+            break
+
+    carried = [summary["calls"] for summary in summaries if summary["held_up"]]
+    print(f"Held up to {max(carried) if carried else 0} simultaneous calls", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"profile": dataclasses.asdict(profile), "levels": summaries}, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+import bisect
+import typing as t
+
+# Upper bounds of latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Counts of observed values per bucket, cumulative like Prometheus' ``le`` buckets when read."""
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: t.Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # The last count is for values above every bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile; inf if it is above every bucket."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        cumulative, seen = {}, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            cumulative[bound] = seen
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": cumulative,
+        }
+
+    def merge(self, counts: t.Sequence[int], total: float) -> None:
+        """Add the counts of a histogram with the same buckets, e.g. from another process."""
+        for i, count in enumerate(counts):
+            self.counts[i] += count
+        self.count += sum(counts)
+        self.sum += total
+
+
+class Family:
+    """A named metric with one value per combination of label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: t.Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.children: dict[tuple[str, ...], t.Any] = {}
+
+    def dump(self) -> dict:
+        return dict(self.children)
+
+    def merge(self, children: t.Mapping[tuple[str, ...], t.Any]) -> None:
+        for values, value in children.items():
+            self.children[values] = self.children.get(values, 0) + value
+
+    def samples(self) -> t.Iterator[tuple[str, dict[str, str], float]]:
+        for values, value in sorted(self.children.items()):
+            yield self.name, dict(zip(self.labels, values)), value
+
+
+class CounterFamily(Family):
+    kind = "counter"
+
+    def inc(self, *values: str, amount: float = 1) -> None:
+        self.children[values] = self.children.get(values, 0) + amount
+
+
+class GaugeFamily(Family):
+    kind = "gauge"
+
+    def set(self, value: float, *values: str) -> None:
+        self.children[values] = value
+
+
+class HistogramFamily(Family):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: t.Sequence[str] = (), buckets: t.Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def child(self, *values: str) -> Histogram:
+        histogram = self.children.get(values)
+        if histogram is None:
+            histogram = self.children[values] = Histogram(self.buckets)
+        return histogram
+
+    def observe(self, value: float, *values: str) -> None:
+        self.child(*values).observe(value)
+
+    def dump(self) -> dict:
+        return {values: (list(histogram.counts), histogram.sum) for values, histogram in self.children.items()}
+
+    def merge(self, children: t.Mapping[tuple[str, ...], t.Any]) -> None:
+        for values, (counts, total) in children.items():
+            self.child(*values).merge(counts, total)
+
+    def samples(self) -> t.Iterator[tuple[str, dict[str, str], float]]:
+        for values, histogram in sorted(self.children.items()):
+            labels = dict(zip(self.labels, values))
+            seen = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                seen += count
+                yield f"{self.name}_bucket", {**labels, "le": repr(float(bound))}, seen
+            yield f"{self.name}_bucket", {**labels, "le": "+Inf"}, histogram.count
+            yield f"{self.name}_sum", labels, histogram.sum
+            yield f"{self.name}_count", labels, histogram.count
+
+
+class Registry:
+    """
+    Metric families of one process, rendered in the Prometheus text format.
+
+    ``dump`` gives plain data that can be sent to another process and added to
+    its registry with ``merge``, so the supervisor can expose the metrics of its
+    workers.
+    """
+
+    def __init__(self):
+        self.families: dict[str, Family] = {}
+
+    def counter(self, name: str, help: str, labels: t.Sequence[str] = ()) -> CounterFamily:
+        return self._add(CounterFamily(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: t.Sequence[str] = ()) -> GaugeFamily:
+        return self._add(GaugeFamily(name, help, labels))
+
+    def histogram(
+        self, name: str, help: str, labels: t.Sequence[str] = (), buckets: t.Sequence[float] = LATENCY_BUCKETS
+    ) -> HistogramFamily:
+        return self._add(HistogramFamily(name, help, labels, buckets))
+
+    def dump(self) -> dict[str, dict]:
+        return {name: family.dump() for name, family in self.families.items()}
+
+    def merge(self, dump: t.Mapping[str, t.Mapping]) -> None:
+        """Add the values of another registry with the same families; unknown families are ignored."""
+        for name, children in dump.items():
+            if name in self.families:
+                self.families[name].merge(children)
+
+    def copy(self) -> "Registry":
+        """Empty registry with the same families."""
+        registry = Registry()
+        for family in self.families.values():
+            if isinstance(family, HistogramFamily):
+                registry.histogram(family.name, family.help, family.labels, family.buckets)
+            else:
+                registry._add(type(family)(family.name, family.help, family.labels))
+        return registry
+
+    def render(self) -> str:
+        return render(self.families.values())
+
+    def _add(self, family: Family) -> t.Any:
+        if family.name in self.families:
+            raise ValueError(f"Metric {family.name} already registered")
+        self.families[family.name] = family
+        return family
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render(families: t.Iterable[Family]) -> str:
+    """Families in the Prometheus text exposition format, version 0.0.4."""
+    lines = []
+    for family in families:
+        lines.append(f"# HELP {family.name} {_escape(family.help)}")
+        lines.append(f"# TYPE {family.name} {family.kind}")
+        for name, labels, value in family.samples():
+            if labels:
+                name += "{" + ",".join(f'{key}="{_escape(str(label))}"' for key, label in labels.items()) + "}"
+            lines.append(f"{name} {float(value)!r}")
+    return "\n".join(lines) + "\n"
@@ -1,3 +1,6 @@
+from datetime import date
+
+from sqlalchemy import CheckConstraint
 from sqlmodel import Field, SQLModel
 
 
@@ -6,3 +9,18 @@ class User(SQLModel):
     is_active: bool = True
     full_name: str | None = Field(default=None, max_length=255)
 
+
+class RoomNight(SQLModel, table=True):
+    """Availability and pricing of one room type on one night of the hotel calendar."""
+
+    __tablename__ = "room_night"
+    __table_args__ = (
+        CheckConstraint("available_rooms >= 0", name="room_night_available_rooms_non_negative"),
+    )
+
+    night: date = Field(primary_key=True)
+    room_type: str = Field(primary_key=True, max_length=32)
+    available_rooms: int = Field(ge=0)
+    base_price_1person: float
+    base_price_2people: float
+    extra_person_price: float
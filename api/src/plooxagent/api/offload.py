@@ -0,0 +1,67 @@
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import os
+import typing as t
+
+from plooxagent.api.voice_metrics import TOOL_TIMEOUTS
+
+logger = logging.getLogger(__name__)
+
+T = t.TypeVar("T")
+
+# Seconds a tool may take, queueing for a thread included, unless TOOL_TIMEOUT_<NAME> says otherwise
+TIMEOUTS = {
+    "check_vacancy": 3.0,
+    "check_vacancy_batch": 5.0,
+    "find_best_stays": 5.0,
+    "book_a_room": 10.0,
+}
+
+
+class ToolTimeout(Exception):
+    """Raised when the blocking work of a tool did not finish within its timeout."""
+
+    def __init__(self, tool: str, timeout: float):
+        super().__init__(f"{tool} did not finish within {timeout:g} s")
+        self.tool = tool
+        self.timeout = timeout
+
+
+@functools.cache
+def get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """
+    Process-wide pool for the blocking work of the tools.
+
+    Bounded by TOOL_THREADS, so a stalled disk ties up a few threads rather
+    than the event loop that pumps the audio of every call.
+    """
+    return concurrent.futures.ThreadPoolExecutor(
+        max_workers=int(os.environ.get("TOOL_THREADS", "4")), thread_name_prefix="tool"
+    )
+
+
+def tool_timeout(tool: str) -> float:
+    default = TIMEOUTS.get(tool, float(os.environ.get("TOOL_TIMEOUT", "5")))
+    return float(os.environ.get(f"TOOL_TIMEOUT_{tool.upper()}", default))
+
+
+async def run_blocking(tool: str, fn: t.Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run ``fn(*args, **kwargs)`` on the tool pool and wait for it at most the timeout of ``tool``.
+
+    Work still queued when the timeout expires is never started; work already
+    running is left to finish in its thread, as a thread cannot be interrupted.
+
+    Raises:
+        ToolTimeout: If the work did not finish in time
+    """
+    timeout = tool_timeout(tool)
+    future = asyncio.get_running_loop().run_in_executor(get_executor(), functools.partial(fn, *args, **kwargs))
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except TimeoutError:
+        TOOL_TIMEOUTS.inc(tool)
+        logger.warning("Tool %s timed out after %g s", tool, timeout)
+        raise ToolTimeout(tool, timeout) from None
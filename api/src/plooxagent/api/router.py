@@ -0,0 +1,288 @@
+import collections
+import dataclasses
+import json
+import logging
+import math
+import re
+import time
+import typing as t
+from collections.abc import AsyncIterator
+
+from agents import Agent, Runner
+from agents.voice import VoiceWorkflowBase
+
+from plooxagent.api.metrics import Histogram
+from plooxagent.api.voice_metrics import TurnSpans
+
+logger = logging.getLogger(__name__)
+
+UTTERANCES_PATH = "data/intent_utterances.jsonl"
+
+# Intents the router may send straight to an agent; "triage" marks everything else
+INTENTS = ("vacancy", "booking", "room_description", "hotel_history")
+TRIAGE = "triage"
+
+DECISION_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 1e-2)
+
+_DATE = re.compile(
+    r"\b(\d{4}-\d{2}-\d{2}|\d{1,2}(st|nd|rd|th)|(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\b"
+    r"|tomorrow|tonight|next (week|weekend|month)|weekend)"
+)
+_PARTY = r"(\d+|one|two|three|four|five|six) (people|persons?|adults|guests|friends)|a couple|a family|my (wife|husband|partner)"
+_RULES: dict[str, tuple[re.Pattern, float]] = {
+    "booking": (
+        re.compile(r"\b(book|booking|reserve|reservation|confirm the (room|stay)|put me down|hold the \w+ room)\b"),
+        0.85,
+    ),
+    "vacancy": (
+        re.compile(
+            r"\b(vacanc\w*|check availab\w*|(room|rooms|anything|something) (\w+ )?availab\w*|availab\w* (for|from|on|in)"
+            r"|free rooms?|(room|rooms) (is |are )?free|any rooms? (left|free)|fully booked|rates?|price|cost|cheaper"
+            r"|do you have (a |any )?(room|rooms|space|place|something)|(a room|something) for"
+            rf"|what options|same stay|{_PARTY})\b"
+        ),
+        0.85,
+    ),
+    "room_description": (
+        re.compile(
+            r"\b(which room|what rooms|room types?|kinds? of rooms?|suite|recommend|sqm|square met\w*|how big|what size"
+            r"|big enough|describe|amenities|bathroom|bathtub|soaking tub|king.?size|twin beds?|largest bed|minibar|nespresso"
+            r"|coffee machine|work desk|tv|living area|lounge access|what do i get|most comfortable)\b"
+        ),
+        0.85,
+    ),
+    "hotel_history": (
+        re.compile(
+            r"\b(history|historic\w*|heritage|story|unique about|special about|different from|built|villa district"
+            r"|tell me (something )?about (the hotel|your (place|hotel)|gdynia|sopot|orłowo|the area)|located|location"
+            r"|neighbou?rhood|the area|garden|linden|beach|far (to|from)|get to|bikes?|barbecue|separate entrances?)\b"
+        ),
+        0.85,
+    ),
+}
+
+
+def _features(text: str) -> list[str]:
+    words = re.findall(r"\w+", text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])] + (["<date>"] if _DATE.search(text.lower()) else [])
+
+
+class NaiveBayesClassifier:
+    """Multinomial naive Bayes over words, word pairs and a date marker; trains in milliseconds on a few hundred utterances."""
+
+    def __init__(self, examples: t.Iterable[tuple[str, str]], smoothing: float = 0.5):
+        counts: dict[str, collections.Counter] = collections.defaultdict(collections.Counter)
+        labels: collections.Counter[str] = collections.Counter()
+        for text, label in examples:
+            counts[label].update(_features(text))
+            labels[label] += 1
+        vocabulary = set().union(*counts.values()) if counts else set()
+        total = sum(labels.values())
+        self.labels = sorted(labels)
+        self._prior = {label: math.log(labels[label] / total) for label in self.labels}
+        self._log_prob: dict[str, dict[str, float]] = {}
+        self._unseen: dict[str, float] = {}
+        for label in self.labels:
+            denominator = sum(counts[label].values()) + smoothing * (len(vocabulary) + 1)
+            self._log_prob[label] = {
+                feature: math.log((count + smoothing) / denominator) for feature, count in counts[label].items()
+            }
+            self._unseen[label] = math.log(smoothing / denominator)
+        self._vocabulary = vocabulary
+
+    def probabilities(self, text: str) -> dict[str, float]:
+        """Posterior probability of every label."""
+        features = [feature for feature in _features(text) if feature in self._vocabulary]
+        scores = {
+            label: self._prior[label] + sum(self._log_prob[label].get(f, self._unseen[label]) for f in features)
+            for label in self.labels
+        }
+        best = max(scores.values())
+        weights = {label: math.exp(score - best) for label, score in scores.items()}
+        total = sum(weights.values())
+        return {label: weight / total for label, weight in weights.items()}
+
+    def predict(self, text: str) -> tuple[str, float]:
+        """Most likely label and its posterior probability."""
+        probabilities = self.probabilities(text)
+        best = max(probabilities, key=probabilities.get)
+        return best, probabilities[best]
+
+
+def read_utterances(path: str = UTTERANCES_PATH) -> list[tuple[str, str]]:
+    """Labeled utterances, one {"text": ..., "intent": ...} object per line; empty if the file is missing."""
+    try:
+        with open(path) as file:
+            return [(record["text"], record["intent"]) for record in map(json.loads, file) if record]
+    except FileNotFoundError:
+        return []
+
+
+@dataclasses.dataclass
+class RouteDecision:
+    # One of INTENTS, or None to let the triage agent decide
+    intent: str | None
+    confidence: float
+    # "rules", "both" (rules confirmed by the classifier) or "fallback"
+    stage: str
+
+
+@dataclasses.dataclass
+class RouterStats:
+    routed: collections.Counter[str] = dataclasses.field(default_factory=collections.Counter)
+    fallbacks: int = 0
+    # Time to decide, and the triage turn that routed decisions skip, in seconds
+    decision_latency: Histogram = dataclasses.field(default_factory=lambda: Histogram(DECISION_BUCKETS))
+    triage_hop: Histogram = dataclasses.field(default_factory=Histogram)
+
+    @property
+    def latency_saved(self) -> float:
+        """Estimated seconds saved: every routed turn skips one triage turn of average length."""
+        if not self.triage_hop.count:
+            return 0.0
+        return sum(self.routed.values()) * self.triage_hop.sum / self.triage_hop.count
+
+
+class IntentRouter:
+    """
+    Decides from the transcription alone which agent should answer, when that is obvious.
+
+    Keyword rules propose intents. A naive Bayes classifier trained on labeled
+    utterances picks among several, and vetoes a rule when it is fairly sure of
+    another intent. Decisions below ``threshold``, including everything no rule
+    matches, are left to the triage agent.
+    """
+
+    def __init__(self, examples: t.Iterable[tuple[str, str]] | None = None, threshold: float = 0.8):
+        examples = list(read_utterances() if examples is None else examples)
+        self.classifier = NaiveBayesClassifier(examples) if examples else None
+        self.threshold = threshold
+        self.stats = RouterStats()
+
+    def route(self, text: str) -> RouteDecision:
+        started = time.perf_counter()
+        decision = self._decide(text)
+        self.stats.decision_latency.observe(time.perf_counter() - started)
+        if decision.intent is None:
+            self.stats.fallbacks += 1
+        else:
+            self.stats.routed[decision.intent] += 1
+        return decision
+
+    def _decide(self, text: str) -> RouteDecision:
+        lowered = text.lower()
+        matched = [intent for intent, (pattern, _) in _RULES.items() if pattern.search(lowered)]
+        if not matched:
+            return RouteDecision(None, 0.0, "fallback")
+
+        label, probability = self.classifier.predict(text) if self.classifier else (None, 0.0)
+        if len(matched) == 1:
+            intent = matched[0]
+        elif label in matched:
+            intent = label
+        elif set(matched) == {"booking", "vacancy"}:
+            # "Is there a room available to book ..." asks about vacancy first
+            intent = "vacancy"
+        else:
+            return RouteDecision(None, 0.0, "fallback")
+
+        confidence = _RULES[intent][1]
+        if intent in ("booking", "vacancy") and _DATE.search(lowered):
+            confidence += 0.1
+        stage = "rules"
+        if label == intent:
+            confidence, stage = max(confidence, probability), "both"
+        elif label is not None and probability > 0.5:
+            # The classifier vetoes the rule; alone it is too sure of itself on so little data
+            confidence -= 0.3 * probability
+        if confidence < self.threshold:
+            return RouteDecision(None, confidence, "fallback")
+        return RouteDecision(intent, confidence, stage)
+
+    def snapshot(self) -> dict:
+        return {
+            "threshold": self.threshold,
+            "routed": dict(self.stats.routed),
+            "fallbacks": self.stats.fallbacks,
+            "decision_latency": self.stats.decision_latency.snapshot(),
+            "triage_hop": self.stats.triage_hop.snapshot(),
+            "latency_saved_s": round(self.stats.latency_saved, 3),
+        }
+
+
+class RoutedVoiceWorkflow(VoiceWorkflowBase):
+    """
+    Voice workflow that sends obvious requests straight to their agent and the rest to triage.
+
+    Like SingleAgentVoiceWorkflow, it keeps the conversation history and the
+    agent that answered last across turns. A turn the router claims goes to its
+    agent; any other turn, or every turn if there is no router, goes to the
+    agent that answered last, which is triage until a handoff. If ``spans`` is
+    given, the transcription, first text and every agent, tool call and handoff
+    of a turn are marked on it.
+    """
+
+    def __init__(
+        self,
+        triage: Agent,
+        agents: t.Mapping[str, Agent],
+        router: IntentRouter | None = None,
+        spans: TurnSpans | None = None,
+    ):
+        self._triage = triage
+        self._agents = agents
+        self._router = router
+        self._spans = spans
+        self._input_history: list = []
+        self._current_agent = triage
+
+    async def run(self, transcription: str) -> AsyncIterator[str]:
+        spans = self._spans
+        if spans is not None:
+            spans.transcription()
+        self._input_history.append({"role": "user", "content": transcription})
+        agent = self._current_agent
+        if self._router is not None:
+            decision = self._router.route(transcription)
+            if decision.intent is not None:
+                agent = self._agents[decision.intent]
+            logger.info("Routed %r to %s (%s, %.2f)", transcription, agent.name, decision.stage, decision.confidence)
+
+        started = time.perf_counter()
+        result = Runner.run_streamed(agent, self._input_history)
+        try:
+            async for event in result.stream_events():
+                if event.type == "raw_response_event" and event.data.type == "response.output_text.delta":
+                    if spans is not None:
+                        spans.text()
+                    yield event.data.delta
+                elif event.type == "agent_updated_stream_event":
+                    if spans is not None:
+                        spans.agent_started_running(event.new_agent.name)
+                    if self._router is not None and agent is self._triage and event.new_agent is not self._triage:
+                        # What a routed turn saves: the triage turn that only picks a handoff
+                        self._router.stats.triage_hop.observe(time.perf_counter() - started)
+                elif event.type == "run_item_stream_event" and spans is not None:
+                    _mark_item(spans, event)
+        finally:
+            if spans is not None:
+                spans.agent_done()
+
+        self._input_history = result.to_input_list()
+        self._current_agent = result.last_agent
+
+
+def _mark_item(spans: TurnSpans, event) -> None:
+    item = event.item
+    if event.name == "tool_called":
+        raw = item.raw_item
+        call_id = getattr(raw, "call_id", None) or getattr(raw, "id", None)
+        if call_id is not None:
+            spans.tool_called(call_id, getattr(raw, "name", None) or raw.type)
+    elif event.name == "tool_output":
+        raw = item.raw_item
+        call_id = raw.get("call_id") if isinstance(raw, dict) else getattr(raw, "call_id", None)
+        if call_id is not None:
+            spans.tool_done(call_id)
+    elif event.name == "handoff_occured":
+        spans.handoff(item.source_agent.name, item.target_agent.name)
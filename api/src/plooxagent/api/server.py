@@ -1,23 +1,154 @@
 import contextlib
 import dataclasses
+import functools
 import logging
+import math
+import os
 import typing as t
 
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 
-from .daily import DailyAgent, DailyService
+from .agentic_components import get_router, get_vs_ids, setup_agents
+from .custom_tools import CALENDAR_PATH, get_calendar_shards, get_calendar_store
+from .daily import DailyService, init_daily
+from .database.mapped import binary_twin
+from .database.postgres import PostgresCalendar, use_calendar
+from .hotels import check_hotel_id
+from .metrics import Registry
+from .router import DECISION_BUCKETS, TRIAGE
+from .sessions import SessionManager
+from .translation import get_translator
+from .voice_metrics import LOOP_LAG, VOICE
+from .workers import CallWorkerPool, LoopLagMonitor, Overloaded, prepare_worker, slow_callback_threshold
 
 
 @dataclasses.dataclass
 class AppCtx:
     cm: contextlib.AsyncExitStack
     daily: DailyService
+    sessions: SessionManager
+    calendar: PostgresCalendar | None = None
+    workers: CallWorkerPool | None = None
+
+
+async def create_calendar(cm: contextlib.AsyncExitStack, import_csv: bool = True) -> PostgresCalendar | None:
+    """
+    Open the shared Postgres calendar pool if CALENDAR_BACKEND=postgres, else keep the CSV (or mmap) store.
+
+    With ``import_csv`` the nights of the CSV calendar missing from the table are
+    inserted first; call workers leave that to the supervisor, which does it once.
+    """
+    if os.environ.get("CALENDAR_BACKEND", "csv") != "postgres":
+        return None
+
+    from .config import settings
+
+    calendar = await PostgresCalendar.create(cm, settings.DATABASE_URL)
+    if import_csv:
+        await calendar.import_store(get_calendar_store())
+    use_calendar(calendar)
+    cm.callback(use_calendar, None)
+    return calendar
+
+
+def idle_timeout() -> float:
+    return float(os.environ.get("CALL_IDLE_TIMEOUT", "300"))
+
+
+async def create_workers(cm: contextlib.AsyncExitStack, daily: DailyService) -> CallWorkerPool | None:
+    """Run calls in worker processes if CALL_WORKERS is set ("auto" for one per core), else in this one."""
+    workers = os.environ.get("CALL_WORKERS", "0")
+    if workers == "0":
+        return None
+    if os.environ.get("CALENDAR_BACKEND", "csv") not in ("postgres", "mmap"):
+        # Every process would keep and book its own copy of the CSV calendar
+        raise RuntimeError("CALL_WORKERS needs CALENDAR_BACKEND=postgres or mmap")
+    if os.environ["CALENDAR_BACKEND"] == "mmap":
+        # Imported here once, rather than by whichever workers first open it
+        binary_twin(CALENDAR_PATH)
+
+    return await CallWorkerPool.create(
+        cm,
+        workers=None if workers == "auto" else int(workers),
+        max_calls_per_worker=int(os.environ.get("CALL_WORKER_CAPACITY", "8")),
+        max_loop_lag=float(os.environ.get("CALL_MAX_LOOP_LAG_MS", "100")) / 1000,
+        prepare=functools.partial(prepare_worker, vs_ids=get_vs_ids()),
+        on_call_ended=daily.delete_room,
+    )
+
+
+def collect_metrics(ctx: AppCtx) -> Registry:
+    """Voice latency of every call, in this process or its workers, and the state of the services around it."""
+    if ctx.workers is not None:
+        registry = ctx.workers.voice_metrics()
+        live = sum(len(worker.calls) for worker in ctx.workers.workers)
+        lag = registry.gauge("call_worker_loop_lag_seconds", "Event loop lag of each call worker", ("worker",))
+        for worker in ctx.workers.workers:
+            lag.set(worker.loop_lag, str(worker.worker_id))
+    else:
+        registry = VOICE.copy()
+        registry.merge(VOICE.dump())
+        live = len(ctx.sessions)
+    registry.gauge("calls_live", "Calls in progress").set(live)
+    lag = registry.families[LOOP_LAG.name].child()
+    percentiles = registry.gauge("event_loop_lag_quantile_seconds", "Percentiles of event_loop_lag_seconds", ("quantile",))
+    for q in (0.5, 0.9, 0.99):
+        percentiles.set(lag.quantile(q), str(q))
+
+    intent_router = get_router()
+    if intent_router is not None:
+        decisions = registry.counter("router_decisions_total", "Turns by the agent the router sent them to", ("intent",))
+        for intent, count in intent_router.stats.routed.items():
+            decisions.inc(intent, amount=count)
+        decisions.inc(TRIAGE, amount=intent_router.stats.fallbacks)
+        latency = registry.histogram("router_decision_seconds", "Time the router took to decide", buckets=DECISION_BUCKETS)
+        latency.children[()] = intent_router.stats.decision_latency
+
+    shards = get_calendar_shards().stats
+    registry.gauge("hotel_calendars_resident", "Hotel calendars loaded in this process").set(len(get_calendar_shards()))
+    registry.counter("hotel_calendar_loads_total", "Hotel calendars opened from disk").inc(amount=shards.loads)
+    registry.counter("hotel_calendar_evictions_total", "Hotel calendars dropped to stay within the resident cap").inc(amount=shards.evicted)
+
+    requests = registry.counter("daily_http_requests_total", "Requests to the Daily API", ("endpoint",))
+    retries = registry.counter("daily_http_retries_total", "Retried requests to the Daily API", ("endpoint",))
+    failures = registry.counter("daily_http_failures_total", "Failed requests to the Daily API", ("endpoint",))
+    latency = registry.histogram("daily_http_request_seconds", "Latency of requests to the Daily API", ("endpoint",))
+    for endpoint, stats in ctx.daily.http_endpoints.items():
+        requests.inc(endpoint, amount=stats.requests)
+        retries.inc(endpoint, amount=stats.retries)
+        failures.inc(endpoint, amount=stats.failures)
+        latency.children[(endpoint,)] = stats.latency
+    return registry
+
+
+def overloaded(e: Overloaded) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(e)},
+        headers={"Retry-After": str(math.ceil(e.retry_after))},
+    )
 
 
 @contextlib.asynccontextmanager
 async def lifespan(app: FastAPI) -> t.AsyncGenerator[None, None]:
     async with contextlib.AsyncExitStack() as cm:
-        app.state.ctx = AppCtx(cm=cm, daily=await DailyService.create(cm))
+        # Nothing is initialized at import; pay for the SDK and the vector stores here, once
+        init_daily()
+        await setup_agents()
+        # Saves the translation cache on shutdown, if it is persisted
+        cm.push_async_callback(get_translator().close)
+        daily = await DailyService.create(cm)
+        calendar = await create_calendar(cm)
+        # Closed before the calendar and the room service, so ending calls can still use them
+        sessions = await SessionManager.create(cm, daily=daily, idle_timeout=idle_timeout())
+        workers = await create_workers(cm, daily)
+        if workers is None:
+            # Calls run on this loop: watch it as the workers watch theirs
+            monitor = LoopLagMonitor(slow_after=slow_callback_threshold(), histogram=LOOP_LAG.child())
+            monitor.start()
+            cm.push_async_callback(monitor.stop)
+        app.state.ctx = AppCtx(cm=cm, daily=daily, sessions=sessions, calendar=calendar, workers=workers)
         yield
 
 
@@ -30,13 +161,87 @@ async def root():
     return {"message": "Hello World"}
 
 
+@app.get("/rooms/pool")
+async def room_pool():
+    daily = app.state.ctx.daily
+    stats = daily.stats
+    return {
+        **dataclasses.asdict(stats),
+        "refill_latency_avg": stats.refill_latency_avg,
+        "pool_size": daily.pool_size,
+        "pooled_rooms": daily.pooled_rooms,
+    }
+
+
+@app.get("/daily/cache")
+async def daily_cache():
+    return app.state.ctx.daily.cache_stats()
+
+
+@app.get("/daily/http")
+async def daily_http():
+    return app.state.ctx.daily.http_stats()
+
+
+@app.get("/router")
+async def router():
+    intent_router = get_router()
+    if intent_router is None:
+        return {"enabled": False}
+    return {"enabled": True, **intent_router.snapshot()}
+
+
+@app.get("/hotels/calendars")
+async def hotel_calendars():
+    return get_calendar_shards().report()
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(collect_metrics(app.state.ctx).render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/calls")
+async def calls():
+    workers = app.state.ctx.workers
+    if workers is None:
+        return {"mode": "in-process", "sessions": app.state.ctx.sessions.report()}
+    return {"mode": "workers", "workers": workers.calls()}
+
+
+@app.get("/sessions")
+async def sessions():
+    return app.state.ctx.sessions.report()
+
+
 @app.post("/call")
-async def call():
-    room_uri = await app.state.ctx.daily.create_room()
+async def call(hotel_id: str | None = None):
+    if hotel_id is not None:
+        try:
+            check_hotel_id(hotel_id)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"detail": str(e)})
+    workers = app.state.ctx.workers
+    if workers is not None:
+        try:
+            worker = workers.admit()
+        except Overloaded as e:
+            return overloaded(e)
+        room_uri = await app.state.ctx.daily.create_room()
+        try:
+            await workers.start_call(room_uri, worker, hotel_id)
+        except Exception as e:
+            await app.state.ctx.daily.delete_room(room_uri)
+            if isinstance(e, Overloaded):
+                return overloaded(e)
+            raise
+        return {
+            "url": room_uri,
+        }
 
-    agent = DailyAgent(room_uri)
-    await agent.run()
-    app.state.ctx.cm.push_async_callback(agent.stop)
+    room_uri = await app.state.ctx.daily.create_room()
+    # Stopped and its room deleted once the caller leaves or goes quiet
+    await app.state.ctx.sessions.start(room_uri, hotel_id=hotel_id)
 
     return {
         "url": room_uri,
@@ -0,0 +1,204 @@
+import asyncio
+import collections
+import contextlib
+import dataclasses
+import logging
+import os
+import resource
+import time
+import typing as t
+import uuid
+import weakref
+
+from .hotels import serving
+
+logger = logging.getLogger(__name__)
+
+
+def process_rss_bytes() -> int:
+    """Resident memory of this process; the peak on systems without /proc."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@dataclasses.dataclass
+class Session:
+    session_id: str
+    room_uri: str
+    agent: t.Any
+    started_at: float
+    # Why the session was stopped, if it was
+    reason: str | None = None
+    # Hotel the call is for; None for the process default
+    hotel_id: str | None = None
+
+    _watcher: asyncio.Task | None = dataclasses.field(
+        init=False,
+        default=None,
+        repr=False,
+    )
+
+
+class SessionManager:
+    """
+    Owns the live call sessions of a process.
+
+    Every session is watched until its agent ends, however it ends, and is then
+    released at once: dropped from the manager, its room deleted and
+    ``on_ended`` called. A reaper stops sessions whose caller has left or that
+    have been idle for longer than ``idle_timeout``.
+    """
+
+    def __init__(
+        self,
+        daily: t.Any | None = None,
+        session_factory: t.Callable[[str], t.Any] | None = None,
+        idle_timeout: float = 300.0,
+        reap_interval: float = 5.0,
+        on_ended: t.Callable[[Session], None] | None = None,
+    ):
+        if session_factory is None:
+            from .daily import DailyAgent
+
+            session_factory = DailyAgent
+        # Rooms of ended sessions are deleted through it, if given
+        self.daily = daily
+        self.session_factory = session_factory
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self.on_ended = on_ended
+        self.started = 0
+        self.ended: collections.Counter[str] = collections.Counter()
+        self._sessions: dict[str, Session] = {}
+        # Agents of released sessions, for as long as anything else keeps them alive
+        self._released: weakref.WeakValueDictionary[str, t.Any] = weakref.WeakValueDictionary()
+        self._reaper: asyncio.Task | None = None
+
+    @classmethod
+    async def create(cls, cm: contextlib.AsyncExitStack, **kwargs) -> t.Self:
+        manager = cls(**kwargs)
+        manager._reaper = asyncio.create_task(manager._reap_loop())
+        cm.push_async_callback(manager.close)
+        return manager
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    async def start(self, room_uri: str, session_id: str | None = None, hotel_id: str | None = None) -> Session:
+        """
+        Start a session in ``room_uri`` and watch it until it ends.
+
+        Args:
+            room_uri: Room to join; deleted if the session fails to start
+            session_id: ID to track the session by, else the agent's own or a new one
+            hotel_id: Hotel the call is for, seen by its tools through hotels.current_hotel
+        """
+        # The call's tasks are started within, and inherit the hotel
+        with serving(hotel_id):
+            agent = self.session_factory(room_uri)
+            session_id = session_id or getattr(agent, "session_id", None) or uuid.uuid4().hex
+            try:
+                await agent.run()
+            except Exception:
+                await self._delete_room(room_uri)
+                raise
+        session = Session(session_id, room_uri, agent, time.time(), hotel_id=hotel_id)
+        self._sessions[session_id] = session
+        self.started += 1
+        session._watcher = asyncio.create_task(self._watch(session))
+        return session
+
+    async def stop(self, session_id: str, reason: str = "stopped") -> None:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return
+        if session.reason is None:
+            session.reason = reason
+        await session.agent.stop()
+
+    async def close(self) -> None:
+        """Stop the reaper and every session, and wait until all of them are released."""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._reaper
+            self._reaper = None
+        sessions = list(self._sessions.values())
+        await asyncio.gather(*(self.stop(session.session_id, "shutdown") for session in sessions))
+        await asyncio.gather(*(session._watcher for session in sessions), return_exceptions=True)
+
+    def counts(self) -> dict:
+        return {
+            "live": len(self._sessions),
+            "started": self.started,
+            "ended": dict(self.ended),
+            # Should stay near 0; a growing number means ended calls are still referenced
+            "released_alive": len(self._released),
+        }
+
+    def report(self) -> dict:
+        """Counts, process memory and the age, idle time and buffer memory of every live session."""
+        now, clock = time.time(), time.monotonic()
+        sessions = []
+        for session in self._sessions.values():
+            agent = session.agent
+            memory_bytes = getattr(agent, "memory_bytes", None)
+            spans = getattr(agent, "spans", None)
+            sessions.append({
+                "session_id": session.session_id,
+                "room_uri": session.room_uri,
+                "hotel_id": session.hotel_id,
+                "age_s": round(now - session.started_at, 1),
+                "idle_s": round(clock - getattr(agent, "last_activity", clock), 1),
+                "memory_bytes": memory_bytes() if memory_bytes is not None else None,
+                "turns": spans.turns if spans is not None else None,
+                "last_turn": spans.last if spans is not None else None,
+            })
+        return {
+            **self.counts(),
+            "rss_bytes": process_rss_bytes(),
+            "sessions": sessions,
+        }
+
+    async def _watch(self, session: Session) -> None:
+        try:
+            await session.agent.wait()
+        except Exception:
+            logger.exception("Session %s failed", session.session_id)
+            session.reason = session.reason or "failed"
+        finally:
+            await self._release(session)
+
+    async def _release(self, session: Session) -> None:
+        reason = session.reason or "ended"
+        self._sessions.pop(session.session_id, None)
+        self.ended[reason] += 1
+        self._released[session.session_id] = session.agent
+        logger.info("Session %s ended (%s) after %.0f s", session.session_id, reason, time.time() - session.started_at)
+        await self._delete_room(session.room_uri)
+        if self.on_ended is not None:
+            self.on_ended(session)
+        session.agent = None
+
+    async def _delete_room(self, room_uri: str) -> None:
+        if self.daily is not None:
+            await self.daily.delete_room(room_uri)
+
+    async def _reap_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            clock = time.monotonic()
+            for session in list(self._sessions.values()):
+                agent = session.agent
+                if session.reason is not None:
+                    continue
+                if getattr(agent, "caller_left", False):
+                    await self.stop(session.session_id, "caller_left")
+                elif clock - getattr(agent, "last_activity", clock) > self.idle_timeout:
+                    await self.stop(session.session_id, "idle")
@@ -1,6 +1,6 @@
 # %%
 from agents import Runner, trace
-from plooxagent.api.agentic_components import triage_agent
+from plooxagent.api.agentic_components import setup_agents
 import asyncio
 
 from agents import set_trace_processors
@@ -17,6 +17,7 @@ async def test_queries():
         "Do you have a vacancy for two persons for two nights starting on 26th of April?",
         "Make the reservation for executive room from the April 26th to 28th."
     ]
+    triage_agent = await setup_agents()
     with trace("The Night Receptionist"):
         for query in examples:
             result = await Runner.run(triage_agent, query)
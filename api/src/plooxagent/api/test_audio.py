@@ -0,0 +1,161 @@
+# %%
+import asyncio
+import threading
+import time
+
+import numpy as np
+
+from plooxagent.api.daily.audio import InboundAudio, OutboundAudio
+
+SAMPLE_RATE = 16000
+FRAME = SAMPLE_RATE * 20 // 1000
+
+
+class HeldMicrophone:
+    """Device whose first write blocks until released, and that keeps a copy of every frame."""
+
+    def __init__(self):
+        self.name = "held"
+        self.frames: list[np.ndarray] = []
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def write_frames(self, frames) -> int:
+        if not self.frames:
+            self.writing.set()
+            self.release.wait()
+        self.frames.append(np.frombuffer(frames, dtype=np.int16).copy())
+        return len(self.frames[-1])
+
+
+async def test_outbound_audio():
+    # The frame being written is a view of the ring; an interrupt and a full buffer of new audio leave it alone
+    microphone = HeldMicrophone()
+    outbound = OutboundAudio(microphone, SAMPLE_RATE, capacity_ms=100)
+    outbound.start()
+    await outbound.push(np.full(3 * FRAME, 1, dtype=np.int16))
+    assert await asyncio.to_thread(microphone.writing.wait, 1)
+    outbound.interrupt()
+    assert outbound.stats.drained_samples == 2 * FRAME
+    answer = asyncio.create_task(outbound.push(np.full(len(outbound._buffer), 2, dtype=np.int16)))
+    await asyncio.sleep(0.05)
+    # Every frame of the ring but the one in flight was free
+    assert not answer.done() and outbound.stats.full_waits == 1
+    microphone.release.set()
+    await asyncio.wait_for(answer, 1)
+    outbound.end_turn()
+    while outbound.stats.depth_samples:
+        await asyncio.sleep(0.01)
+    await outbound.stop()
+    assert (microphone.frames[0] == 1).all()
+    assert len(microphone.frames) == 1 + len(outbound._buffer) // FRAME
+    assert all((frame == 2).all() for frame in microphone.frames[1:])
+
+
+def frame_of(value: int) -> bytes:
+    return np.full(FRAME, value, dtype=np.int16).tobytes()
+
+
+async def test_inbound_audio():
+    inbound = InboundAudio(SAMPLE_RATE, capacity_ms=100, voice_threshold=500)
+    inbound.start()
+    slots = len(inbound._ring)
+
+    # A full ring drops what arrives and counts it, keeping the frames already queued
+    for i in range(slots + 3):
+        inbound.write(frame_of(i + 1))
+    assert inbound.stats.frames == slots + 3 and inbound.stats.dropped_frames == 3
+    frames = inbound.frames()
+    received = [int((await anext(frames))[0]) for _ in range(slots)]
+    assert received == list(range(1, slots + 1))
+
+    # Slots come back once the consumer has moved on, and the ring takes frames again
+    inbound.write(frame_of(100))
+    assert inbound.stats.dropped_frames == 3
+    frame = await anext(frames)
+    assert (frame == 100).all() and not frame.flags.writeable
+
+    # Half a frame is a short read, padded with silence
+    inbound.write(np.full(FRAME // 2, 7, dtype=np.int16).tobytes())
+    frame = await anext(frames)
+    assert inbound.stats.short_reads == 1 and (frame[:FRAME // 2] == 7).all() and not frame[FRAME // 2:].any()
+
+    # last_voice_at follows frames peaking at the threshold either way, not quiet ones
+    quiet = inbound.last_voice_at
+    time.sleep(0.002)
+    inbound.write(frame_of(499))
+    assert inbound.last_voice_at == quiet
+    inbound.write(frame_of(-500))
+    spoken = inbound.last_voice_at
+    assert spoken > quiet
+    time.sleep(0.002)
+    # ... even while the ring is full and the frame is dropped
+    for _ in range(slots):
+        inbound.write(frame_of(600))
+    assert inbound.stats.dropped_frames > 3 and inbound.last_voice_at > spoken
+
+    await inbound.stop()
+    await frames.aclose()
+
+
+async def test_inbound_stall():
+    # The pipeline's queue backs up past the ring, then drains: the ring takes audio again
+    inbound = InboundAudio(SAMPLE_RATE, capacity_ms=200)
+    inbound.start()
+    slots = len(inbound._ring)
+    queue = asyncio.Queue()
+
+    async def consume():
+        async for frame in inbound.frames(in_flight=queue.qsize):
+            queue.put_nowait(frame)
+
+    consumer = asyncio.create_task(consume())
+    for i in range(slots + 5):
+        inbound.write(frame_of(i + 1))
+        await asyncio.sleep(0)
+    assert queue.qsize() == slots and inbound.stats.dropped_frames == 5
+    stalled = [int(queue.get_nowait()[0]) for _ in range(slots)]
+    assert stalled == list(range(1, slots + 1))
+
+    for i in range(80):
+        inbound.write(frame_of(1000 + i))
+        await asyncio.sleep(0)
+        while not queue.empty():
+            assert int(queue.get_nowait()[0]) == 1000 + i
+    # Only the frame that found the ring still full is lost
+    assert inbound.stats.dropped_frames == 6, inbound.stats
+    await inbound.stop()
+    consumer.cancel()
+
+
+async def test_inbound_rendered():
+    # The renderer's chunks come at its own rate and size: they are mixed down, resampled and joined into frames
+    inbound = InboundAudio(SAMPLE_RATE)
+    inbound.start()
+    frames = inbound.frames()
+    stereo = np.tile(np.array([300, 100], dtype=np.int16), 480).tobytes()
+    inbound.write_rendered(stereo, 48000, channels=2)
+    assert inbound.stats.frames == 0
+    inbound.write_rendered(stereo, 48000, channels=2)
+    frame = await anext(frames)
+    assert inbound.stats.frames == 1 and (frame == 200).all(), frame
+
+    # Less than a frame at the ring's rate waits for the rest, rather than being padded
+    inbound.write_rendered(frame_of(7)[:FRAME], SAMPLE_RATE)
+    inbound.write_rendered(frame_of(7)[FRAME:] + frame_of(8), SAMPLE_RATE)
+    assert [int(frame[-1]) for frame in [await anext(frames), await anext(frames)]] == [7, 8]
+    assert inbound.stats.short_reads == 0 and inbound.stats.frames == 3
+
+    await inbound.stop()
+    await frames.aclose()
+
+
+async def main():
+    await test_outbound_audio()
+    await test_inbound_audio()
+    await test_inbound_stall()
+    await test_inbound_rendered()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,36 @@
+# %%
+import asyncio
+import copy
+import os
+import tempfile
+
+from plooxagent.api import benchmarks
+
+
+async def test_benchmarks():
+    results = await benchmarks.run(["tools", "calendar_io", "vs_setup"], repeat=1, quick=True)
+    assert set(results["results"]) == {"tools", "calendar_io", "vs_setup"}
+    assert all(value >= 0 for metrics in results["results"].values() for value in metrics.values())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "results.json")
+        benchmarks.write_results(results, path)
+        assert benchmarks.read_results(path) == results
+    assert benchmarks.read_results(os.path.join(tmp, "missing.json")) is None
+
+    # Only a slowdown beyond both the tolerance and the noise floor is a regression
+    slower = copy.deepcopy(results)
+    slower["results"]["calendar_io"]["write_csv_1y_ms"] += 1.0
+    slower["results"]["calendar_io"]["write_csv_1y_ms"] *= 2
+    slower["results"]["vs_setup"]["unchanged_ms"] += 0.01
+    slower["results"]["tools"]["check_vacancy_1y_ms"] /= 2
+    rows = benchmarks.compare(slower, results)
+    assert len(rows) == sum(map(len, results["results"].values()))
+    assert [(row["benchmark"], row["metric"]) for row in rows if row["regression"]] == [("calendar_io", "write_csv_1y_ms")]
+    faster = {(row["benchmark"], row["metric"]): row["regression"] for row in benchmarks.compare(results, slower)}
+    assert not faster["calendar_io", "write_csv_1y_ms"] and not faster["vs_setup", "unchanged_ms"]
+    print(f"{len(rows)} metrics compared: {results['results']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_benchmarks())
@@ -0,0 +1,78 @@
+# %%
+import asyncio
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from plooxagent.api.database.calendar import ROOM_TYPES, CalendarArrays, HotelCalendarStore
+
+BOOKINGS = 16
+
+
+def same_calendar(a: CalendarArrays, b: CalendarArrays) -> bool:
+    return a.origin == b.origin and (a.known == b.known).all() and (a.available_rooms == b.available_rooms).all()
+
+
+async def test_booking_journal():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "calendar.csv")
+        arrays = CalendarArrays.mock(date(2025, 4, 20), days=365, seed=3)
+        # Enough rooms everywhere that no booking below fails
+        arrays.available_rooms[:] = 100
+        arrays.write_csv(csv_path)
+        first = arrays.origin
+
+        # Concurrent bookings share fsyncs: the journal holds the flush open to collect them
+        store = HotelCalendarStore(csv_path, commit_delay=0.05).refresh()
+
+        def book(i):
+            start = first + timedelta(days=i * 3)
+            return store.book(start, start + timedelta(days=4), ROOM_TYPES[i % len(ROOM_TYPES)])
+
+        with ThreadPoolExecutor(BOOKINGS) as executor:
+            assert list(executor.map(book, range(BOOKINGS))) == [[]] * BOOKINGS
+        print(f"{BOOKINGS} bookings in {store.journal.flushes} fsyncs")
+        assert store.journal.flushes < BOOKINGS
+        booked = store.arrays()
+        expected = arrays.copy()
+        for i in range(BOOKINGS):
+            expected.available_rooms[i * 3:i * 3 + 5, i % len(ROOM_TYPES)] -= 1
+        assert same_calendar(booked, expected)
+        store.journal.close()
+
+        # A fresh store rebuilds the same calendar from the CSV snapshot and the journal
+        replayed = HotelCalendarStore(csv_path)
+        assert same_calendar(replayed.arrays(), booked)
+        replayed.journal.close()
+
+        # A crash in the middle of a write leaves half a line; replay cuts it off
+        journal_path = csv_path + ".journal"
+        size = os.path.getsize(journal_path)
+        with open(journal_path, "ab") as journal_file:
+            journal_file.write(b'1234abcd {"room_type":"standard","start":"2025-')
+        torn = HotelCalendarStore(csv_path)
+        assert same_calendar(torn.arrays(), booked)
+        assert os.path.getsize(journal_path) == size
+        # and the next booking lands after the good records
+        assert torn.book(first, first, ROOM_TYPES[0]) == []
+        booked.available_rooms[0, 0] -= 1
+        torn.journal.close()
+        assert same_calendar(HotelCalendarStore(csv_path).arrays(), booked)
+
+        # Compaction folds the journal into the CSV and empties it
+        store = HotelCalendarStore(csv_path).refresh()
+        # The records replayed so far count towards it too
+        store.journal.compact_every = store.journal.records_since_compaction + 3
+        for i in range(3):
+            day = first + timedelta(days=100 + i)
+            assert store.book(day, day, ROOM_TYPES[1]) == []
+            booked.available_rooms[100 + i, 1] -= 1
+        store.journal.close()
+        assert os.path.getsize(journal_path) == 0
+        assert same_calendar(CalendarArrays.read_csv(csv_path), booked)
+        assert same_calendar(HotelCalendarStore(csv_path).arrays(), booked)
+
+
+if __name__ == "__main__":
+    asyncio.run(test_booking_journal())
@@ -0,0 +1,158 @@
+# %%
+import asyncio
+import csv
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from plooxagent.api.database.calendar import (
+    CSV_HEADER,
+    ROOM_TYPES,
+    CalendarArrays,
+    CalendarView,
+    HotelCalendar,
+    HotelCalendarStore,
+    RoomTypeCalendar,
+)
+
+YEARS = 10
+MOCK_RANGES = (
+    ([0, 0, 0, 1, 2, 3, 4, 5], (50, 100), (80, 120), (20, 30)),
+    ([0, 0, 1, 2, 3], (100, 150), (150, 200), (30, 40)),
+    ([0, 1, 2], (200, 300), (300, 400), (50, 70)),
+)
+
+
+def validated_load(csv_path: str) -> dict:
+    """The per-row path load_from_csv used to take: csv.reader, strptime and four validated models per day."""
+    calendar_data = {}
+    with open(csv_path, 'r', newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader)
+        for row in reader:
+            entry_date = datetime.strptime(row[0], "%Y-%m-%d").date()
+            calendar_data[entry_date] = HotelCalendar(
+                date=entry_date,
+                **{
+                    room_type: RoomTypeCalendar(
+                        available_rooms=int(row[1 + 4 * col]),
+                        base_price_1person=float(row[2 + 4 * col]),
+                        base_price_2people=float(row[3 + 4 * col]),
+                        extra_person_price=float(row[4 + 4 * col]),
+                    )
+                    for col, room_type in enumerate(ROOM_TYPES)
+                },
+            )
+    return calendar_data
+
+
+def validated_generate(days: int) -> dict:
+    """The per-day path generate_mock_data used to take: random draws and four validated models per day."""
+    calendar_data = {}
+    for day in range(days):
+        entry_date = date(2025, 4, 20) + timedelta(days=day)
+        calendar_data[entry_date] = HotelCalendar(
+            date=entry_date,
+            **{
+                room_type: RoomTypeCalendar(
+                    available_rooms=random.choice(rooms),
+                    base_price_1person=round(random.uniform(*price_1person), 2),
+                    base_price_2people=round(random.uniform(*price_2people), 2),
+                    extra_person_price=round(random.uniform(*extra_person_price), 2),
+                )
+                for room_type, (rooms, price_1person, price_2people, extra_person_price) in zip(ROOM_TYPES, MOCK_RANGES)
+            },
+        )
+    return calendar_data
+
+
+def row_by_row_write(calendar_data: dict, csv_path: str) -> None:
+    """The attribute-by-attribute path write_csv used to take."""
+    with open(csv_path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(CSV_HEADER)
+        for entry_date, entry in calendar_data.items():
+            row = [entry_date]
+            for room_type in ROOM_TYPES:
+                room = getattr(entry, room_type)
+                row += [room.available_rooms, room.base_price_1person, room.base_price_2people, room.extra_person_price]
+            writer.writerow(row)
+
+
+def best_of(fn, *args, rounds: int = 9) -> float:
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+async def test_calendar_io():
+    with tempfile.TemporaryDirectory() as tmp:
+        old_path, new_path = os.path.join(tmp, "old.csv"), os.path.join(tmp, "new.csv")
+        arrays = CalendarArrays.mock(date(2025, 4, 20), days=365 * YEARS, seed=7)
+        arrays.write_csv(new_path)
+
+        # Same file and same entries both ways
+        validated = validated_load(new_path)
+        row_by_row_write(validated, old_path)
+        with open(old_path, 'rb') as old, open(new_path, 'rb') as new:
+            assert old.read() == new.read()
+        view = HotelCalendar.load_from_csv(new_path)
+        assert isinstance(view, CalendarView) and len(view) == len(validated)
+        assert all(view[day] == entry for day, entry in validated.items())
+        assert dict(HotelCalendar.load_from_csv(new_path, validate=True)) == validated
+        assert date(2025, 4, 19) not in view and "2025-04-20" not in view
+
+        # Gaps in the calendar survive a round trip through models
+        sparse = {day: entry for day, entry in validated.items() if day.day != 13}
+        HotelCalendar.write_csv(sparse, old_path)
+        assert dict(HotelCalendar.load_from_csv(old_path)) == sparse
+
+        # Strict validation is kept for files that did not come from us
+        with open(old_path, 'a') as csvfile:
+            csvfile.write("2040-01-01,-1,1,1,1,1,1,1,1,1,1,1,1\n")
+        HotelCalendar.load_from_csv(old_path)
+        try:
+            HotelCalendar.load_from_csv(old_path, validate=True)
+        except ValueError as e:
+            assert "budget" in str(e) and "2040-01-01" in str(e)
+        else:
+            raise AssertionError("negative availability was accepted")
+
+        # The store reads and writes the same layout
+        store = HotelCalendarStore(new_path).refresh()
+        assert store.to_calendar() == view
+        day = next(day for day, entry in view.items() if entry.executive.available_rooms)
+        assert store.book(day, day, "executive") == []
+        store.save()
+        reloaded = HotelCalendarStore(new_path).refresh().to_calendar()
+        assert reloaded[day].executive.available_rooms == view[day].executive.available_rooms - 1
+        assert dict(reloaded) == dict(store.to_calendar())
+
+        timings = {
+            "generate": (best_of(validated_generate, 365 * YEARS), best_of(CalendarArrays.mock, date(2025, 4, 20), 365 * YEARS)),
+            "load": (best_of(validated_load, new_path), best_of(HotelCalendar.load_from_csv, new_path)),
+            "load, validated": (best_of(validated_load, new_path), best_of(HotelCalendar.load_from_csv, new_path, True)),
+            "load + entries": (best_of(validated_load, new_path), best_of(lambda: dict(HotelCalendar.load_from_csv(new_path).items()))),
+            "write": (best_of(row_by_row_write, validated, old_path), best_of(HotelCalendar.write_csv, view, new_path)),
+        }
+        print(f"{YEARS} years, {len(view)} days:")
+        for name, (before, after) in timings.items():
+            print(f"  {name:16} {before * 1e3:8.1f} ms -> {after * 1e3:6.1f} ms ({before / after:5.1f}x)")
+        load_before, load_after = timings["load"]
+        assert load_before / load_after >= 10, timings
+        # Building every entry anyway still makes four pydantic objects a day, so only about 2x faster
+        materialize_before, materialize_after = timings["load + entries"]
+        assert materialize_before / materialize_after >= 1.2, timings
+        write_before, write_after = timings["write"]
+        assert write_before / write_after >= 3, timings
+        round_trip = (load_before + timings["write"][0]) / (load_after + timings["write"][1])
+        print(f"  load + write: {round_trip:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_calendar_io())
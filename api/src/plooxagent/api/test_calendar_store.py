@@ -0,0 +1,71 @@
+# %%
+import asyncio
+import os
+import random
+import tempfile
+from datetime import date, timedelta
+
+from plooxagent.api.database.calendar import ROOM_TYPES, CalendarArrays, CalendarView, HotelCalendarStore
+
+STAYS = 500
+
+
+def per_day_quote(calendar_data, start: date, end: date, number_of_persons: int) -> dict:
+    """The day-by-day loop check_vacancy used to run over the calendar dict."""
+    available_room_types = {room_type: 0 for room_type in ROOM_TYPES}
+    room_type_available_all_dates = {room_type: True for room_type in ROOM_TYPES}
+    current_date = start
+    while current_date <= end:
+        day_data = calendar_data[current_date]
+        for room_type in ROOM_TYPES:
+            room_data = getattr(day_data, room_type)
+            if room_data.available_rooms <= 0:
+                room_type_available_all_dates[room_type] = False
+                continue
+            if number_of_persons == 1:
+                price = room_data.base_price_1person
+            elif number_of_persons == 2:
+                price = room_data.base_price_2people
+            else:
+                price = room_data.base_price_2people + (number_of_persons - 2) * room_data.extra_person_price
+            available_room_types[room_type] += price
+        current_date = date.fromordinal(current_date.toordinal() + 1)
+    return {
+        room_type: price
+        for room_type, price in available_room_types.items()
+        if room_type_available_all_dates[room_type]
+    }
+
+
+async def test_calendar_store():
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "calendar.csv")
+        # Mock availability has plenty of sold-out days, so stays come out both bookable and not
+        arrays = CalendarArrays.mock(date(2025, 4, 20), days=365, seed=11)
+        arrays.write_csv(csv_path)
+        calendar_data = dict(CalendarView(arrays))
+        store = HotelCalendarStore(csv_path)
+
+        outcomes = set()
+        for _ in range(STAYS):
+            start = arrays.origin + timedelta(days=rng.randrange(365))
+            end = min(start + timedelta(days=rng.randrange(14)), arrays.origin + timedelta(days=364))
+            persons = rng.randint(1, 5)
+            expected = per_day_quote(calendar_data, start, end, persons)
+            quoted = store.quote(start, end, persons)
+            assert quoted.keys() == expected.keys(), (start, end, persons)
+            # Quotes are rounded to cents
+            assert all(abs(quoted[room_type] - expected[room_type]) <= 0.005 + 1e-9 for room_type in expected)
+            outcomes.add(len(quoted))
+        # Stays with no room type, some of them and all of them were compared
+        assert {0, len(ROOM_TYPES)} <= outcomes and len(outcomes) > 2, outcomes
+
+        # Days outside the calendar are reported, not quoted as free
+        last = arrays.origin + timedelta(days=364)
+        assert store.missing_dates(last, last + timedelta(days=2)) == [last + timedelta(days=1), last + timedelta(days=2)]
+        store.journal.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_calendar_store())
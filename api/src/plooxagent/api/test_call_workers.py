@@ -0,0 +1,111 @@
+# %%
+import asyncio
+import contextlib
+import os
+import time
+
+from plooxagent.api.workers import CallWorkerPool, Overloaded
+
+
+class FakeSession:
+    """Call session that needs no Daily room: "busy" rooms hog their worker's loop, "crash" rooms kill it, "slow" rooms take 0.5 s to join."""
+
+    def __init__(self, room_uri: str):
+        self.room_uri = room_uri
+        self._done = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def run(self) -> None:
+        if self.room_uri.endswith("crash"):
+            os._exit(1)
+        if self.room_uri.endswith("slow"):
+            await asyncio.sleep(0.5)
+        if self.room_uri.endswith("busy"):
+            self._task = asyncio.create_task(self._hog())
+        await asyncio.sleep(0.01)
+
+    async def stop(self) -> None:
+        self._done.set()
+
+    async def wait(self) -> None:
+        await self._done.wait()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _hog(self) -> None:
+        while True:
+            time.sleep(0.3)
+            await asyncio.sleep(0.05)
+
+
+async def prepare_nothing(cm: contextlib.AsyncExitStack) -> None:
+    pass
+
+
+async def test_call_workers():
+    async with contextlib.AsyncExitStack() as cm:
+        pool = await CallWorkerPool.create(
+            cm,
+            workers=3,
+            max_calls_per_worker=2,
+            max_loop_lag=0.1,
+            session_factory=FakeSession,
+            prepare=prepare_nothing,
+            heartbeat=0.1,
+        )
+
+        # Least-loaded first: six calls spread two per worker
+        sessions = [await pool.start_call(f"https://fake.daily.co/room-{i}") for i in range(6)]
+        assert sorted(len(worker["calls"]) for worker in pool.calls()) == [2, 2, 2]
+        try:
+            await pool.start_call("https://fake.daily.co/one-too-many")
+            raise AssertionError("Expected the pool to be full")
+        except Overloaded as e:
+            print(f"7th call rejected: {e} (retry after {e.retry_after:.0f} s)")
+
+        # Ended calls free their slot
+        await pool.stop_call(sessions[0])
+        while sum(len(worker["calls"]) for worker in pool.calls()) > 5:
+            await asyncio.sleep(0.01)
+        await pool.start_call("https://fake.daily.co/room-6")
+
+        for session_id in [*sessions[1:], *(call["session_id"] for w in pool.calls() for call in w["calls"])]:
+            await pool.stop_call(session_id)
+        while any(worker["calls"] for worker in pool.calls()):
+            await asyncio.sleep(0.01)
+
+        # A call that starts after start_call gave up on it is stopped by its worker
+        start_timeout, pool.start_timeout = pool.start_timeout, 0.2
+        try:
+            await pool.start_call("https://fake.daily.co/room-slow")
+            raise AssertionError("Expected the start to time out")
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            pool.start_timeout = start_timeout
+        assert not any(worker["calls"] or worker["pending"] for worker in pool.calls())
+        await asyncio.sleep(0.8)
+        assert sum(worker.sessions for worker in pool.workers) == 0, pool.calls()
+
+        # A worker whose event loop lags is skipped, and once all of them lag, calls are turned away
+        busy = await pool.start_call("https://fake.daily.co/room-busy")
+        await asyncio.sleep(0.8)
+        lagging = [worker for worker in pool.workers if worker.loop_lag > pool.max_loop_lag]
+        assert len(lagging) == 1 and pool.admit() not in lagging
+        print(f"worker {lagging[0].worker_id} lags {lagging[0].loop_lag * 1e3:.0f} ms and is skipped")
+        await pool.stop_call(busy)
+
+        # A crashed worker fails its pending call and is replaced
+        pids = {worker.pid for worker in pool.workers}
+        try:
+            await pool.start_call("https://fake.daily.co/room-crash")
+            raise AssertionError("Expected the call to fail")
+        except RuntimeError as e:
+            print(f"crash reported: {e}")
+        await asyncio.wait_for(asyncio.gather(*(worker.ready for worker in pool.workers)), 30)
+        assert len({worker.pid for worker in pool.workers} - pids) == 1
+        print(f"workers after restart: {[worker['pid'] for worker in pool.calls()]}")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_call_workers())
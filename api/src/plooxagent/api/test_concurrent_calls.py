@@ -0,0 +1,166 @@
+# %%
+import asyncio
+import collections
+import dataclasses
+import threading
+import time
+
+import numpy as np
+from agents.voice.events import VoiceStreamEventAudio, VoiceStreamEventLifecycle
+
+from plooxagent.api.daily import agent as daily_agent
+from plooxagent.api.daily import DailyAgent
+
+CALLS = 40
+SECONDS = 1.0
+# What the renderer hands out, unlike the 24 kHz, 20 ms frames of the agent's ring
+RENDER_SAMPLE_RATE = 16000
+RENDER_MS = 10
+
+
+@dataclasses.dataclass
+class FakeAudioData:
+    audio_frames: bytes
+    sample_rate: int = RENDER_SAMPLE_RATE
+    num_channels: int = 1
+
+
+class FakeMicrophone:
+    def __init__(self, name: str, sample_rate: int):
+        self.name = name
+        self.sample_rate = sample_rate
+        self.received: list[np.ndarray] = []
+
+    def write_frames(self, frames: bytes) -> int:
+        samples = np.frombuffer(frames, dtype=np.int16)
+        # Paced like a blocking virtual device
+        time.sleep(len(samples) / self.sample_rate)
+        # The frame is a view of the jitter buffer, reused once this returns
+        self.received.append(samples.copy())
+        return len(samples)
+
+
+class FakeDaily:
+    """Stands in for the process-wide Daily singleton; there is no global speaker to select."""
+
+    microphones: dict[str, FakeMicrophone] = {}
+
+    @staticmethod
+    def init() -> None:
+        pass
+
+    @classmethod
+    def create_microphone_device(cls, name: str, sample_rate: int, channels: int) -> FakeMicrophone:
+        if name in cls.microphones:
+            raise RuntimeError(f"Device {name} already exists")
+        cls.microphones[name] = FakeMicrophone(name, sample_rate)
+        return cls.microphones[name]
+
+
+class FakeCallClient:
+    """A call client whose room holds one caller saying the room's number, rendered 10 ms at a time at 16 kHz."""
+
+    def __init__(self, event_handler):
+        self.event_handler = event_handler
+        self.microphone: str | None = None
+        self.room_uri: str | None = None
+        self._stop = threading.Event()
+
+    def join(self, room_uri, client_settings, completion):
+        self.room_uri = room_uri
+        self.microphone = client_settings["inputs"]["microphone"]["settings"]["deviceId"]
+
+        def joined():
+            completion(None, None)
+            self.event_handler.on_participant_joined({"id": f"caller-{room_uri}", "info": {"isLocal": False}})
+
+        threading.Thread(target=joined, daemon=True).start()
+
+    def participants(self):
+        return {"local": {"id": "local", "info": {"isLocal": True}}}
+
+    def set_audio_renderer(self, participant_id, callback, audio_source="microphone"):
+        room_number = int(self.room_uri.rsplit("-", 1)[1])
+        frame = np.full(RENDER_SAMPLE_RATE * RENDER_MS // 1000, room_number, dtype=np.int16).tobytes()
+
+        def render():
+            while not self._stop.wait(RENDER_MS / 1000):
+                callback(participant_id, FakeAudioData(frame))
+
+        threading.Thread(target=render, daemon=True).start()
+
+    def leave(self):
+        self._stop.set()
+
+    def release(self):
+        pass
+
+
+class EchoResult:
+    """Voice pipeline result that repeats every inbound frame back, one turn per 10 frames."""
+
+    def __init__(self, audio_input):
+        self.audio_input = audio_input
+
+    async def stream(self):
+        frames = 0
+        while True:
+            frame = await self.audio_input.queue.get()
+            if frames % 10 == 0:
+                yield VoiceStreamEventLifecycle(event="turn_started")
+            yield VoiceStreamEventAudio(data=frame)
+            frames += 1
+            if frames % 10 == 0:
+                yield VoiceStreamEventLifecycle(event="turn_ended")
+
+
+class EchoPipeline:
+    def __init__(self, workflow, config=None):
+        pass
+
+    async def run(self, audio_input):
+        return EchoResult(audio_input)
+
+
+async def test_concurrent_calls():
+    daily_agent.Daily = FakeDaily
+    daily_agent.CallClient = FakeCallClient
+    daily_agent.VoicePipeline = EchoPipeline
+    daily_agent.make_voice_workflow = lambda spans: None
+
+    agents = [DailyAgent(f"https://fake.daily.co/room-{i + 1}") for i in range(CALLS)]
+    await asyncio.gather(*(agent.run() for agent in agents))
+
+    lag = []
+
+    async def watch_loop():
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag.append(time.perf_counter() - started - 0.005)
+
+    watcher = asyncio.create_task(watch_loop())
+    await asyncio.sleep(SECONDS)
+    watcher.cancel()
+    await asyncio.gather(*(agent.stop() for agent in agents))
+    await asyncio.gather(*(agent._task for agent in agents))
+
+    assert len(FakeDaily.microphones) == CALLS
+    for i, agent in enumerate(agents):
+        microphone = FakeDaily.microphones[f"mic-{agent.session_id}"]
+        heard = np.concatenate(microphone.received)
+        values = collections.Counter(np.unique(heard).tolist())
+        # Each room hears only its own caller echoed back, plus end-of-turn padding
+        assert set(values) <= {0, i + 1}, (i, values)
+        assert (heard == i + 1).sum() > 0.5 * SECONDS * 24000, (i, agent.inbound_stats, agent.outbound_stats)
+        assert agent.inbound_stats.dropped_frames == 0
+
+    frames = sum(agent.inbound_stats.frames for agent in agents)
+    print(
+        f"{CALLS} calls for {SECONDS:.1f} s: {frames} inbound frames, audio kept apart, "
+        f"event loop lag p99 {sorted(lag)[int(len(lag) * 0.99)] * 1e3:.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(test_concurrent_calls())
@@ -0,0 +1,112 @@
+# %%
+import asyncio
+import time
+
+from aiohttp import web
+
+from plooxagent.api.daily.transport import CircuitOpen, DailyTransport, TransportConfig
+from plooxagent.api.daily.vendor.rest_helper import DailyRESTHelper, DailyRoomParams
+
+
+class FlakyDailyAPI:
+    """Fake Daily API that answers with a scripted list of statuses, then 200."""
+
+    def __init__(self):
+        self.script: list[tuple[int, dict]] = []
+        self.requests = 0
+        # Seconds every request takes to answer
+        self.delay = 0.0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/v1/{tail:.*}", self.handle)
+        return app
+
+    async def handle(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.delay)
+        if self.script:
+            status, headers = self.script.pop(0)
+            return web.json_response({"error": "scripted"}, status=status, headers=headers)
+        return web.json_response({"deleted": True, "token": "token"})
+
+
+async def test_daily_transport():
+    fake = FlakyDailyAPI()
+    runner = web.AppRunner(fake.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    api_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/v1"
+
+    config = TransportConfig(
+        backoff_base=0.01, backoff_max=0.05, failure_threshold=3, reset_timeout=0.3, timeouts={"POST /rooms": 0.2}
+    )
+    async with DailyTransport(config) as transport:
+        helper = DailyRESTHelper(daily_api_key="fake", daily_api_url=api_url, aiohttp_session=transport)
+
+        # Transient 5xx and 429 are retried, and Retry-After is honored
+        fake.script = [(503, {}), (502, {}), (429, {"Retry-After": "0.3"})]
+        started = time.perf_counter()
+        assert await helper.delete_room_by_name("room-1")
+        assert fake.requests == 4 and time.perf_counter() - started >= 0.3
+
+        # A room that may have been created is not created again
+        fake.requests, fake.script = 0, [(500, {})]
+        try:
+            await helper.create_room(DailyRoomParams())
+            raise AssertionError("Expected the room creation to fail")
+        except Exception as e:
+            assert "status: 500" in str(e)
+        assert fake.requests == 1
+
+        # Once the API keeps failing, requests fail fast until a probe succeeds;
+        # the 500 above was the first of three failures in a row
+        fake.requests, fake.script = 0, [(503, {})] * 2
+        try:
+            await helper.get_token(f"{api_url}/room-1")
+            raise AssertionError("Expected the circuit to open")
+        except CircuitOpen as e:
+            print(f"fails fast: {e}")
+        assert fake.requests == 2 and transport.breaker.state == "open"
+        try:
+            await helper.get_token(f"{api_url}/room-1")
+            raise AssertionError("Expected the circuit to be open")
+        except CircuitOpen:
+            pass
+        assert fake.requests == 2
+        await asyncio.sleep(0.35)
+        assert transport.breaker.state == "half-open"
+        assert await helper.get_token(f"{api_url}/room-1") == "token"
+        assert transport.breaker.state == "closed"
+
+        # Nor is a room whose creation timed out, since the API may still have created it
+        fake.requests, fake.delay = 0, 0.5
+        try:
+            await helper.create_room(DailyRoomParams())
+            raise AssertionError("Expected the room creation to time out")
+        except asyncio.TimeoutError:
+            pass
+        assert fake.requests == 1
+        fake.delay = 0.0
+
+        stats = transport.stats()
+        assert set(stats["endpoints"]) == {"DELETE /rooms/{name}", "POST /rooms", "POST /meeting-tokens"}
+        for endpoint, endpoint_stats in stats["endpoints"].items():
+            print(f"{endpoint}: {endpoint_stats['requests']} requests, {endpoint_stats['retries']} retries, "
+                  f"statuses {endpoint_stats['statuses']}, p50 {endpoint_stats['latency']['p50'] * 1e3:.0f} ms")
+
+    # Nothing listens: connection errors are retried, then raised
+    await runner.cleanup()
+    async with DailyTransport(TransportConfig(backoff_base=0.01, retries=2)) as transport:
+        try:
+            async with transport.get(f"{api_url}/rooms/room-1"):
+                pass
+            raise AssertionError("Expected a connection error")
+        except Exception as e:
+            assert not isinstance(e, CircuitOpen)
+        assert transport.endpoints["GET /rooms/{name}"].requests == 3
+
+
+if __name__ == "__main__":
+    asyncio.run(test_daily_transport())
@@ -0,0 +1,90 @@
+# %%
+import asyncio
+import gc
+import json
+import os
+import tempfile
+
+from plooxagent.api import custom_tools, hotels
+from plooxagent.api.benchmarks import invoke, mock_calendar
+from plooxagent.api.database.shards import CalendarShards
+from plooxagent.api.sessions import SessionManager
+
+
+class HotelAgent:
+    """Session that books a room from a task of its own, as a call's pipeline would."""
+
+    def __init__(self, room_uri):
+        self.room_uri = room_uri
+        self.answer = None
+        self._task = None
+        self._stopped = asyncio.Event()
+
+    async def run(self):
+        self._task = asyncio.create_task(self._book())
+
+    async def _book(self):
+        self.answer = await invoke(custom_tools.book_a_room, start_date="2025-05-01", end_date="2025-05-02", room_type="budget")
+
+    async def stop(self):
+        self._stopped.set()
+
+    async def wait(self):
+        await self._task
+        await self._stopped.wait()
+
+
+async def test_hotel_shards():
+    hotels_dir, get_calendar_shards = hotels.HOTELS_DIR, custom_tools.get_calendar_shards
+    with tempfile.TemporaryDirectory() as tmp:
+        hotels.HOTELS_DIR = tmp
+        for hotel in ("alpha", "beta", "gamma"):
+            os.makedirs(os.path.join(tmp, hotel))
+            mock_calendar(custom_tools.hotel_calendar_path(hotel), 1, rooms=5)
+        with open(os.path.join(tmp, "alpha", "hotel.json"), "w") as hotel_file:
+            json.dump({"name": "Alpha Palace"}, hotel_file)
+        shards = CalendarShards(custom_tools.open_calendar_store, max_resident=2)
+        custom_tools.get_calendar_shards = lambda: shards
+        try:
+            # Every call books in the calendar of its own hotel
+            sessions = SessionManager(session_factory=HotelAgent)
+            started = [await sessions.start(f"room-{hotel}", hotel_id=hotel) for hotel in ("alpha", "alpha", "beta")]
+            await asyncio.gather(*(session.agent._task for session in started))
+            assert all(session.agent.answer.startswith("Successfully booked") for session in started)
+            assert [session["hotel_id"] for session in sessions.report()["sessions"]] == ["alpha", "alpha", "beta"]
+            await sessions.close()
+            rooms = {hotel: shards.get(custom_tools.hotel_calendar_path(hotel)).available_rooms[11, 0] for hotel in ("alpha", "beta", "gamma")}
+            assert rooms == {"alpha": 3, "beta": 4, "gamma": 5}, rooms
+            assert hotels.hotel_name("alpha") == "Alpha Palace" and hotels.hotel_name("beta") == "beta"
+
+            # Only max_resident calendars stay loaded; an evicted one still in use is handed back, not opened twice
+            assert len(shards) == 2 and shards.stats.evicted == 1, shards.report()
+            held = shards.get(custom_tools.hotel_calendar_path("beta"))
+            shards.get(custom_tools.hotel_calendar_path("alpha"))
+            shards.get(custom_tools.hotel_calendar_path("gamma"))
+            assert shards.get(custom_tools.hotel_calendar_path("beta")) is held and shards.stats.revived == 1
+            del held
+            gc.collect()
+            loads = shards.stats.loads
+            for hotel in ("alpha", "gamma", "beta"):
+                shards.get(custom_tools.hotel_calendar_path(hotel))
+            assert shards.stats.loads > loads and len(shards) == 2
+
+            # A hotel without a calendar gets an answer, and no ID escapes the hotels directory
+            with hotels.serving("nowhere"):
+                answer = await invoke(custom_tools.check_vacancy, start_date="2025-05-01", end_date="2025-05-02", number_of_persons=2)
+            assert answer == custom_tools.NO_CALENDAR and len(shards) == 2, answer
+            try:
+                hotels.check_hotel_id("../alpha")
+            except ValueError as e:
+                print(f"Rejected: {e}")
+            else:
+                raise AssertionError("a hotel ID outside the hotels directory was accepted")
+            print(shards.report())
+        finally:
+            hotels.HOTELS_DIR = hotels_dir
+            custom_tools.get_calendar_shards = get_calendar_shards
+
+
+if __name__ == "__main__":
+    asyncio.run(test_hotel_shards())
@@ -0,0 +1,55 @@
+# %%
+import os
+import subprocess
+import sys
+
+MODULE = "plooxagent.api.server"
+
+# Cumulative import time allowed for MODULE, in milliseconds: about twice the ~1.4 s it takes
+BUDGET_MS = int(os.environ.get("IMPORT_TIME_BUDGET_MS", "3000"))
+
+
+def measure_import_time(module: str = MODULE) -> tuple[int, list[tuple[int, int, str]]]:
+    """
+    Import ``module`` in a fresh interpreter under ``-X importtime``.
+
+    The API keys are removed from the environment, so the import fails if any
+    module still talks to OpenAI or Daily while being imported.
+
+    Returns:
+        tuple: Cumulative import time of ``module`` in microseconds, and
+            (self_us, cumulative_us, name) of every module imported on the way
+    """
+    env = {k: v for k, v in os.environ.items() if k not in ("OPENAI_API_KEY", "DAILY_API_KEY")}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise AssertionError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    timings = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings.append((int(self_us), int(cumulative_us), name.strip()))
+    total = next(cumulative for _, cumulative, name in timings if name == module)
+    return total, timings
+
+
+def test_server_import_time():
+    total, timings = measure_import_time()
+    slowest = sorted(timings, key=lambda timing: timing[0], reverse=True)[:10]
+    report = "\n".join(f"{self_us / 1e3:9.1f} ms  {name}" for self_us, _, name in slowest)
+    assert total / 1e3 <= BUDGET_MS, (
+        f"Importing {MODULE} took {total / 1e3:.0f} ms, over the {BUDGET_MS} ms budget. "
+        f"Slowest modules:\n{report}"
+    )
+    print(f"Importing {MODULE} took {total / 1e3:.0f} ms (budget {BUDGET_MS} ms)")
+
+
+if __name__ == "__main__":
+    test_server_import_time()
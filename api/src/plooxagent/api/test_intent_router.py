@@ -0,0 +1,132 @@
+# %%
+import asyncio
+import collections
+import time
+import types
+
+from agents import Agent
+
+from plooxagent.api import agentic_components
+from plooxagent.api import router as intent_router
+from plooxagent.api.router import TRIAGE, IntentRouter, RoutedVoiceWorkflow, read_utterances
+
+# Utterances collected after the rules were written and never used to tune them or to train (run from api/)
+HELD_OUT_PATH = "data/intent_utterances_heldout.jsonl"
+# Floors just under what the rules do on them at threshold 0.8: precision 0.95, coverage 0.56
+HELD_OUT_PRECISION = 0.9
+HELD_OUT_COVERAGE = 0.5
+
+
+def evaluate(threshold: float = 0.8) -> dict:
+    """Leave-one-out routing quality over the labeled utterances the rules were written against."""
+    utterances = read_utterances()
+    return score(
+        [(IntentRouter(utterances[:i] + utterances[i + 1:], threshold=threshold), text, intent)
+         for i, (text, intent) in enumerate(utterances)]
+    )
+
+
+def evaluate_held_out(threshold: float = 0.8) -> dict:
+    """Routing quality on the held-out utterances, with the classifier trained on all the others."""
+    router = IntentRouter(read_utterances(), threshold=threshold)
+    return score([(router, text, intent) for text, intent in read_utterances(HELD_OUT_PATH)])
+
+
+def score(cases) -> dict:
+    outcomes = collections.Counter()
+    decision_time = 0.0
+    for router, text, intent in cases:
+        started = time.perf_counter()
+        decision = router.route(text)
+        decision_time += time.perf_counter() - started
+        if decision.intent is None:
+            outcomes["fallback" if intent != TRIAGE else "kept_for_triage"] += 1
+        elif decision.intent == intent:
+            outcomes["correct"] += 1
+        else:
+            outcomes["wrong"] += 1
+            print(f"  misrouted to {decision.intent}: {text!r} ({intent})")
+    routable = sum(intent != TRIAGE for _, _, intent in cases)
+    routed = outcomes["correct"] + outcomes["wrong"]
+    return {
+        "utterances": len(cases),
+        "coverage": outcomes["correct"] / routable,
+        "precision": outcomes["correct"] / routed if routed else 1.0,
+        # Turns that end up with the right agent, routed or left to triage
+        "accuracy": (outcomes["correct"] + outcomes["kept_for_triage"]) / len(cases),
+        "outcomes": dict(outcomes),
+        "decision_us": decision_time / len(cases) * 1e6,
+    }
+
+
+class FakeRunResult:
+    """Streams like a run in which triage hands off after `hop` seconds, then the agent answers."""
+
+    def __init__(self, agent, handoff_to, hop):
+        self.agent, self.handoff_to, self.hop = agent, handoff_to, hop
+        self.last_agent = handoff_to or agent
+
+    async def stream_events(self):
+        if self.handoff_to is not None:
+            await asyncio.sleep(self.hop)
+            yield types.SimpleNamespace(type="agent_updated_stream_event", new_agent=self.handoff_to)
+        yield types.SimpleNamespace(type="raw_response_event", data=types.SimpleNamespace(type="response.output_text.delta", delta="Certainly."))
+
+    def to_input_list(self):
+        return []
+
+
+async def test_intent_router():
+    for threshold in (0.7, 0.8, 0.9):
+        metrics = evaluate(threshold)
+        print(f"threshold {threshold}: {metrics}")
+    metrics = evaluate(0.8)
+    assert metrics["precision"] >= 0.95 and metrics["coverage"] >= 0.7, metrics
+    assert metrics["decision_us"] < 1000
+
+    # The numbers above flatter the rules, which were written against those utterances
+    held_out = evaluate_held_out(0.8)
+    print(f"held out: {held_out}")
+    assert held_out["utterances"] >= 40
+    assert held_out["precision"] >= HELD_OUT_PRECISION and held_out["coverage"] >= HELD_OUT_COVERAGE, held_out
+
+    # Routed turns skip the triage turn; fallbacks measure what that turn costs
+    triage, vacancy = Agent(name="Assistant"), Agent(name="VacancyCheckingAgent")
+    runner = intent_router.Runner
+    started = []
+
+    def run_streamed(agent, history):
+        started.append(agent.name)
+        return FakeRunResult(agent, vacancy if agent is triage else None, 0.05)
+
+    intent_router.Runner = types.SimpleNamespace(run_streamed=run_streamed)
+    try:
+        router = IntentRouter(threshold=0.8)
+        workflow = RoutedVoiceWorkflow(triage, {"vacancy": vacancy}, router)
+        for text in ("Can you hear me?", "Do you have a room from the 26th to the 28th?", "Any rooms left for tonight?"):
+            assert [chunk async for chunk in workflow.run(text)] == ["Certainly."]
+        # A follow-up the router does not claim stays with the agent that answered last
+        assert [chunk async for chunk in workflow.run("Yes, the executive one")] == ["Certainly."]
+    finally:
+        intent_router.Runner = runner
+    assert started == ["Assistant", "VacancyCheckingAgent", "VacancyCheckingAgent", "VacancyCheckingAgent"], started
+    stats = router.snapshot()
+    assert stats["fallbacks"] == 2 and stats["routed"] == {"vacancy": 2}
+    assert stats["latency_saved_s"] >= 0.1, stats
+    print(f"router: {stats['routed']} routed, {stats['fallbacks']} fallback, ~{stats['latency_saved_s']:.2f} s saved")
+
+    # Agents the router sends turns to skip triage, so they carry its guardrails themselves
+    knowledge_tool = agentic_components.knowledge_tool
+    agentic_components.knowledge_tool = lambda name, description: None
+    try:
+        agents = agentic_components.get_agents()
+    finally:
+        agentic_components.knowledge_tool = knowledge_tool
+        agentic_components.get_agents.cache_clear()
+    for name in agentic_components.INTENT_AGENTS.values():
+        instructions = agents[name].instructions(None, agents[name])
+        assert agentic_components.GUARDRAILS in instructions and agentic_components.HOTEL_NAME in instructions, name
+
+
+if __name__ == "__main__":
+    asyncio.run(test_intent_router())
@@ -0,0 +1,63 @@
+# %%
+import asyncio
+import os
+import tempfile
+import time
+
+from plooxagent.api import agentic_components
+from plooxagent.api.knowledge import KnowledgeIndex, knowledge_search_tool, load_or_build_index
+
+QUERIES = {
+    "Which room has a Nespresso machine and a minibar?": "Executive Room",
+    "Is there a soaking tub in the superior room?": "Superior Room",
+    "cheap room with a work desk for a short business trip": "Economy Room",
+}
+
+
+async def test_knowledge_base():
+    # Run from api/, where knowledge_base/ is
+    with tempfile.TemporaryDirectory() as index_dir:
+        started = time.perf_counter()
+        index = await load_or_build_index("room_description", ["knowledge_base/room_descriptions.pdf"], index_dir=index_dir)
+        built = time.perf_counter() - started
+        assert os.listdir(index_dir)
+
+        started = time.perf_counter()
+        cached = await load_or_build_index("room_description", ["knowledge_base/room_descriptions.pdf"], index_dir=index_dir)
+        loaded = time.perf_counter() - started
+        assert cached.chunks == index.chunks and (cached.weights == index.weights).all()
+        print(f"{len(index.chunks)} chunks, {len(index.vocabulary)} terms: built in {built * 1e3:.0f} ms, loaded in {loaded * 1e3:.1f} ms")
+
+        for query, expected in QUERIES.items():
+            (_, best), *_ = index.search(query)
+            assert expected in best, (query, best)
+        assert index.search("xylophone") == []
+
+        rounds = 1000
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for query in QUERIES:
+                index.search(query)
+        per_lookup = (time.perf_counter() - started) / (rounds * len(QUERIES))
+        assert per_lookup < 1e-3, per_lookup
+        print(f"lookup: {per_lookup * 1e6:.0f} µs")
+
+        tool = knowledge_search_tool("room_description", index, "Search the room descriptions.")
+        assert tool.name == "search_room_description" and "query" in tool.params_json_schema["properties"]
+
+    # A knowledge base that yielded no text finds nothing
+    assert KnowledgeIndex.build([]).search("room") == []
+
+    # Inside a running loop, an index setup_agents() has not loaded is an error, not a nested asyncio.run
+    os.environ["KB_RETRIEVAL"] = "local"
+    try:
+        agentic_components.get_kb_index("room_description")
+        raise AssertionError("Expected get_kb_index to refuse to block the loop")
+    except RuntimeError as e:
+        assert "setup_agents()" in str(e), e
+    finally:
+        os.environ.pop("KB_RETRIEVAL")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_knowledge_base())
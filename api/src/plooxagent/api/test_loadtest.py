@@ -0,0 +1,28 @@
+# %%
+import asyncio
+
+from plooxagent.api import loadtest
+from plooxagent.api.daily import agent as daily_agent
+
+
+async def test_loadtest():
+    profile = loadtest.Profile(speech_s=0.6, pause_s=0.8, end_of_speech_s=0.2, stt_s=0.05, llm_s=0.1, tts_s=0.05, reply_s=0.3)
+    voice_pipeline = daily_agent.VoicePipeline
+    summary = loadtest.summarize([await loadtest.run_calls(6, 3.0, profile)])
+    assert daily_agent.VoicePipeline is voice_pipeline, "the fakes must be taken out again"
+    assert summary["sustained"] == 6 and summary["failed"] == 0, summary
+    assert summary["turns"] >= 6, summary
+    assert summary["inbound_dropped"] == 0 and summary["outbound_underruns"] == 0, summary
+    assert 0 < summary["response_mean_s"] < 2.0, summary
+    assert loadtest.held_up(summary), summary
+    print(summary)
+
+    # Across processes the counters add up
+    summary = await asyncio.to_thread(loadtest.simulate, 4, 3.0, 2, profile)
+    assert summary["processes"] == 2 and summary["calls"] == summary["sustained"] == 4, summary
+    assert summary["turns"] >= 4, summary
+    print(summary)
+
+
+if __name__ == "__main__":
+    asyncio.run(test_loadtest())
@@ -0,0 +1,152 @@
+# %%
+import asyncio
+import fcntl
+import os
+import tempfile
+import threading
+import time
+from datetime import date
+
+import numpy as np
+
+from plooxagent.api.database.calendar import CalendarArrays, HotelCalendar, HotelCalendarStore
+from plooxagent.api.database.journal import JournalError
+from plooxagent.api.database.mapped import (
+    MappedCalendar, MappedCalendarStore, binary_twin, export_csv, import_csv, write_calendar,
+)
+from plooxagent.api.database.quotes import quote_stays
+
+YEARS = 10
+
+
+def best_of(fn, *args, repeat=5):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+async def test_mapped_calendar():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "calendar.csv")
+        arrays = CalendarArrays.mock(date(2025, 4, 20), days=365 * YEARS, seed=7)
+        # A gap in the data survives the round trip
+        arrays.known[10] = False
+        arrays.write_csv(csv_path)
+
+        # CSV -> binary -> CSV gives back the same file
+        path = os.path.join(tmp, "calendar.cal")
+        import_csv(csv_path, path)
+        export_csv(path, os.path.join(tmp, "export.csv"))
+        with open(csv_path, "rb") as original, open(os.path.join(tmp, "export.csv"), "rb") as exported:
+            assert original.read() == exported.read()
+
+        # Reads are views of the mapping
+        store = MappedCalendarStore(path).refresh()
+        # ... mapped once, not again on the next refresh
+        assert store.refresh().version == 1
+        assert not store.available_rooms.flags.owndata and np.shares_memory(store.available_rooms, store._calendar.records)
+        csv_store = HotelCalendarStore(csv_path).refresh()
+        assert store.origin == csv_store.origin and store.index_of(date(2025, 4, 30)) is None
+        stays = [(date(2025, 6, 1), date(2025, 6, 4), 2), (date(2026, 1, 1), date(2026, 1, 2), 3)]
+        assert quote_stays(store, stays) == quote_stays(csv_store, stays)
+        assert dict(store.to_calendar()) == dict(HotelCalendar.load_from_csv(csv_path))
+
+        # A booking decrements the file in place, and a second store on the file sees it
+        idx = 11 + np.flatnonzero(arrays.available_rooms[11:, 2] >= 2)[0].item()
+        day = arrays.date_at(idx)
+        other = MappedCalendarStore(path).refresh()
+        before = quote_stays(other, [(day, day, 1)])
+        assert store.book(day, day, "executive") == []
+        assert MappedCalendar(path, writable=False).records["available_rooms"][idx, 2] == arrays.available_rooms[idx, 2] - 1
+        assert other.refresh().available_rooms[idx, 2] == arrays.available_rooms[idx, 2] - 1
+        assert quote_stays(other, [(day, day, 1)]) == before
+        # Nothing is taken unless every night has a room
+        full = 13 + np.flatnonzero(arrays.available_rooms[13:, 2] == 0)[0].item()
+        snapshot = store.arrays()
+        assert arrays.date_at(full) in store.book(arrays.date_at(full - 2), arrays.date_at(full), "executive")
+        assert (store.arrays().available_rooms == snapshot.available_rooms).all()
+
+        # A reversed stay books nothing, even when it spans pages
+        generation = store._calendar.generation
+        assert store.book(arrays.date_at(idx + 200), arrays.date_at(idx), "executive") == []
+        assert (store.arrays().available_rooms == snapshot.available_rooms).all() and store._calendar.generation == generation
+
+        # A booking that cannot be flushed is taken back, rooms and generation alike
+        flush = store._calendar.flush
+        for error, raised in ((OSError("disk full"), JournalError), (RuntimeError("interrupted"), RuntimeError)):
+            def failing_flush(lo, hi, error=error):
+                raise error
+
+            store._calendar.flush = failing_flush
+            try:
+                store.book(day, day, "executive")
+            except raised:
+                pass
+            else:
+                raise AssertionError(f"{error!r} was swallowed")
+            assert (store.arrays().available_rooms == snapshot.available_rooms).all() and store._calendar.generation == generation
+        store._calendar.flush = flush
+
+        # The header must describe this calendar
+        with open(path, "r+b") as calendar_file:
+            calendar_file.seek(0)
+            calendar_file.write(b"NOTACAL!")
+        try:
+            MappedCalendar(path)
+        except ValueError as e:
+            print(f"Rejected: {e}")
+        else:
+            raise AssertionError("a file without the magic was mapped")
+
+        # Empty calendars too
+        write_calendar(CalendarArrays.empty(), path)
+        assert MappedCalendarStore(path).refresh().origin is None
+
+        write_calendar(arrays, path)
+        timings = {
+            "load": (best_of(lambda: HotelCalendarStore(csv_path).refresh()), best_of(lambda: MappedCalendarStore(path).refresh())),
+        }
+        csv_store, store = HotelCalendarStore(csv_path).refresh(), MappedCalendarStore(path).refresh()
+        timings["book"] = (
+            best_of(csv_store.book, date(2025, 5, 1), date(2025, 5, 3), "budget", repeat=20),
+            best_of(store.book, date(2025, 5, 1), date(2025, 5, 3), "budget", repeat=20),
+        )
+        csv_store.journal.close()
+
+        # The binary twin of a CSV keeps its bookings until the CSV is edited, then is imported again
+        twin_csv = os.path.join(tmp, "twin.csv")
+        small = CalendarArrays.mock(date(2025, 4, 20), days=30, seed=8)
+        small.write_csv(twin_csv)
+        twin = MappedCalendarStore(binary_twin(twin_csv)).refresh()
+        free = int(np.flatnonzero(small.available_rooms[:, 0] > 0)[0])
+        assert twin.book(small.date_at(free), small.date_at(free), "budget") == []
+        assert MappedCalendarStore(binary_twin(twin_csv)).refresh().available_rooms[free, 0] == small.available_rooms[free, 0] - 1
+        small.available_rooms[free, 0] += 5
+        small.write_csv(twin_csv)
+        os.utime(twin_csv, ns=(time.time_ns() + 10**9, time.time_ns() + 10**9))
+        assert MappedCalendarStore(binary_twin(twin_csv)).refresh().available_rooms[free, 0] == small.available_rooms[free, 0]
+        assert twin.refresh().available_rooms[free, 0] == small.available_rooms[free, 0]
+
+        # A twin found stale while another process imports it is not imported again once that one is done
+        os.utime(twin_csv, ns=(time.time_ns() - 10**9, time.time_ns() - 10**9))
+        os.utime(twin.path, ns=(0, 0))
+        with open(twin.path + ".lock", "ab") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            waiting = threading.Thread(target=binary_twin, args=(twin_csv,))
+            waiting.start()
+            time.sleep(0.2)
+            import_csv(twin_csv, twin.path)
+            assert twin.refresh().book(small.date_at(free), small.date_at(free), "budget") == []
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        waiting.join()
+        assert twin.refresh().available_rooms[free, 0] == small.available_rooms[free, 0] - 1
+    for name, (csv_time, mapped_time) in timings.items():
+        print(f"{name}: csv {csv_time * 1e3:.3f} ms, mapped {mapped_time * 1e3:.3f} ms ({csv_time / mapped_time:.0f}x)")
+    assert timings["load"][1] < timings["load"][0]
+
+
+if __name__ == "__main__":
+    asyncio.run(test_mapped_calendar())
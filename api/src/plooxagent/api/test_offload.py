@@ -0,0 +1,91 @@
+# %%
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from plooxagent.api import custom_tools
+from plooxagent.api.benchmarks import invoke, mock_calendar
+from plooxagent.api.metrics import Histogram
+from plooxagent.api.voice_metrics import SLOW_CALLBACKS, TOOL_TIMEOUTS
+from plooxagent.api.workers import LoopLagMonitor
+
+
+class Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def stall_the_loop():
+    time.sleep(0.3)
+
+
+async def test_offload():
+    get_calendar_store = custom_tools.get_calendar_store
+    calendar_path = custom_tools.CALENDAR_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        custom_tools.CALENDAR_PATH = os.path.join(tmp, "calendar.csv")
+        mock_calendar(custom_tools.CALENDAR_PATH, 1, rooms=10)
+
+        def slow_disk(csv_path):
+            time.sleep(0.3)
+            return get_calendar_store(csv_path)
+
+        custom_tools.get_calendar_store = slow_disk
+        try:
+            # A slow disk holds up the tools, not the loop
+            monitor = LoopLagMonitor(interval=0.01, window=1000)
+            monitor.start()
+            vacancy, booking = await asyncio.gather(
+                invoke(custom_tools.check_vacancy, start_date="2025-05-01", end_date="2025-05-03", number_of_persons=2),
+                invoke(custom_tools.book_a_room, start_date="2025-05-01", end_date="2025-05-03", room_type="budget"),
+            )
+            await monitor.stop()
+            assert vacancy[0] == 1 and "budget" in vacancy[1], vacancy
+            assert booking.startswith("Successfully booked"), booking
+            assert monitor.lag < 0.1, monitor.samples
+
+            # A reversed stay is turned away before any calendar backend sees it
+            reversed_stay = dict(start_date="2025-05-03", end_date="2025-05-01")
+            assert await invoke(custom_tools.check_vacancy, **reversed_stay, number_of_persons=2) == custom_tools.REVERSED_DATES
+            assert await invoke(custom_tools.book_a_room, **reversed_stay, room_type="budget") == custom_tools.REVERSED_DATES
+            batch = await invoke(custom_tools.check_vacancy_batch, stays=[{**reversed_stay, "number_of_persons": 2}])
+            assert batch == [custom_tools.REVERSED_DATES], batch
+
+            # Past its timeout a tool gives up, without starting work still queued
+            timeouts = TOOL_TIMEOUTS.children.get(("check_vacancy",), 0)
+            os.environ["TOOL_TIMEOUT_CHECK_VACANCY"] = "0.05"
+            started = time.monotonic()
+            answer = await invoke(custom_tools.check_vacancy, start_date="2025-05-01", end_date="2025-05-03", number_of_persons=2)
+            assert answer == custom_tools.CALENDAR_BUSY and time.monotonic() - started < 0.2, answer
+            assert TOOL_TIMEOUTS.children[("check_vacancy",)] == timeouts + 1
+        finally:
+            os.environ.pop("TOOL_TIMEOUT_CHECK_VACANCY", None)
+            custom_tools.get_calendar_store = get_calendar_store
+            custom_tools.CALENDAR_PATH = calendar_path
+            await asyncio.sleep(0.3)
+
+    # A callback that blocks the loop is logged with its stack, and every sample lands in the histogram
+    records = Records()
+    logging.getLogger("plooxagent.api.workers").addHandler(records)
+    histogram = Histogram()
+    slow_callbacks = SLOW_CALLBACKS.children.get((), 0)
+    monitor = LoopLagMonitor(interval=0.01, slow_after=0.05, histogram=histogram)
+    monitor.start()
+    await asyncio.sleep(0.05)
+    asyncio.get_running_loop().call_soon(stall_the_loop)
+    await asyncio.sleep(0.1)
+    await monitor.stop()
+    assert monitor.slow_callbacks == 1 and SLOW_CALLBACKS.children[()] == slow_callbacks + 1, records.messages
+    assert "in stall_the_loop" in records.messages[0], records.messages
+    assert histogram.count == len(monitor.samples) and histogram.quantile(1.0) >= 0.25
+    print(records.messages[0].splitlines()[0])
+
+
+if __name__ == "__main__":
+    asyncio.run(test_offload())
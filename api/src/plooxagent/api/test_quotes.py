@@ -0,0 +1,177 @@
+# %%
+import asyncio
+import os
+import random
+import tempfile
+from datetime import date, timedelta
+
+from plooxagent.api import custom_tools
+from plooxagent.api.benchmarks import invoke
+from plooxagent.api.database.calendar import ROOM_TYPES, CalendarArrays, HotelCalendarStore
+from plooxagent.api.database.quotes import find_stays, quote_stays, quote_table
+
+DAYS = 400
+STAYS = 2000
+
+
+def brute_force_quote(arrays: CalendarArrays, start: date, end: date, persons: int) -> dict | None:
+    """Every night of the stay read one by one from the arrays."""
+    nightly = {room_type: [] for room_type in ROOM_TYPES}
+    for ordinal in range(start.toordinal(), end.toordinal() + 1):
+        idx = arrays.index_of(date.fromordinal(ordinal))
+        if idx is None:
+            return None
+        for col, room_type in enumerate(ROOM_TYPES):
+            if arrays.available_rooms[idx, col] <= 0:
+                nightly[room_type] = None
+            elif nightly[room_type] is not None:
+                price_2people = float(arrays.base_price_2people[idx, col])
+                nightly[room_type].append(
+                    float(arrays.base_price_1person[idx, col]) if persons == 1
+                    else price_2people if persons == 2
+                    else price_2people + (persons - 2) * float(arrays.extra_person_price[idx, col])
+                )
+    return {room_type: round(sum(prices), 2) for room_type, prices in nightly.items() if prices is not None}
+
+
+def random_stays(rng: random.Random, origin: date, count: int) -> list[tuple[date, date, int]]:
+    stays = []
+    for _ in range(count):
+        # Some stays start before the calendar or run past its end
+        start = origin + timedelta(days=rng.randrange(-5, DAYS + 5))
+        nights = 1 if rng.random() < 0.2 else rng.randint(1, 60)
+        stays.append((start, start + timedelta(days=nights - 1), rng.randint(1, 5)))
+    return stays
+
+
+def check(store: HotelCalendarStore, stays) -> None:
+    arrays = store.arrays()
+    for stay, quoted in zip(stays, quote_stays(store, stays)):
+        expected = brute_force_quote(arrays, *stay)
+        if expected is None:
+            assert quoted is None, stay
+            continue
+        assert quoted is not None and quoted.keys() == expected.keys(), (stay, quoted, expected)
+        assert all(abs(quoted[room_type] - expected[room_type]) < 0.011 for room_type in expected), (stay, quoted, expected)
+
+
+async def test_quotes():
+    rng = random.Random(4)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "calendar.csv")
+        arrays = CalendarArrays.mock(date(2025, 4, 20), days=DAYS, seed=4)
+        # Gaps in the data make the stays over them unquotable
+        arrays.known[[37, 38, 250]] = False
+        arrays.write_csv(csv_path)
+        store = HotelCalendarStore(csv_path)
+
+        # The prefix sums and the sparse table answer like the nights read one by one
+        check(store, random_stays(rng, arrays.origin, STAYS))
+
+        # A booking moves the store's version, and the next batch is quoted from a rebuilt table
+        table = quote_table(store)
+        day = next(
+            arrays.origin + timedelta(days=idx) for idx in range(DAYS)
+            if arrays.known[idx] and arrays.available_rooms[idx, 0] == 1
+        )
+        assert store.book(day, day, ROOM_TYPES[0]) == []
+        assert quote_table(store) is not table
+        assert ROOM_TYPES[0] not in quote_stays(store, [(day, day, 2)])[0]
+        check(store, random_stays(rng, arrays.origin, STAYS // 4))
+
+        # Batched and single quotes agree to the cent, and a reversed stay has no room
+        stays = random_stays(rng, arrays.origin, 200)
+        for stay, quoted in zip(stays, quote_stays(store, stays)):
+            if quoted is not None:
+                assert quoted == store.quote(*stay), stay
+        reversed_stay = (arrays.origin + timedelta(days=5), arrays.origin + timedelta(days=1), 2)
+        assert quote_stays(store, [reversed_stay]) == [store.quote(*reversed_stay)] == [{}]
+        store.journal.close()
+
+
+def brute_force_stays(arrays, nights, earliest, latest, persons, room_types, max_total_price, order_by, limit):
+    """Every window quoted one by one and sorted in Python."""
+    stays = []
+    for ordinal in range(earliest.toordinal(), latest.toordinal() - nights + 2):
+        start = date.fromordinal(ordinal)
+        quoted = brute_force_quote(arrays, start, start + timedelta(days=nights - 1), persons) or {}
+        for col, room_type in enumerate(ROOM_TYPES):
+            price = quoted.get(room_type)
+            if room_type in room_types and price is not None and (max_total_price is None or price <= max_total_price):
+                stays.append((start, col, price))
+    if order_by == "earliest":
+        stays.sort(key=lambda stay: (stay[0], stay[2], stay[1]))
+    else:
+        stays.sort(key=lambda stay: (stay[2], stay[0], stay[1]))
+    return stays[:max(limit, 0)]
+
+
+async def test_find_stays():
+    rng = random.Random(5)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "calendar.csv")
+        arrays = CalendarArrays.mock(date(2025, 4, 20), days=DAYS, seed=5)
+        arrays.known[100] = False
+        arrays.write_csv(csv_path)
+        store = HotelCalendarStore(csv_path)
+
+        # Ranking, filters and limits match sorting every window by hand
+        for _ in range(200):
+            earliest = arrays.origin + timedelta(days=rng.randrange(-3, DAYS))
+            search = dict(
+                nights=rng.randint(1, 10),
+                earliest=earliest,
+                latest=earliest + timedelta(days=rng.randrange(60)),
+                persons=rng.randint(1, 4),
+                room_types=rng.choice([ROOM_TYPES, ROOM_TYPES[:1], ROOM_TYPES[1:]]),
+                max_total_price=rng.choice([None, 300.0, 1500.0]),
+                order_by=rng.choice(["cheapest", "earliest"]),
+                limit=rng.choice([0, 1, 5, 50]),
+            )
+            expected = brute_force_stays(arrays, **search)
+            search["number_of_persons"] = search.pop("persons")
+            found = find_stays(store, **search)
+            assert len(found) == len(expected), (search, found, expected)
+            for stay, (start, col, price) in zip(found, expected):
+                assert stay["start"] == start and stay["room_type"] == ROOM_TYPES[col], (search, found, expected)
+                assert stay["end"] == start + timedelta(days=search["nights"] - 1)
+                assert abs(stay["total_price"] - price) < 0.011
+        store.journal.close()
+
+        # The tool returns the ranked stays in the form book_a_room takes them, or says there are none
+        calendar_path = custom_tools.CALENDAR_PATH
+        custom_tools.CALENDAR_PATH = csv_path
+        try:
+            stays = await invoke(
+                custom_tools.find_best_stays, nights=3, from_date="2025-05-01", to_date="2025-06-30",
+                number_of_persons=2, room_type="superior", limit=4,
+            )
+            assert len(stays) == 4 and all(stay["room_type"] == "superior" for stay in stays), stays
+            prices = [stay["total_price"] for stay in stays]
+            assert prices == sorted(prices)
+            assert all(
+                date.fromisoformat(stay["end_date"]) - date.fromisoformat(stay["start_date"]) == timedelta(days=2)
+                for stay in stays
+            )
+            earliest = await invoke(
+                custom_tools.find_best_stays, nights=3, from_date="2025-05-01", to_date="2025-06-30",
+                number_of_persons=2, order_by="earliest", limit=3,
+            )
+            starts = [stay["start_date"] for stay in earliest]
+            assert starts == sorted(starts), earliest
+            none = await invoke(
+                custom_tools.find_best_stays, nights=3, from_date="2025-05-01", to_date="2025-06-30",
+                number_of_persons=2, max_total_price=1.0,
+            )
+            assert none == "No stays match these criteria.", none
+        finally:
+            custom_tools.CALENDAR_PATH = calendar_path
+
+
+async def main():
+    await test_quotes()
+    await test_find_stays()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
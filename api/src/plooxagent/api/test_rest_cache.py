@@ -0,0 +1,94 @@
+# %%
+import asyncio
+import contextlib
+import os
+
+from aiohttp import web
+
+from plooxagent.api.daily import DailyService
+from plooxagent.api.test_room_pool import FakeDailyAPI
+
+
+class FakeDailyTokenAPI(FakeDailyAPI):
+    """Adds room lookups and meeting tokens to the fake rooms API, and counts requests per route."""
+
+    def __init__(self, latency: float = 0.05):
+        super().__init__(latency)
+        self.requests: dict[str, int] = {"token": 0, "room": 0}
+        self.fail_tokens = False
+
+    def app(self) -> web.Application:
+        app = super().app()
+        app.router.add_get("/v1/rooms/{name}", self.get_room)
+        app.router.add_post("/v1/meeting-tokens", self.create_token)
+        return app
+
+    async def get_room(self, request):
+        self.requests["room"] += 1
+        await asyncio.sleep(self.latency)
+        room = self.rooms.get(request.match_info["name"])
+        return web.json_response(room, status=200) if room else web.json_response({}, status=404)
+
+    async def create_token(self, request):
+        self.requests["token"] += 1
+        await asyncio.sleep(self.latency)
+        if self.fail_tokens:
+            return web.json_response({"error": "server-error"}, status=500)
+        body = await request.json()
+        return web.json_response({"token": f"token-{self.requests['token']}-{body['properties']['room_name']}"})
+
+
+async def test_rest_cache():
+    fake = FakeDailyTokenAPI()
+    runner = web.AppRunner(fake.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    fake.base_url = "https://fake.daily.co"
+    os.environ.setdefault("DAILY_API_KEY", "fake")
+
+    async with contextlib.AsyncExitStack() as cm:
+        daily = await DailyService.create(cm, api_url=f"http://127.0.0.1:{port}/v1", pool_size=0)
+        helper = daily._rest_helper
+        room_uri = await daily.create_room()
+
+        # A burst of joins to one room mints a single token
+        tokens = await asyncio.gather(*(daily.get_token(room_uri) for _ in range(50)))
+        assert len(set(tokens)) == 1 and fake.requests["token"] == 1
+        assert await daily.get_token(room_uri) == tokens[0] and fake.requests["token"] == 1
+
+        # Tokens too short-lived to outlast the margin are never reused
+        await helper.get_token(room_uri, expiry_time=30)
+        await helper.get_token(room_uri, expiry_time=30)
+        assert fake.requests["token"] == 3
+
+        # Room lookups are shared too, and forgotten when the room is deleted
+        rooms = await asyncio.gather(*(helper.get_room_from_url(room_uri) for _ in range(20)))
+        assert all(room.name == rooms[0].name for room in rooms) and fake.requests["room"] == 1
+        await daily.delete_room(room_uri)
+        try:
+            await helper.get_room_from_url(room_uri)
+            raise AssertionError("Expected the room to be gone")
+        except Exception as e:
+            assert "Room not found" in str(e)
+        assert fake.requests["room"] == 2
+
+        # Failures reach every waiting caller and are not cached
+        fake.fail_tokens = True
+        other = await daily.create_room()
+        results = await asyncio.gather(*(daily.get_token(other) for _ in range(5)), return_exceptions=True)
+        assert all(isinstance(result, Exception) for result in results) and fake.requests["token"] == 4
+        fake.fail_tokens = False
+        await daily.get_token(other)
+        assert fake.requests["token"] == 5
+
+        stats = daily.cache_stats()
+        print(f"tokens: {stats['tokens']}\nrooms: {stats['rooms']}")
+        assert stats["tokens"]["hit_rate"] > 0.8
+
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_rest_cache())
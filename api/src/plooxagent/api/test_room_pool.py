@@ -0,0 +1,99 @@
+# %%
+import asyncio
+import contextlib
+import itertools
+import os
+import time
+
+from aiohttp import web
+
+from plooxagent.api.daily import DailyService
+
+
+class FakeDailyAPI:
+    """Local stand-in for the Daily rooms REST API, with a fixed delay per request."""
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.ids = itertools.count()
+        self.rooms: dict[str, dict] = {}
+        self.deleted: list[str] = []
+        self.base_url = ""
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/rooms", self.create_room)
+        app.router.add_delete("/v1/rooms/{name}", self.delete_room)
+        return app
+
+    async def create_room(self, request):
+        await asyncio.sleep(self.latency)
+        body = await request.json()
+        name = f"room-{next(self.ids)}"
+        room = {
+            "id": name, "name": name, "api_created": True, "privacy": body.get("privacy", "public"),
+            "url": f"{self.base_url}/{name}", "created_at": "2025-04-26T09:00:00.000Z",
+            "config": body.get("properties", {}),
+        }
+        self.rooms[name] = room
+        return web.json_response(room)
+
+    async def delete_room(self, request):
+        await asyncio.sleep(self.latency)
+        name = request.match_info["name"]
+        self.deleted.append(name)
+        return web.json_response({"deleted": True, "name": name}, status=200 if self.rooms.pop(name, None) else 404)
+
+
+async def test_room_pool():
+    fake = FakeDailyAPI()
+    runner = web.AppRunner(fake.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    fake.base_url = "https://fake.daily.co"
+    os.environ.setdefault("DAILY_API_KEY", "fake")
+    api_url = f"http://127.0.0.1:{port}/v1"
+
+    async with contextlib.AsyncExitStack() as cm:
+        daily = await DailyService.create(cm, api_url=api_url, pool_size=3, refill_interval=0.1)
+        while daily.pooled_rooms < 3:
+            await asyncio.sleep(0.01)
+
+        started = time.perf_counter()
+        rooms = [await daily.create_room() for _ in range(3)]
+        pooled = (time.perf_counter() - started) / 3
+        assert daily.stats.hits == 3 and daily.stats.misses == 0
+        assert all(fake.rooms[room.rsplit("/", 1)[1]]["config"]["exp"] > time.time() + 3000 for room in rooms)
+
+        started = time.perf_counter()
+        await daily.create_room()
+        # The three refills are still in flight, so this one is made on demand
+        on_demand = time.perf_counter() - started
+        assert daily.stats.misses == 1
+        print(f"pooled room: {pooled * 1e3:.2f} ms, on demand: {on_demand * 1e3:.1f} ms")
+
+        while daily.pooled_rooms < 3:
+            await asyncio.sleep(0.01)
+        assert daily.stats.refills == 6 and daily.stats.refill_latency_avg >= fake.latency
+    # Rooms nobody took are deleted on shutdown
+    assert len(fake.deleted) == 3 and len(fake.rooms) == 4
+
+    async with contextlib.AsyncExitStack() as cm:
+        # Rooms that would expire before the next check are replaced with fresh ones
+        daily = await DailyService.create(
+            cm, api_url=api_url, pool_size=2, room_ttl=0.6, min_remaining=0.3, refill_interval=0.1
+        )
+        await asyncio.sleep(1.0)
+        assert daily.stats.evicted >= 4, daily.stats
+        # Every room handed out still has at least min_remaining to live
+        room = await daily.create_room()
+        assert fake.rooms[room.rsplit("/", 1)[1]]["config"]["exp"] - time.time() >= 0.3
+        print(f"evicted {daily.stats.evicted} expiring rooms: {daily.stats}")
+
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_room_pool())
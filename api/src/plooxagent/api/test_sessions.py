@@ -0,0 +1,89 @@
+# %%
+import asyncio
+import contextlib
+import gc
+import time
+
+from plooxagent.api.sessions import SessionManager
+
+
+class FakeDaily:
+    def __init__(self):
+        self.deleted: list[str] = []
+
+    async def delete_room(self, room_uri: str) -> None:
+        self.deleted.append(room_uri)
+
+
+class FakeAgent:
+    """Call session whose caller talks until told otherwise: "quiet" rooms go idle, "broken" ones never start."""
+
+    def __init__(self, room_uri: str):
+        self.room_uri = room_uri
+        self.caller_left = False
+        self.buffer = bytearray(48_000)
+        self._done = asyncio.Event()
+
+    @property
+    def last_activity(self) -> float:
+        return 0.0 if self.room_uri.endswith("quiet") else time.monotonic()
+
+    def memory_bytes(self) -> int:
+        return len(self.buffer)
+
+    async def run(self) -> None:
+        if self.room_uri.endswith("broken"):
+            raise RuntimeError("Unable to join")
+
+    async def stop(self) -> None:
+        self._done.set()
+
+    async def wait(self) -> None:
+        await self._done.wait()
+
+
+async def test_sessions():
+    daily = FakeDaily()
+    ended = []
+    async with contextlib.AsyncExitStack() as cm:
+        manager = await SessionManager.create(
+            cm,
+            daily=daily,
+            session_factory=FakeAgent,
+            idle_timeout=60,
+            reap_interval=0.05,
+            on_ended=lambda session: ended.append(session.session_id),
+        )
+        talking = await manager.start("https://fake.daily.co/talking")
+        leaving = await manager.start("https://fake.daily.co/leaving")
+        await manager.start("https://fake.daily.co/quiet")
+        stopped = await manager.start("https://fake.daily.co/stopped")
+        try:
+            await manager.start("https://fake.daily.co/broken")
+            raise AssertionError("Expected the session to fail")
+        except RuntimeError:
+            pass
+        assert daily.deleted == ["https://fake.daily.co/broken"]
+
+        report = manager.report()
+        assert report["live"] == 4 and all(s["memory_bytes"] == 48_000 for s in report["sessions"])
+        print(f"{report['live']} sessions, process RSS {report['rss_bytes'] / 2**20:.0f} MiB")
+
+        leaving.agent.caller_left = True
+        await manager.stop(stopped.session_id)
+        await asyncio.sleep(0.2)
+        assert manager.counts()["ended"] == {"caller_left": 1, "idle": 1, "stopped": 1}, manager.counts()
+        assert list(manager._sessions) == [talking.session_id]
+        assert len(daily.deleted) == 4 and len(ended) == 3
+
+    # Shutdown stops and releases the rest, and nothing keeps ended agents alive
+    del talking, leaving, stopped
+    gc.collect()
+    counts = manager.counts()
+    assert counts["live"] == 0 and counts["ended"]["shutdown"] == 1 and len(daily.deleted) == 5
+    assert counts["released_alive"] == 0, counts
+    print(f"after shutdown: {counts}")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_sessions())
@@ -0,0 +1,77 @@
+# %%
+import asyncio
+import json
+import pathlib
+import tempfile
+import time
+import types
+
+from plooxagent.api.translation import Translator
+
+
+class FakeCompletions:
+    """Chat completions that "translate" by upper-casing, after a fixed delay."""
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.calls: list[int] = []
+
+    async def create(self, model, messages, response_format=None):
+        await asyncio.sleep(self.latency)
+        text = messages[-1]["content"]
+        if response_format is None:
+            self.calls.append(1)
+            content = text.upper()
+        else:
+            texts = json.loads(text)
+            self.calls.append(len(texts))
+            content = json.dumps({"translations": [text.upper() for text in texts]})
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))])
+
+
+def fake_client(completions: FakeCompletions):
+    return types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+
+
+async def test_translation():
+    completions = FakeCompletions()
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = str(pathlib.Path(tmp) / "translations.json")
+        translator = Translator(client=fake_client(completions), max_batch=16, cache_path=cache_path)
+
+        # Requests arriving together go out as one completion per language, in batches of max_batch
+        texts = [f"welcome guest {i}" for i in range(40)]
+        started = time.perf_counter()
+        results = await asyncio.gather(*(translator.translate(text, "german") for text in texts))
+        elapsed = time.perf_counter() - started
+        assert results == [text.upper() for text in texts]
+        assert completions.calls == [16, 16, 8], completions.calls
+        print(f"40 translations in {len(completions.calls)} completions, {elapsed * 1e3:.0f} ms")
+
+        # Repeats and identical requests in flight cost nothing more
+        results = await asyncio.gather(*(translator.translate("good night", "French") for _ in range(10)))
+        assert set(results) == {"GOOD NIGHT"} and completions.calls[-1] == 1
+        calls = len(completions.calls)
+        assert await translator.translate("welcome guest 3", "German") == "WELCOME GUEST 3"
+        assert len(completions.calls) == calls
+        print(f"cache: {translator.cache.stats}, hit rate {translator.cache.stats.hit_rate:.2f}")
+
+        # Spellings of one language share a batch, not only the cache
+        calls = len(completions.calls)
+        results = await asyncio.gather(*(
+            translator.translate(f"sea view {i}", lang) for i, lang in enumerate(["Italian", "italian ", " ITALIAN"])
+        ))
+        assert results == [f"SEA VIEW {i}" for i in range(3)]
+        assert completions.calls[calls:] == [3], completions.calls
+        calls = len(completions.calls)
+        await translator.close()
+
+        # The cache survives a restart
+        restarted = Translator(client=fake_client(completions), cache_path=cache_path)
+        assert await restarted.translate("welcome guest 39", "german") == "WELCOME GUEST 39"
+        assert await restarted.translate("good night", "french") == "GOOD NIGHT"
+        assert len(completions.calls) == calls and len(restarted.cache) == 44
+
+
+if __name__ == "__main__":
+    asyncio.run(test_translation())
@@ -0,0 +1,141 @@
+# %%
+import asyncio
+import sys
+import types
+
+import numpy as np
+from agents import Agent
+from agents.voice.events import VoiceStreamEventAudio, VoiceStreamEventLifecycle
+
+from plooxagent.api import router as intent_router
+from plooxagent.api.daily import DailyAgent
+from plooxagent.api.daily import agent as daily_agent
+from plooxagent.api.metrics import Registry
+from plooxagent.api.router import RoutedVoiceWorkflow
+from plooxagent.api.test_concurrent_calls import FakeCallClient, FakeDaily
+from plooxagent.api.voice_metrics import HANDOFFS, RESPONSE, TOOL, TURNS, VOICE, TurnSpans
+
+TRIAGE = Agent(name="Assistant")
+VACANCY = Agent(name="VacancyCheckingAgent")
+TOOL_SECONDS = 0.03
+TTS_SECONDS = 0.02
+# Sentences the caller says; all are answered well before the call is stopped
+SENTENCES = 2
+
+
+def event(type, **kwargs):
+    return types.SimpleNamespace(type=type, **kwargs)
+
+
+class FakeRunResult:
+    """Triage hands off to the vacancy agent, which checks the calendar and answers."""
+
+    last_agent = VACANCY
+
+    async def stream_events(self):
+        yield event("agent_updated_stream_event", new_agent=TRIAGE)
+        yield event("run_item_stream_event", name="handoff_occured", item=types.SimpleNamespace(source_agent=TRIAGE, target_agent=VACANCY))
+        yield event("agent_updated_stream_event", new_agent=VACANCY)
+        call = types.SimpleNamespace(type="function_call", call_id="call-1", name="check_vacancy")
+        yield event("run_item_stream_event", name="tool_called", item=types.SimpleNamespace(raw_item=call))
+        await asyncio.sleep(TOOL_SECONDS)
+        yield event("run_item_stream_event", name="tool_output", item=types.SimpleNamespace(raw_item={"call_id": "call-1"}))
+        for delta in ("We have ", "a room."):
+            yield event("raw_response_event", data=types.SimpleNamespace(type="response.output_text.delta", delta=delta))
+
+    def to_input_list(self):
+        return []
+
+
+class TurnResult:
+    """A pipeline result that takes every 25 inbound frames as a finished sentence and answers the first SENTENCES."""
+
+    def __init__(self, workflow, audio_input):
+        self.workflow = workflow
+        self.audio_input = audio_input
+
+    async def stream(self):
+        frames = 0
+        while True:
+            await self.audio_input.queue.get()
+            frames += 1
+            if frames % 25 or frames > 25 * SENTENCES:
+                continue
+            started = False
+            async for _ in self.workflow.run("Do you have a room from the 26th to the 28th?"):
+                if not started:
+                    yield VoiceStreamEventLifecycle(event="turn_started")
+                    started = True
+                await asyncio.sleep(TTS_SECONDS)
+                yield VoiceStreamEventAudio(data=np.full(480, 1000, dtype=np.int16))
+            yield VoiceStreamEventLifecycle(event="turn_ended")
+
+
+class TurnPipeline:
+    def __init__(self, workflow, config):
+        # Inbound frames are views into the ring, so the STT must not keep them for its traces
+        assert not config.trace_include_sensitive_audio_data
+        self.workflow = workflow
+
+    async def run(self, audio_input):
+        return TurnResult(self.workflow, audio_input)
+
+
+async def test_voice_metrics():
+    daily_agent.Daily = FakeDaily
+    daily_agent.CallClient = FakeCallClient
+    daily_agent.VoicePipeline = TurnPipeline
+    daily_agent.make_voice_workflow = lambda spans: RoutedVoiceWorkflow(TRIAGE, {}, None, spans)
+    intent_router.Runner = types.SimpleNamespace(run_streamed=lambda agent, history: FakeRunResult())
+
+    # The counters are process-wide and other calls in this process may have added to them
+    turns, responses = TURNS.children.get((), 0), RESPONSE.child().count
+    tool_calls, tool_seconds = TOOL.child("check_vacancy").count, TOOL.child("check_vacancy").sum
+    handoffs = HANDOFFS.children.get(("Assistant", "VacancyCheckingAgent"), 0)
+
+    # The caller's frames peak at the room number, loud enough to count as speech
+    agent = DailyAgent("https://fake.daily.co/room-1000")
+    await agent.run()
+    await asyncio.sleep(1.6)
+    await agent.stop()
+    await agent.wait()
+
+    spans = agent.spans
+    assert spans.turns == SENTENCES, spans.turns
+    assert set(spans.last) == {"transcription_s", "first_text_s", "first_audio_s", "playout_s", "response_s"}, spans.last
+    assert spans.last["first_text_s"] >= TOOL_SECONDS and spans.last["first_audio_s"] >= TTS_SECONDS
+    assert spans.last["response_s"] >= sum(spans.last[name] for name in ("first_text_s", "first_audio_s", "playout_s")) - 1e-3
+    assert TURNS.children[()] - turns == spans.turns and RESPONSE.child().count - responses == spans.turns
+    assert TOOL.child("check_vacancy").count - tool_calls == spans.turns
+    assert TOOL.child("check_vacancy").sum - tool_seconds >= TOOL_SECONDS * spans.turns
+    assert HANDOFFS.children[("Assistant", "VacancyCheckingAgent")] - handoffs == spans.turns
+    print(f"{spans.turns} turns, last {spans.last}")
+
+    text = VOICE.render()
+    assert '# TYPE voice_response_seconds histogram' in text
+    assert f'voice_response_seconds_bucket{{le="+Inf"}} {float(RESPONSE.child().count)!r}' in text
+    assert 'voice_tool_seconds_count{tool="check_vacancy"}' in text
+    assert 'voice_handoffs_total{from_agent="Assistant",to_agent="VacancyCheckingAgent"}' in text
+
+    # What a worker sends with its heartbeat adds up in the supervisor
+    merged = VOICE.copy()
+    merged.merge(VOICE.dump())
+    merged.merge(VOICE.dump())
+    assert merged.families["voice_turns_total"].children[()] == 2 * TURNS.children[()]
+    assert merged.families["voice_response_seconds"].child().count == 2 * RESPONSE.child().count
+    labels = Registry()
+    labels.gauge("g", 'quoted "help"', ("name",)).set(1, 'a "b"\n')
+    assert 'g{name="a \\"b\\"\\n"} 1.0' in labels.render()
+
+    # Marking frames and text deltas allocates nothing
+    idle = TurnSpans()
+    idle.text()
+    blocks = sys.getallocatedblocks()
+    for _ in range(10_000):
+        idle.audio()
+        idle.text()
+    assert sys.getallocatedblocks() - blocks < 10
+
+
+if __name__ == "__main__":
+    asyncio.run(test_voice_metrics())
@@ -0,0 +1,188 @@
+# %%
+import asyncio
+import collections
+import itertools
+import json
+import os
+import tempfile
+import time
+
+from aiohttp import web
+from openai import AsyncOpenAI
+
+from plooxagent.api.utils import vs_setup_async
+
+DOCUMENTS = 120
+MAX_CONCURRENCY = 8
+
+
+class FakeOpenAI:
+    """Just enough of the OpenAI files and vector store API to run vs_setup_async against."""
+
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+        self.ids = itertools.count()
+        self.calls = collections.Counter()
+        self.files: dict[str, str] = {}
+        self.vector_stores: dict[str, set[str]] = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.track])
+        app.router.add_post("/v1/files", self.create_file)
+        app.router.add_get("/v1/files/{file_id}", self.retrieve_file)
+        app.router.add_delete("/v1/files/{file_id}", self.delete_file)
+        app.router.add_post("/v1/vector_stores", self.create_vector_store)
+        app.router.add_post("/v1/vector_stores/{vs_id}/files", self.attach_file)
+        app.router.add_get("/v1/vector_stores/{vs_id}/files", self.list_files)
+        app.router.add_delete("/v1/vector_stores/{vs_id}/files/{file_id}", self.detach_file)
+        return app
+
+    @web.middleware
+    async def track(self, request, handler):
+        self.calls[request.match_info.route.handler.__name__] += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            return await handler(request)
+        finally:
+            self.in_flight -= 1
+
+    def file(self, file_id: str) -> dict:
+        return {
+            "id": file_id, "object": "file", "bytes": 0, "created_at": int(time.time()),
+            "filename": self.files[file_id], "purpose": "assistants", "status": "processed",
+        }
+
+    def vector_store_file(self, vs_id: str, file_id: str) -> dict:
+        return {
+            "id": file_id, "object": "vector_store.file", "created_at": int(time.time()),
+            "vector_store_id": vs_id, "status": "completed", "usage_bytes": 0, "last_error": None,
+        }
+
+    async def create_file(self, request):
+        form = await request.post()
+        file_id = f"file-{next(self.ids)}"
+        self.files[file_id] = form["file"].filename
+        return web.json_response(self.file(file_id))
+
+    async def retrieve_file(self, request):
+        return web.json_response(self.file(request.match_info["file_id"]))
+
+    async def delete_file(self, request):
+        file_id = request.match_info["file_id"]
+        self.files.pop(file_id)
+        return web.json_response({"id": file_id, "object": "file", "deleted": True})
+
+    async def create_vector_store(self, request):
+        body = await request.json()
+        vs_id = f"vs_{next(self.ids)}"
+        self.vector_stores[vs_id] = set()
+        return web.json_response({
+            "id": vs_id, "object": "vector_store", "name": body["name"], "created_at": int(time.time()),
+            "usage_bytes": 0, "status": "completed", "last_active_at": None, "metadata": None,
+            "file_counts": {"in_progress": 0, "completed": 0, "failed": 0, "cancelled": 0, "total": 0},
+        })
+
+    async def attach_file(self, request):
+        vs_id = request.match_info["vs_id"]
+        file_id = (await request.json())["file_id"]
+        self.vector_stores[vs_id].add(file_id)
+        return web.json_response(self.vector_store_file(vs_id, file_id))
+
+    async def list_files(self, request):
+        vs_id = request.match_info["vs_id"]
+        data = [self.vector_store_file(vs_id, file_id) for file_id in sorted(self.vector_stores[vs_id])]
+        return web.json_response({
+            "object": "list", "data": data, "has_more": False,
+            "first_id": data[0]["id"] if data else None, "last_id": data[-1]["id"] if data else None,
+        })
+
+    async def detach_file(self, request):
+        vs_id, file_id = request.match_info["vs_id"], request.match_info["file_id"]
+        self.vector_stores[vs_id].remove(file_id)
+        return web.json_response({"id": file_id, "object": "vector_store.file.deleted", "deleted": True})
+
+
+async def test_vs_setup():
+    fake = FakeOpenAI()
+    runner = web.AppRunner(fake.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        records_path = os.path.join(tmp_dir, "vs_record.json")
+        names, paths = [], []
+        for i in range(DOCUMENTS):
+            path = os.path.join(tmp_dir, f"doc_{i:03d}.txt")
+            with open(path, "w") as doc:
+                doc.write(f"document {i}\n" * 1000)
+            names.append(f"store_{i % 3}")
+            paths.append(path)
+
+        async with AsyncOpenAI(api_key="fake", base_url=f"http://127.0.0.1:{port}/v1", max_retries=0) as client:
+            async def sync() -> tuple[collections.Counter, float]:
+                fake.calls.clear()
+                started = time.perf_counter()
+                await vs_setup_async(
+                    names, paths, client=client, max_concurrency=MAX_CONCURRENCY, json_file_path=records_path
+                )
+                return collections.Counter(fake.calls), time.perf_counter() - started
+
+            calls, elapsed = await sync()
+            assert calls["create_vector_store"] == 3
+            assert calls["create_file"] == calls["attach_file"] == DOCUMENTS
+            assert fake.max_in_flight <= MAX_CONCURRENCY
+            print(f"first sync: {DOCUMENTS} uploads in {elapsed:.2f} s, at most {fake.max_in_flight} requests in flight")
+
+            calls, elapsed = await sync()
+            assert not calls, calls
+            print(f"unchanged:  no requests in {elapsed * 1e3:.1f} ms")
+
+            # Touched but identical files are rehashed, not re-uploaded
+            for path in paths[:10]:
+                os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+            calls, _ = await sync()
+            assert not calls, calls
+
+            for path in paths[:10]:
+                with open(path, "a") as doc:
+                    doc.write("revised\n")
+            calls, _ = await sync()
+            assert calls["create_file"] == calls["attach_file"] == 10
+            assert calls["detach_file"] == calls["delete_file"] == 10
+            print("changed:    10 re-uploads, 10 superseded files detached")
+
+            # Records from before file IDs were kept hold just the hash; the old upload is found by name
+            with open(records_path) as records_file:
+                records = json.load(records_file)
+            legacy = paths[10:15]
+            for store in records.values():
+                for path in legacy:
+                    if path in store["files"]:
+                        store["files"][path] = store["files"][path]["hash"]
+            with open(records_path, "w") as records_file:
+                json.dump(records, records_file)
+            for path in legacy:
+                with open(path, "a") as doc:
+                    doc.write("revised\n")
+            calls, _ = await sync()
+            assert calls["create_file"] == calls["detach_file"] == calls["delete_file"] == len(legacy), calls
+
+        with open(records_path) as records_file:
+            records = json.load(records_file)
+        attached = {
+            file["file_id"] for store in records.values() for file in store["files"].values()
+        }
+        assert attached == set(fake.files) == set().union(*fake.vector_stores.values())
+        assert len(attached) == DOCUMENTS
+
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_vs_setup())
@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import typing as t
+
+from openai import AsyncOpenAI
+
+from plooxagent.api.caching import TTLCache
+
+logger = logging.getLogger(__name__)
+
+BATCH_INSTRUCTIONS = (
+    "Translate every string of the JSON array given by the user to {target_lang} without commentary. "
+    'Reply with a JSON object {{"translations": [...]}} holding the translations in the same order.'
+)
+
+
+def normalize_lang(target_lang: str) -> str:
+    return target_lang.strip().lower()
+
+
+def translation_key(text: str, target_lang: str) -> str:
+    return f"{normalize_lang(target_lang)}:{hashlib.sha256(text.encode()).hexdigest()}"
+
+
+class Translator:
+    """
+    Translates text with a shared async client, caching and batching the requests.
+
+    Translations are cached by text hash and target language. Requests for the
+    same language that arrive within ``batch_window`` seconds of each other go
+    out as one completion of up to ``max_batch`` texts. If ``cache_path`` is
+    set, the cache is loaded from it and saved back after every batch.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI | None = None,
+        model: str = "gpt-4o",
+        batch_window: float = 0.005,
+        max_batch: int = 16,
+        maxsize: int = 4096,
+        ttl: float = 7 * 24 * 60 * 60,
+        cache_path: str | None = None,
+    ):
+        if client is None:
+            from plooxagent.api.utils import get_async_client
+
+            client = get_async_client()
+        self.client = client
+        self.model = model
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.cache_path = cache_path
+        self.cache: TTLCache[str, str] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.completions = 0
+        self._pending: dict[str, list[tuple[str, asyncio.Future]]] = {}
+        self._flush_handles: dict[str, asyncio.TimerHandle] = {}
+        self._batches: set[asyncio.Task] = set()
+        self._save_task: asyncio.Task | None = None
+        self._dirty = False
+        if cache_path is not None:
+            self._load()
+
+    async def translate(self, text: str, target_lang: str = "english") -> str:
+        # "German" and "german " share both the cache entry and the batch
+        target_lang = normalize_lang(target_lang)
+        key = translation_key(text, target_lang)
+        return await self.cache.get(key, lambda: self._submit(text, target_lang))
+
+    async def close(self) -> None:
+        """Wait for a save in progress and write the cache one last time."""
+        if self._save_task is not None:
+            await self._save_task
+        if self._dirty:
+            self._dirty = False
+            await asyncio.to_thread(self._write, self._records())
+
+    def _submit(self, text: str, target_lang: str) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(target_lang, [])
+        pending.append((text, future))
+        if len(pending) >= self.max_batch:
+            self._flush(target_lang)
+        elif target_lang not in self._flush_handles:
+            self._flush_handles[target_lang] = loop.call_later(self.batch_window, self._flush, target_lang)
+        return future
+
+    def _flush(self, target_lang: str) -> None:
+        handle = self._flush_handles.pop(target_lang, None)
+        if handle is not None:
+            handle.cancel()
+        batch = self._pending.pop(target_lang, [])
+        if batch:
+            task = asyncio.create_task(self._run_batch(target_lang, batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, target_lang: str, batch: list[tuple[str, asyncio.Future]]) -> None:
+        texts = [text for text, _ in batch]
+        try:
+            if len(texts) == 1:
+                translations = [await self._complete_one(texts[0], target_lang)]
+            else:
+                translations = await self._complete_batch(texts, target_lang)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), translation in zip(batch, translations):
+            if not future.done():
+                future.set_result(translation)
+        if self.cache_path is not None:
+            self._dirty = True
+            # Let the cache take the results before it is written
+            asyncio.get_running_loop().call_soon(self._schedule_save)
+
+    async def _complete_one(self, text: str, target_lang: str) -> str:
+        self.completions += 1
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": f"Translate to {target_lang} without commentary:"},
+                {"role": "user", "content": text},
+            ],
+        )
+        return response.choices[0].message.content
+
+    async def _complete_batch(self, texts: list[str], target_lang: str) -> list[str]:
+        self.completions += 1
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            response_format={"type": "json_object"},
+            messages=[
+                {"role": "system", "content": BATCH_INSTRUCTIONS.format(target_lang=target_lang)},
+                {"role": "user", "content": json.dumps(texts, ensure_ascii=False)},
+            ],
+        )
+        try:
+            translations = json.loads(response.choices[0].message.content)["translations"]
+        except (json.JSONDecodeError, KeyError, TypeError):
+            translations = None
+        if not isinstance(translations, list) or len(translations) != len(texts):
+            logger.warning("Batched translation of %d texts came back malformed, translating them one by one", len(texts))
+            return list(await asyncio.gather(*(self._complete_one(text, target_lang) for text in texts)))
+        return [str(translation) for translation in translations]
+
+    def _schedule_save(self) -> None:
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_soon())
+
+    async def _save_soon(self) -> None:
+        while self._dirty:
+            self._dirty = False
+            await asyncio.to_thread(self._write, self._records())
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_path) as file:
+                records = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        now = time.time()
+        for key, (translation, expires_at) in records.items():
+            if expires_at > now:
+                self.cache.put(key, translation, ttl=expires_at - now)
+
+    def _records(self) -> dict:
+        # Taken on the event loop, which owns the cache
+        now = time.time()
+        return {key: (translation, now + remaining) for key, translation, remaining in self.cache.items()}
+
+    def _write(self, records: dict) -> None:
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(records, file, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
+
+
+_translator: Translator | None = None
+
+
+def use_translator(translator: Translator | None) -> None:
+    """Make translate_text use ``translator``; None goes back to the default one."""
+    global _translator
+    _translator = translator
+
+
+def get_translator() -> Translator:
+    """The translator of this process, persisted to TRANSLATION_CACHE_PATH if set."""
+    global _translator
+    if _translator is None:
+        _translator = Translator(cache_path=os.environ.get("TRANSLATION_CACHE_PATH"))
+    return _translator
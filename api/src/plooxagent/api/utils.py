@@ -1,40 +1,68 @@
 from typing import Optional, Tuple
 from datetime import datetime, date, timedelta
-from openai import OpenAI
+from openai import AsyncOpenAI
+import asyncio
+import functools
 import os
 import json
 import hashlib
+import pathlib
 
 
-CLIENT = OpenAI()
+@functools.cache
+def get_async_client() -> AsyncOpenAI:
+    """AsyncOpenAI client shared by the knowledge base sync, created on first use."""
+    return AsyncOpenAI()
 
 
-def calculate_file_hash(file_path: str) -> str:
+def calculate_file_hash(file_path: str, chunk_size: int = 1 << 20) -> str:
     """Calculate SHA-256 hash of a file."""
     hash_sha256 = hashlib.sha256()
     with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
+        for chunk in iter(lambda: f.read(chunk_size), b""):
             hash_sha256.update(chunk)
     return hash_sha256.hexdigest()
 
 
-def upload_file(file_path: str, vector_store_id: str):
+async def upload_file(client: AsyncOpenAI, file_path: str, vector_store_id: str) -> dict:
     file_name = os.path.basename(file_path)
     try:
-        file_response = CLIENT.files.create(file=open(file_path, 'rb'), purpose="assistants")
-        attach_response = CLIENT.vector_stores.files.create(
+        file_response = await client.files.create(file=pathlib.Path(file_path), purpose="assistants")
+        await client.vector_stores.files.create(
             vector_store_id=vector_store_id,
             file_id=file_response.id
         )
-        return {"file": file_name, "status": "success"}
+        return {"file": file_name, "status": "success", "file_id": file_response.id}
     except Exception as e:
         print(f"Error with {file_name}: {str(e)}")
         return {"file": file_name, "status": "failed", "error": str(e)}
 
 
-def create_vector_store(store_name: str) -> dict:
+async def detach_file(client: AsyncOpenAI, file_id: str, vector_store_id: str) -> None:
+    """Remove a superseded file from a vector store and delete it from storage."""
     try:
-        vector_store = CLIENT.vector_stores.create(name=store_name)
+        await client.vector_stores.files.delete(file_id=file_id, vector_store_id=vector_store_id)
+        await client.files.delete(file_id)
+    except Exception as e:
+        print(f"Error detaching {file_id}: {e}")
+
+
+async def find_attached_files(client: AsyncOpenAI, file_name: str, vector_store_id: str) -> list[str]:
+    """IDs of the files named file_name attached to a vector store, for records that lack the file ID."""
+    file_ids = []
+    try:
+        async for vs_file in client.vector_stores.files.list(vector_store_id=vector_store_id):
+            file = await client.files.retrieve(vs_file.id)
+            if file.filename == file_name:
+                file_ids.append(vs_file.id)
+    except Exception as e:
+        print(f"Error listing files of {vector_store_id}: {e}")
+    return file_ids
+
+
+async def create_vector_store(client: AsyncOpenAI, store_name: str) -> dict:
+    try:
+        vector_store = await client.vector_stores.create(name=store_name)
         details = {
             "id": vector_store.id,
             "name": vector_store.name,
@@ -65,55 +93,104 @@ def save_vs_records(vs_records: dict, json_file_path: str = "data/vs_record.json
         json.dump(vs_records, file, indent=2)
 
 
-def vs_setup(names: list[str], paths: list[str]) -> dict:
+def _file_record(record) -> dict:
+    # Records written before the (mtime, size) cache hold just the hash
+    return {"hash": record} if isinstance(record, str) else dict(record)
+
+
+async def vs_setup_async(
+    names: list[str],
+    paths: list[str],
+    client: AsyncOpenAI | None = None,
+    max_concurrency: int = 8,
+    json_file_path: str = "data/vs_record.json",
+) -> dict:
     """
-    Creates vector stores (if not present), uploads files, and returns IDs of OpenAI vector search files.
-    Only creates a new vector store if its name is not already in the records.
-    Implements file hash caching to avoid re-uploading unchanged files.
+    Creates vector stores (if not present), uploads new or changed files concurrently, and returns the records.
+
+    A file whose mtime and size match its record is skipped without being read. Any
+    other file is hashed in a worker thread and only uploaded if its hash changed;
+    the version it replaces is then detached from the vector store and deleted,
+    found by file name if its record predates file IDs.
+
+    Args:
+        names: Vector store of each file; a name may repeat to keep several files in one store
+        paths: Files to sync, in the same order as names
+        client: OpenAI client to use, the shared one by default
+        max_concurrency: Maximum number of files hashed or uploaded at the same time
+        json_file_path: Vector store records to read and update
+
+    Returns:
+        dict: Vector store records by name
     """
-    # Read existing records
-    vs_records = read_vs_records()
-    
-    # Process each name and path
-    for n, p in zip(names, paths):
-        current_hash = calculate_file_hash(p)
-        
-        # Check if a vector store with this name already exists
-        if n in vs_records:
-            print(f"Vector store '{n}' already exists with ID: {vs_records[n]['id']}")
-            
-            # Check if we have a hash record for this file
-            file_changed = True
-            if 'files' in vs_records[n] and p in vs_records[n]['files']:
-                stored_hash = vs_records[n]['files'][p]
-                if stored_hash == current_hash:
-                    print(f"File '{p}' unchanged since last upload, skipping...")
-                    file_changed = False
-                else:
-                    print(f"File '{p}' has changed, re-uploading...")
-            
-            # Upload file if it's changed or new
-            if file_changed:
-                upload_result = upload_file(file_path=p, vector_store_id=vs_records[n]['id'])
-                # Update file hash in records
-                if 'files' not in vs_records[n]:
-                    vs_records[n]['files'] = {}
-                vs_records[n]['files'][p] = current_hash
-        else:
-            # Create new vector store
-            store_details = create_vector_store(store_name=n)
-            if store_details:
-                vs_records[n] = store_details
-                vs_records[n]['files'] = {p: current_hash}
-                # Upload file to the new vector store
-                upload_file(file_path=p, vector_store_id=store_details['id'])
-    
+    client = client or get_async_client()
+    limit = asyncio.Semaphore(max_concurrency)
+    vs_records = read_vs_records(json_file_path)
+
+    async def ensure_vector_store(name: str) -> None:
+        if name in vs_records:
+            print(f"Vector store '{name}' already exists with ID: {vs_records[name]['id']}")
+            return
+        async with limit:
+            store_details = await create_vector_store(client, store_name=name)
+        if store_details:
+            vs_records[name] = {**store_details, "files": {}}
+
+    async def sync_file(name: str, path: str) -> None:
+        if name not in vs_records:
+            # Vector store could not be created, try again on the next run
+            return
+        vector_store_id = vs_records[name]["id"]
+        files = vs_records[name].setdefault("files", {})
+        previous = _file_record(files[path]) if path in files else {}
+
+        stat = os.stat(path)
+        if previous.get("mtime_ns") == stat.st_mtime_ns and previous.get("size") == stat.st_size:
+            return
+
+        async with limit:
+            current_hash = await asyncio.to_thread(calculate_file_hash, path)
+            record = {"hash": current_hash, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+            if previous.get("hash") == current_hash:
+                print(f"File '{path}' unchanged since last upload, skipping...")
+                files[path] = {**previous, **record}
+                return
+
+            print(f"File '{path}' is new or has changed, uploading...")
+            upload_result = await upload_file(client, file_path=path, vector_store_id=vector_store_id)
+            if upload_result["status"] != "success":
+                return
+            file_id = upload_result["file_id"]
+            files[path] = {**record, "file_id": file_id}
+            if previous.get("file_id"):
+                superseded = [previous["file_id"]]
+            elif previous:
+                # A record that predates file IDs: find the old upload by its name
+                superseded = await find_attached_files(client, upload_result["file"], vector_store_id)
+            else:
+                superseded = []
+            for old_id in superseded:
+                if old_id != file_id:
+                    await detach_file(client, old_id, vector_store_id)
+
+    await asyncio.gather(*(ensure_vector_store(n) for n in dict.fromkeys(names)))
+    await asyncio.gather(*(sync_file(n, p) for n, p in zip(names, paths)))
+
     # Save updated records
-    save_vs_records(vs_records)
-    
+    save_vs_records(vs_records, json_file_path)
+
     return vs_records
 
 
+def vs_setup(names: list[str], paths: list[str], **kwargs) -> dict:
+    """Blocking vs_setup_async for scripts, on a client of its own; async code should await vs_setup_async."""
+    async def run() -> dict:
+        async with AsyncOpenAI() as client:
+            return await vs_setup_async(names, paths, client=client, **kwargs)
+
+    return asyncio.run(run())
+
+
 def validate_date_format(date_str: str) -> Tuple[bool, Optional[str]]:
     """
     Validate that a date string is in the correct format (YYYY-MM-DD) and is a valid date.
@@ -0,0 +1,118 @@
+import time
+import typing as t
+
+from plooxagent.api.metrics import Registry
+
+# Voice latency of every call in this process; the supervisor merges its workers' into its own
+VOICE = Registry()
+RESPONSE = VOICE.histogram("voice_response_seconds", "Guest going quiet to the first frame of the reply written to the room")
+TRANSCRIPTION = VOICE.histogram("voice_transcription_seconds", "Guest going quiet to the transcription of the turn")
+FIRST_TEXT = VOICE.histogram("voice_first_text_seconds", "Transcription to the first text of the answer")
+FIRST_AUDIO = VOICE.histogram("voice_first_audio_seconds", "First text of the answer to its first synthesized audio")
+PLAYOUT = VOICE.histogram("voice_playout_seconds", "First synthesized audio of the answer to its first frame written to the room")
+AGENT = VOICE.histogram("voice_agent_seconds", "Time an agent ran within a turn", ("agent",))
+TOOL = VOICE.histogram("voice_tool_seconds", "Time a tool call took", ("tool",))
+HANDOFFS = VOICE.counter("voice_handoffs_total", "Handoffs between agents", ("from_agent", "to_agent"))
+TURNS = VOICE.counter("voice_turns_total", "Turns answered with audio")
+TOOL_TIMEOUTS = VOICE.counter("voice_tool_timeouts_total", "Tool calls abandoned after their timeout", ("tool",))
+# Any lag of the loop delays the audio of every call on it, so the buckets start well below a 20 ms frame
+LOOP_LAG = VOICE.histogram(
+    "event_loop_lag_seconds", "How late the event loop woke up from a short sleep",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+SLOW_CALLBACKS = VOICE.counter("event_loop_slow_callbacks_total", "Times a callback blocked the event loop too long")
+
+
+class TurnSpans:
+    """
+    Marks on the ``time.monotonic()`` clock for the current turn of one call.
+
+    The workflow marks the transcription, the first text and every agent, tool
+    and handoff; the call marks the first synthesized audio and the first frame
+    written to the room. Marks are plain attribute stores, so nothing is
+    allocated per audio frame. When the first frame of an answer is written the
+    turn is folded into the ``VOICE`` histograms and kept in ``last``.
+    """
+
+    __slots__ = (
+        "last_voice", "speech_end", "transcribed", "first_text", "first_audio",
+        "awaiting_audio", "agent", "agent_started", "tools", "turns", "last",
+    )
+
+    def __init__(self, last_voice: t.Callable[[], float] = lambda: 0.0):
+        # Time the guest last spoke, read when the transcription arrives
+        self.last_voice = last_voice
+        self.speech_end = self.transcribed = self.first_text = self.first_audio = 0.0
+        self.awaiting_audio = False
+        self.agent: str | None = None
+        self.agent_started = 0.0
+        # Start of every tool call in flight, by call id
+        self.tools: dict[str, tuple[str, float]] = {}
+        self.turns = 0
+        self.last: dict[str, float] = {}
+
+    def transcription(self) -> None:
+        """A new turn: the guest's speech has been transcribed."""
+        now = time.monotonic()
+        speech_end = self.last_voice()
+        self.speech_end = speech_end if 0 < speech_end <= now else 0.0
+        self.transcribed = now
+        self.first_text = self.first_audio = 0.0
+        self.tools.clear()
+
+    def text(self) -> None:
+        if not self.first_text:
+            self.first_text = time.monotonic()
+
+    def answer_started(self) -> None:
+        """The pipeline started speaking a new answer."""
+        self.awaiting_audio = True
+
+    def audio(self) -> None:
+        if self.awaiting_audio:
+            self.awaiting_audio = False
+            self.first_audio = time.monotonic()
+
+    def agent_started_running(self, name: str) -> None:
+        self.agent_done()
+        self.agent, self.agent_started = name, time.monotonic()
+
+    def agent_done(self) -> None:
+        if self.agent is not None:
+            AGENT.observe(time.monotonic() - self.agent_started, self.agent)
+            self.agent = None
+
+    def handoff(self, from_agent: str, to_agent: str) -> None:
+        HANDOFFS.inc(from_agent, to_agent)
+
+    def tool_called(self, call_id: str, name: str) -> None:
+        self.tools[call_id] = (name, time.monotonic())
+
+    def tool_done(self, call_id: str) -> None:
+        if call_id in self.tools:
+            name, started = self.tools.pop(call_id)
+            TOOL.observe(time.monotonic() - started, name)
+
+    def first_frame(self, written_at: float) -> None:
+        """The first frame of an answer reached the room; completes the turn if it answered a transcription."""
+        if not self.transcribed or not self.first_audio:
+            # A greeting, or the rest of an answer that was interrupted
+            return
+        spans = {
+            "first_text_s": self.first_text - self.transcribed if self.first_text else None,
+            "first_audio_s": self.first_audio - self.first_text if self.first_text else None,
+            "playout_s": written_at - self.first_audio,
+        }
+        if self.speech_end:
+            spans["transcription_s"] = self.transcribed - self.speech_end
+            spans["response_s"] = written_at - self.speech_end
+            TRANSCRIPTION.observe(spans["transcription_s"])
+            RESPONSE.observe(spans["response_s"])
+        if self.first_text:
+            FIRST_TEXT.observe(spans["first_text_s"])
+            FIRST_AUDIO.observe(spans["first_audio_s"])
+        PLAYOUT.observe(spans["playout_s"])
+        TURNS.inc()
+        self.turns += 1
+        self.last = {name: round(value, 4) for name, value in spans.items() if value is not None}
+        self.transcribed = self.first_audio = 0.0
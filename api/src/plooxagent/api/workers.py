@@ -0,0 +1,490 @@
+import asyncio
+import collections
+import contextlib
+import dataclasses
+import functools
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import sys
+import threading
+import time
+import traceback
+import typing as t
+import uuid
+
+from .metrics import Histogram, Registry
+from .voice_metrics import LOOP_LAG, SLOW_CALLBACKS, VOICE
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """Raised when no worker can take another call; the client should retry after ``retry_after`` seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the running event loop wakes up from a short sleep.
+
+    With ``slow_after`` set, a watchdog thread also samples the stack of the
+    loop's thread whenever the loop has not woken up for that long, and the
+    sample is logged with the full lag once the loop runs again: the stack of
+    the callback that blocked it.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        window: int = 20,
+        slow_after: float | None = None,
+        histogram: Histogram | None = None,
+    ):
+        self.interval = interval
+        self.slow_after = slow_after
+        # Every sample is also observed here, if given
+        self.histogram = histogram
+        self.slow_callbacks = 0
+        self._samples: collections.deque[float] = collections.deque(maxlen=window)
+        self._task: asyncio.Task | None = None
+        self._ticked = 0.0
+        self._stack: str | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    @property
+    def lag(self) -> float:
+        """Worst lag over the last ``window`` samples, in seconds."""
+        return max(self._samples, default=0.0)
+
+    @property
+    def samples(self) -> list[float]:
+        """The last ``window`` samples, oldest first, in seconds."""
+        return list(self._samples)
+
+    def start(self) -> None:
+        self._ticked = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+        if self.slow_after is not None:
+            self._stopped.clear()
+            self._watchdog = threading.Thread(
+                target=self._watch, args=(threading.get_ident(),), name="loop-watchdog", daemon=True
+            )
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._watchdog is not None:
+            self._stopped.set()
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - started - self.interval, 0.0)
+            self._ticked = time.monotonic()
+            self._samples.append(lag)
+            if self.histogram is not None:
+                self.histogram.observe(lag)
+            if self.slow_after is not None and lag > self.slow_after:
+                self._report(lag)
+
+    def _report(self, lag: float) -> None:
+        self.slow_callbacks += 1
+        SLOW_CALLBACKS.inc()
+        stack, self._stack = self._stack, None
+        if stack is None:
+            logger.warning("Event loop blocked for %.0f ms", lag * 1e3)
+        else:
+            logger.warning("Event loop blocked for %.0f ms, in:\n%s", lag * 1e3, stack)
+
+    def _watch(self, loop_thread: int) -> None:
+        # Polls often enough to catch the loop while it is still blocked
+        while not self._stopped.wait(self.slow_after / 2):
+            ticked = self._ticked
+            if self._stack is None and time.monotonic() - ticked > self.interval + self.slow_after:
+                frame = sys._current_frames().get(loop_thread)
+                if frame is not None and self._ticked == ticked:
+                    self._stack = "".join(traceback.format_stack(frame))
+
+
+def slow_callback_threshold() -> float | None:
+    """Seconds a callback may block the loop before its stack is logged, from LOOP_SLOW_CALLBACK; 0 turns it off."""
+    threshold = float(os.environ.get("LOOP_SLOW_CALLBACK", "0.1"))
+    return threshold or None
+
+
+async def prepare_worker(cm: contextlib.AsyncExitStack, vs_ids: dict | None = None) -> None:
+    """Default set-up of a worker process: the Daily SDK, the agents and the calendar backend, already imported by the supervisor."""
+    from .agentic_components import setup_agents
+    from .daily import init_daily
+    from .server import create_calendar
+
+    init_daily()
+    await setup_agents(vs_ids=vs_ids)
+    await create_calendar(cm, import_csv=False)
+
+
+def _worker_main(
+    worker_id: int,
+    conn: multiprocessing.connection.Connection,
+    session_factory: t.Callable[[str], t.Any],
+    prepare: t.Callable[[contextlib.AsyncExitStack], t.Awaitable[None]],
+    heartbeat: float,
+) -> None:
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_serve(worker_id, conn, session_factory, prepare, heartbeat))
+
+
+async def _serve(
+    worker_id: int,
+    conn: multiprocessing.connection.Connection,
+    session_factory: t.Callable[[str], t.Any],
+    prepare: t.Callable[[contextlib.AsyncExitStack], t.Awaitable[None]],
+    heartbeat: float,
+) -> None:
+    from .sessions import SessionManager
+
+    loop = asyncio.get_running_loop()
+    tasks: set[asyncio.Task] = set()
+    done = asyncio.Event()
+
+    def send(*message) -> None:
+        try:
+            conn.send(message)
+        except OSError:
+            # The supervisor is gone
+            done.set()
+
+    def spawn(coro) -> None:
+        task = asyncio.create_task(coro)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    # Calls still starting, and those of them the supervisor stopped waiting for
+    starting: set[str] = set()
+    abandoned: set[str] = set()
+
+    async def start(session_id: str, room_uri: str, hotel_id: str | None = None) -> None:
+        starting.add(session_id)
+        try:
+            await sessions.start(room_uri, session_id, hotel_id)
+        except Exception as e:
+            logger.exception("worker %d: call %s failed to start", worker_id, session_id)
+            send("failed", session_id, repr(e))
+            return
+        finally:
+            starting.discard(session_id)
+        if session_id in abandoned:
+            abandoned.discard(session_id)
+            logger.warning("worker %d: call %s started after its timeout, stopping it", worker_id, session_id)
+            await sessions.stop(session_id, "start_timeout")
+            return
+        send("started", session_id)
+
+    def on_message() -> None:
+        try:
+            while conn.poll():
+                command, *args = conn.recv()
+                if command == "start":
+                    spawn(start(*args))
+                elif command == "stop":
+                    if args[0] in starting:
+                        abandoned.add(args[0])
+                    spawn(sessions.stop(args[0]))
+                elif command == "shutdown":
+                    done.set()
+        except EOFError:
+            done.set()
+
+    async with contextlib.AsyncExitStack() as cm:
+        await prepare(cm)
+        # Rooms are deleted by the supervisor once it hears a call has ended
+        sessions = await SessionManager.create(
+            cm,
+            session_factory=session_factory,
+            idle_timeout=float(os.environ.get("CALL_IDLE_TIMEOUT", "300")),
+            on_ended=lambda session: send("ended", session.session_id),
+        )
+        monitor = LoopLagMonitor(slow_after=slow_callback_threshold(), histogram=LOOP_LAG.child())
+        monitor.start()
+        cm.push_async_callback(monitor.stop)
+        loop.add_reader(conn.fileno(), on_message)
+        cm.callback(loop.remove_reader, conn.fileno())
+        send("ready", os.getpid())
+
+        while not done.is_set():
+            send("load", len(sessions), monitor.lag, VOICE.dump())
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(done.wait(), heartbeat)
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@dataclasses.dataclass
+class CallInfo:
+    session_id: str
+    room_uri: str
+    started_at: float
+    hotel_id: str | None = None
+
+
+@dataclasses.dataclass
+class Worker:
+    worker_id: int
+    process: multiprocessing.process.BaseProcess
+    conn: multiprocessing.connection.Connection
+    ready: asyncio.Future
+    pid: int | None = None
+    loop_lag: float = 0.0
+    # Sessions the worker runs as of its last heartbeat, including any the supervisor does not track
+    sessions: int = 0
+    # Latest dump of the worker's voice latency metrics, sent with every heartbeat
+    metrics: dict = dataclasses.field(default_factory=dict)
+    calls: dict[str, CallInfo] = dataclasses.field(default_factory=dict)
+    # Calls sent to the worker that have not started yet, with the future resolved when they do
+    pending: dict[str, tuple[CallInfo, asyncio.Future]] = dataclasses.field(default_factory=dict)
+
+    @property
+    def load(self) -> int:
+        return len(self.calls) + len(self.pending)
+
+    @property
+    def alive(self) -> bool:
+        return self.ready.done() and not self.ready.cancelled() and self.ready.exception() is None
+
+
+class CallWorkerPool:
+    """
+    Runs call sessions in worker processes, away from the event loop serving HTTP.
+
+    Every worker is a spawned process with its own event loop, Daily SDK and
+    agents. The supervisor hands each call to the least-loaded worker and turns
+    calls away with ``Overloaded`` once every worker is at capacity or its event
+    loop lags behind. Workers report their load and loop lag on a heartbeat, and
+    a worker that dies is replaced.
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        max_calls_per_worker: int = 8,
+        max_loop_lag: float = 0.1,
+        retry_after: float = 5.0,
+        session_factory: t.Callable[[str], t.Any] | None = None,
+        prepare: t.Callable[[contextlib.AsyncExitStack], t.Awaitable[None]] = prepare_worker,
+        start_timeout: float = 30.0,
+        heartbeat: float = 0.5,
+        on_call_ended: t.Callable[[str], t.Awaitable[None]] | None = None,
+    ):
+        if session_factory is None:
+            from .daily import DailyAgent
+
+            session_factory = DailyAgent
+        self.size = workers or os.cpu_count() or 1
+        self.max_calls_per_worker = max_calls_per_worker
+        self.max_loop_lag = max_loop_lag
+        self.retry_after = retry_after
+        self.session_factory = session_factory
+        self.prepare = prepare
+        self.start_timeout = start_timeout
+        self.heartbeat = heartbeat
+        # Called with the room of every call that ended, or was lost with its worker
+        self.on_call_ended = on_call_ended
+        self.workers: list[Worker] = []
+        self.monitor = LoopLagMonitor(slow_after=slow_callback_threshold())
+        self._context = multiprocessing.get_context("spawn")
+        self._closing = False
+        self._tasks: set[asyncio.Task] = set()
+
+    @classmethod
+    async def create(cls, cm: contextlib.AsyncExitStack, **kwargs) -> t.Self:
+        pool = cls(**kwargs)
+        cm.push_async_callback(pool.close)
+        await pool.start()
+        return pool
+
+    async def start(self) -> None:
+        self.monitor.start()
+        self.workers = [self._spawn(worker_id) for worker_id in range(self.size)]
+        await asyncio.wait_for(
+            asyncio.gather(*(worker.ready for worker in self.workers)), self.start_timeout
+        )
+
+    def admit(self) -> Worker:
+        """
+        Pick the least-loaded worker able to take a call.
+
+        Raises:
+            Overloaded: If every worker is at capacity or lagging, or the supervisor itself lags
+        """
+        if self.monitor.lag > self.max_loop_lag:
+            raise Overloaded("Supervisor event loop is lagging", self.retry_after)
+        alive = [worker for worker in self.workers if worker.alive]
+        if not alive:
+            raise Overloaded("No call worker is running", self.retry_after)
+        free = [worker for worker in alive if worker.load < self.max_calls_per_worker]
+        if not free:
+            raise Overloaded("All call workers are at capacity", self.retry_after)
+        responsive = [worker for worker in free if worker.loop_lag <= self.max_loop_lag]
+        if not responsive:
+            raise Overloaded("All call workers are lagging", self.retry_after)
+        return min(responsive, key=lambda worker: (worker.load, worker.loop_lag))
+
+    async def start_call(self, room_uri: str, worker: Worker | None = None, hotel_id: str | None = None) -> str:
+        """
+        Start a call session for ``room_uri`` on a worker.
+
+        Args:
+            room_uri: Room to join
+            worker: Worker returned by ``admit``; admitted again if it has filled up since
+            hotel_id: Hotel the call is for, else the worker's default
+
+        Returns:
+            str: Session ID of the call
+        """
+        if worker is None or not worker.alive or worker.load >= self.max_calls_per_worker:
+            worker = self.admit()
+        session_id = uuid.uuid4().hex
+        started = asyncio.get_running_loop().create_future()
+        worker.pending[session_id] = (CallInfo(session_id, room_uri, time.time(), hotel_id), started)
+        try:
+            worker.conn.send(("start", session_id, room_uri, hotel_id))
+            await asyncio.wait_for(asyncio.shield(started), self.start_timeout)
+        except asyncio.TimeoutError:
+            # Nobody will hand this call to a caller, so the worker must not keep it running
+            if worker.alive:
+                worker.conn.send(("stop", session_id))
+            raise
+        finally:
+            worker.pending.pop(session_id, None)
+        return session_id
+
+    async def stop_call(self, session_id: str) -> None:
+        for worker in self.workers:
+            if session_id in worker.calls:
+                worker.conn.send(("stop", session_id))
+
+    def calls(self) -> list[dict]:
+        """Live calls per worker."""
+        return [
+            {
+                "worker": worker.worker_id,
+                "pid": worker.pid,
+                "alive": worker.alive,
+                "loop_lag_ms": round(worker.loop_lag * 1e3, 2),
+                "sessions": worker.sessions,
+                "calls": [dataclasses.asdict(call) for call in worker.calls.values()],
+                "pending": len(worker.pending),
+            }
+            for worker in self.workers
+        ]
+
+    def voice_metrics(self) -> Registry:
+        """Voice latency metrics of all workers, as of their last heartbeat."""
+        registry = VOICE.copy()
+        for worker in self.workers:
+            registry.merge(worker.metrics)
+        return registry
+
+    async def close(self) -> None:
+        self._closing = True
+        for worker in self.workers:
+            with contextlib.suppress(OSError):
+                worker.conn.send(("shutdown",))
+        await asyncio.gather(*(asyncio.to_thread(worker.process.join, 10) for worker in self.workers))
+        for worker in self.workers:
+            if worker.process.is_alive():
+                worker.process.terminate()
+            self._detach(worker)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.monitor.stop()
+
+    def _spawn(self, worker_id: int) -> Worker:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(worker_id, child_conn, self.session_factory, self.prepare, self.heartbeat),
+            name=f"call-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        loop = asyncio.get_running_loop()
+        worker = Worker(worker_id, process, parent_conn, loop.create_future())
+        loop.add_reader(parent_conn.fileno(), functools.partial(self._on_message, worker))
+        return worker
+
+    def _detach(self, worker: Worker) -> None:
+        with contextlib.suppress(ValueError, OSError):
+            asyncio.get_running_loop().remove_reader(worker.conn.fileno())
+        worker.conn.close()
+
+    def _on_message(self, worker: Worker) -> None:
+        try:
+            while worker.conn.poll():
+                event, *args = worker.conn.recv()
+                if event == "ready":
+                    worker.pid = args[0]
+                    worker.ready.set_result(None)
+                elif event == "load":
+                    worker.sessions = args[0]
+                    worker.loop_lag = args[1]
+                    worker.metrics = args[2]
+                elif event == "started":
+                    if args[0] in worker.pending:
+                        # Recorded here, as the call may end before start_call resumes
+                        call, future = worker.pending.pop(args[0])
+                        worker.calls[call.session_id] = call
+                        if not future.done():
+                            future.set_result(None)
+                elif event == "failed":
+                    if args[0] in worker.pending:
+                        _, future = worker.pending.pop(args[0])
+                        if not future.done():
+                            future.set_exception(RuntimeError(f"Call failed to start: {args[1]}"))
+                elif event == "ended":
+                    call = worker.calls.pop(args[0], None)
+                    if call is not None:
+                        self._call_ended(call)
+        except (EOFError, OSError):
+            self._on_exit(worker)
+
+    def _call_ended(self, call: CallInfo) -> None:
+        if self.on_call_ended is not None:
+            task = asyncio.create_task(self.on_call_ended(call.room_uri))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _on_exit(self, worker: Worker) -> None:
+        self._detach(worker)
+        error = RuntimeError(f"Call worker {worker.worker_id} exited")
+        came_up = worker.ready.done()
+        if not came_up:
+            worker.ready.set_exception(error)
+        for _, future in worker.pending.values():
+            if not future.done():
+                future.set_exception(error)
+        lost, worker.calls = list(worker.calls.values()), {}
+        for call in lost:
+            self._call_ended(call)
+        if self._closing or not came_up:
+            # A worker that never came up would most likely fail again
+            return
+        logger.error(
+            "Call worker %d (pid %s) exited with %d calls, restarting it",
+            worker.worker_id, worker.pid, len(lost),
+        )
+        self.workers[worker.worker_id] = self._spawn(worker.worker_id)